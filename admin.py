@@ -0,0 +1,94 @@
+from datetime import date
+
+import click
+from flask import Blueprint, abort, current_app, flash, redirect, render_template, request, session, url_for
+
+from models import db, User
+from queries import NEWEST, load_user_stats, load_recent_tasks
+from sessions import revoke_user_sessions
+from shards import find_user_id
+from sqlite_tuning import retry_on_busy
+
+admin = Blueprint("admin", __name__, url_prefix="/admin")
+
+
+# ==================== ACCESS ====================
+
+@admin.before_request
+def require_admin():
+    """Only logged-in admins; everyone else is told the pages don't exist"""
+    if "user_id" not in session:
+        flash("Please log in to access this page", "error")
+        return redirect(url_for("auth.login"))
+
+    # Read fresh on every request so revoking takes effect at once
+    is_admin = db.session.query(User.is_admin).filter_by(id=session["user_id"]).scalar()
+    if not is_admin:
+        abort(404)
+
+
+# ==================== STATS PAGES ====================
+
+@admin.route("/")
+def users():
+    """Users with their task counts, a page at a time"""
+    after = request.args.get("after", 0, type=int)
+    stats, next_cursor = load_user_stats(after, date.today(), current_app.config["ADMIN_PAGE_SIZE"])
+    return render_template("admin.html",
+                           view="users",
+                           users=stats,
+                           next_cursor=next_cursor,
+                           cache_stats=current_app.extensions["fragment_cache"].stats())
+
+
+@admin.route("/tasks")
+def tasks():
+    """All tasks, newest first, a page at a time"""
+    before = request.args.get("before", NEWEST, type=int)
+    rows, next_cursor = load_recent_tasks(before, current_app.config["ADMIN_PAGE_SIZE"])
+    return render_template("admin.html",
+                           view="tasks",
+                           tasks=rows,
+                           next_cursor=next_cursor,
+                           cache_stats=current_app.extensions["fragment_cache"].stats())
+
+
+# ==================== SESSIONS ====================
+
+@admin.route("/users/<int:user_id>/sessions/revoke", methods=["POST"])
+@retry_on_busy
+def revoke_sessions(user_id):
+    """Log a user out of every browser they are signed in on"""
+    revoked = revoke_user_sessions(user_id)
+    if revoked is None:
+        flash("Sessions are kept in cookies (SESSION_BACKEND=cookie) and cannot be revoked", "error")
+    else:
+        flash(f"Ended {revoked} session{'s' if revoked != 1 else ''} of user {user_id}", "success")
+    return redirect(url_for("admin.users", after=request.form.get("after", 0, type=int)))
+
+
+# ==================== CLI ====================
+# flask admin grant <username>  /  flask admin revoke <username>
+
+def set_admin(username, value):
+    user_id = find_user_id(username)
+    if user_id is None:
+        raise click.ClickException(f"No user named {username!r}")
+    User.query.filter_by(id=user_id).update({User.is_admin: value})
+    db.session.commit()
+
+
+@admin.cli.command("grant")
+@click.argument("username")
+def grant_command(username):
+    """Let USERNAME open the /admin pages"""
+    set_admin(username, True)
+    click.echo(f"{username} is now an admin")
+
+
+@admin.cli.command("revoke")
+@click.argument("username")
+def revoke_command(username):
+    """Take admin access away from USERNAME"""
+    set_admin(username, False)
+    click.echo(f"{username} is no longer an admin")
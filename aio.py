@@ -0,0 +1,180 @@
+import asyncio
+import io
+import sys
+import time
+
+from sqlalchemy.util import await_only, greenlet_spawn
+from sqlalchemy.util.concurrency import in_greenlet
+from werkzeug.exceptions import ClientDisconnected
+
+
+# ==================== ASYNC MODE ====================
+# asgi.py serves the same Flask app from an asyncio event loop instead of
+# a pool of threads. Each request runs in a greenlet, the way SQLAlchemy
+# runs sync code over an async driver (AsyncSession.run_sync): the
+# engine is aiosqlite's, so whenever a route waits on the database its
+# greenlet hands the loop to the next request. Routes, queries,
+# services and templates are shared with wsgi.py unchanged; a request in
+# flight costs a greenlet rather than a thread and its stack.
+#
+# Anything that would block the whole loop must go through the helpers
+# below instead: they wait normally under WSGI and yield under ASGI.
+# Long-lived streams (GET /events) would hold the loop, so async mode
+# runs with the null live event broker.
+
+def wait_for(future):
+    """future.result(), letting other requests run meanwhile in async mode"""
+    if in_greenlet():
+        return await_only(asyncio.wrap_future(future))
+    return future.result()
+
+
+def sleep(seconds):
+    """time.sleep(), letting other requests run meanwhile in async mode"""
+    if in_greenlet():
+        await_only(asyncio.sleep(seconds))
+    else:
+        time.sleep(seconds)
+
+
+# ==================== ASGI ADAPTER ====================
+
+# Extensions whose run_once() the event loop calls every `interval`
+# seconds, in place of the background threads WSGI workers start
+PERIODIC_JOBS = ("archiver", "session_sweeper")
+
+
+class RequestBody(io.RawIOBase):
+    """The body of one ASGI request, received from the server as the app reads it
+
+    Only readable in the request's greenlet: waiting for the next chunk
+    hands the loop to other requests, and a body is never held in memory
+    whole.
+    """
+
+    def __init__(self, receive):
+        self._receive = receive
+        self._chunk = memoryview(b"")
+        self._more_body = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._chunk and self._more_body:
+            message = await_only(self._receive())
+            if message["type"] == "http.disconnect":
+                raise ClientDisconnected()
+            self._chunk = memoryview(message.get("body", b""))
+            self._more_body = message.get("more_body", False)
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+
+def wsgi_environ(scope, body):
+    """The WSGI environ for one ASGI HTTP request; body is its wsgi.input"""
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": scope["client"][0] if scope.get("client") else "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        # The body ends where the server says, with or without a Content-Length
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = f"HTTP_{name}"
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+class ASGIApp:
+    """Serves a Flask app to an ASGI server, one greenlet per request"""
+
+    def __init__(self, app):
+        self.app = app
+        self._jobs = []
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.http(scope, receive, send)
+
+    async def http(self, scope, receive, send):
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                  for name, value in headers]
+
+        def respond():
+            body = io.BufferedReader(RequestBody(receive))
+            chunks = self.app(wsgi_environ(scope, body), start_response)
+            if any(name == b"content-length" for name, _ in started["headers"]):
+                # A whole body: read it here rather than a greenlet switch per chunk
+                try:
+                    return b"".join(chunks), None
+                finally:
+                    getattr(chunks, "close", lambda: None)()
+            return None, iter(chunks)
+
+        content, chunks = await greenlet_spawn(respond)
+        await send({"type": "http.response.start", "status": started["status"],
+                    "headers": started["headers"]})
+        if chunks is None:
+            await send({"type": "http.response.body", "body": content})
+            return
+
+        # Streamed (exports): each chunk may query, so is produced in a greenlet too
+        try:
+            while True:
+                chunk = await greenlet_spawn(next, chunks, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(chunks, "close"):
+                await greenlet_spawn(chunks.close)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.start_jobs()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for task in self._jobs:
+                    task.cancel()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def start_jobs(self):
+        for name in PERIODIC_JOBS:
+            job = self.app.extensions.get(name)
+            if job is not None:
+                self._jobs.append(asyncio.create_task(self.run_periodically(job)))
+
+    async def run_periodically(self, job):
+        while True:
+            await asyncio.sleep(job.interval)
+            await greenlet_spawn(job.run_once)
@@ -0,0 +1,356 @@
+import io
+from datetime import date
+
+from flask import Blueprint, Response, current_app, jsonify, request, session, abort, stream_with_context
+from werkzeug.exceptions import HTTPException
+
+from models import db, Task
+from queries import TABS, PAGED_TABS, TAB_SECTIONS, load_page
+from ordering import move_up, move_down, move_after, is_sibling
+from services import (ValidationError, parse_task_fields, create_task, create_tasks,
+                      update_task, toggle_task, remove_task, task_event, commit_task_changes)
+from sqlite_tuning import retry_on_busy, immediate_writes
+from search import search_tasks
+from profiles import get_revision
+from recurrence import catch_up, load_dashboard_with_upcoming, load_future_page
+from archive import restore_task
+from transfer import FORMATS, exporter, reader, format_for, import_tasks
+
+# Versioned JSON API for tasks. Uses the same session login as the HTML
+# routes and the same validation (services.py).
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+BULK_OPERATIONS = ("create", "update", "toggle", "delete")
+TASK_FIELDS = ("title", "description", "due_date")
+
+
+class BulkError(Exception):
+    """A bulk operation failed validation; nothing in the batch is applied"""
+
+    def __init__(self, index, message, status=400):
+        super().__init__(message)
+        self.index = index
+        self.message = message
+        self.status = status
+
+
+# ==================== HELPERS ====================
+
+@api.errorhandler(HTTPException)
+def http_error(e):
+    """Answer API errors with JSON instead of Flask's HTML error pages"""
+    return jsonify(error=e.description), e.code
+
+
+@api.errorhandler(ValidationError)
+def validation_error(e):
+    return jsonify(error=str(e)), 400
+
+
+@api.errorhandler(BulkError)
+def bulk_error(e):
+    return jsonify(error=e.message, index=e.index), e.status
+
+
+@api.before_request
+def require_login():
+    if "user_id" not in session:
+        abort(401, description="Login required")
+
+
+def get_own_task(task_id):
+    """The current user's task, or 404 (also for other users' tasks)"""
+    task = Task.query.filter_by(id=task_id, user_id=session["user_id"]).first()
+    if task is None:
+        abort(404, description="Task not found")
+    return task
+
+
+def json_body():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400, description="Expected a JSON object")
+    return data
+
+
+def is_task_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def check_field_types(data):
+    """Raise ValidationError unless every task field given is a string or null"""
+    for name in TASK_FIELDS:
+        if not isinstance(data.get(name), (str, type(None))):
+            raise ValidationError(f"{name} must be a string")
+
+
+def new_fields(data):
+    """Validated fields for a new task"""
+    check_field_types(data)
+    return parse_task_fields(data.get("title"), data.get("description"), data.get("due_date"))
+
+
+def task_fields(task):
+    return {"title": task.title, "description": task.description, "due_date": task.due_date}
+
+
+def merged_fields(current, data):
+    """Validated fields for a partial update: missing keys keep the current fields' values"""
+    check_field_types(data)
+    return parse_task_fields(data.get("title", current["title"]),
+                             data.get("description", current["description"]),
+                             data.get("due_date", current["due_date"]))
+
+
+# ==================== TASKS ====================
+
+@api.route("/tasks", methods=["GET"])
+def list_tasks():
+    """A tab's first page, or the next page of one section with section= and after="""
+    tab = request.args.get("tab", "today")
+    if tab not in TABS:
+        abort(400, description=f"tab must be one of {', '.join(TABS)}")
+
+    page_size = current_app.config["TASKS_PAGE_SIZE"]
+    today = date.today()
+
+    if "after" in request.args:
+        section = request.args.get("section", "")
+        if tab not in PAGED_TABS or section not in TAB_SECTIONS[tab]:
+            abort(400, description="Only Past and Future sections are paged")
+        try:
+            if tab == "future" and section == "ongoing":
+                page = load_future_page(session["user_id"], today, request.args["after"], page_size,
+                                        current_app.config["RECURRENCE_HORIZON_DAYS"])
+            else:
+                page = load_page(session["user_id"], tab, today, section,
+                                 request.args["after"], page_size)
+        except ValueError:
+            abort(400, description="Invalid cursor")
+        return jsonify(tasks=[task.to_dict() for task in page.tasks],
+                       next_cursor=page.next_cursor)
+
+    # Repeating tasks due today get their rows first, as on the home page
+    revision = catch_up(session["user_id"], get_revision(session["user_id"]), today)
+    dashboard = load_dashboard_with_upcoming(session["user_id"], revision, tab, today, page_size,
+                                             current_app.config["RECURRENCE_HORIZON_DAYS"])
+    return jsonify(ongoing=[task.to_dict() for task in dashboard.ongoing_tasks],
+                   complete=[task.to_dict() for task in dashboard.complete_tasks],
+                   next_cursors=dashboard.next_cursors,
+                   counts=dashboard.counts)
+
+
+@api.route("/search", methods=["GET"])
+def search():
+    """?q=<words> -> the user's matching tasks, best first (at most ?limit=)"""
+    query = request.args.get("q", "").strip()
+    if not query:
+        abort(400, description="q is required")
+    max_limit = current_app.config["SEARCH_RESULTS_LIMIT"]
+    limit = min(request.args.get("limit", max_limit, type=int), max_limit)
+    if limit < 1:
+        abort(400, description="limit must be positive")
+    return jsonify(tasks=[task.to_dict() for task in search_tasks(session["user_id"], query, limit)])
+
+
+@api.route("/tasks/export", methods=["GET"])
+def export():
+    """All the user's tasks as a streamed download (?format=csv|ndjson)"""
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in FORMATS:
+        abort(400, description=f"format must be one of {', '.join(FORMATS)}")
+    chunks = exporter(fmt)(session["user_id"])
+    response = Response(stream_with_context(chunks), mimetype=FORMATS[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="tasks.{fmt}"'
+    return response
+
+
+@api.route("/tasks/import", methods=["POST"])
+@immediate_writes
+def import_():
+    """Request body is a CSV or NDJSON export (format from ?format= or Content-Type)"""
+    fmt = format_for(request.args.get("format") or request.mimetype)
+    if fmt is None:
+        abort(415, description="Send text/csv or application/x-ndjson")
+    stream = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+    try:
+        count = import_tasks(session["user_id"], reader(fmt)(stream),
+                             current_app.config["IMPORT_BATCH_SIZE"])
+    except (ValidationError, UnicodeDecodeError) as e:
+        db.session.rollback()
+        if isinstance(e, UnicodeDecodeError):
+            abort(400, description="Upload must be UTF-8")
+        raise
+    commit_task_changes(session["user_id"])
+    return jsonify(imported=count), 201
+
+
+@api.route("/tasks", methods=["POST"])
+@retry_on_busy
+def create():
+    fields = new_fields(json_body())
+    event = task_event("created", create_task(session["user_id"], fields))
+    commit_task_changes(session["user_id"], event)
+    return jsonify(event["task"]), 201
+
+
+@api.route("/tasks/<int:task_id>", methods=["GET"])
+def get(task_id):
+    return jsonify(get_own_task(task_id).to_dict())
+
+
+@api.route("/tasks/<int:task_id>", methods=["PATCH"])
+@retry_on_busy
+def update(task_id):
+    task = get_own_task(task_id)
+    previous_due_date = task.due_date.isoformat()
+    update_task(task, merged_fields(task_fields(task), json_body()))
+    event = task_event("updated", task,  # before the commit expires it
+                       previous_due_date=previous_due_date)
+    commit_task_changes(session["user_id"], event)
+    return jsonify(event["task"])
+
+
+@api.route("/tasks/<int:task_id>/toggle", methods=["POST"])
+@retry_on_busy
+def toggle(task_id):
+    event = task_event("toggled", toggle_task(get_own_task(task_id)))
+    commit_task_changes(session["user_id"], event)
+    return jsonify(event["task"])
+
+
+@api.route("/tasks/<int:task_id>/reorder", methods=["POST"])
+@retry_on_busy
+def reorder(task_id):
+    """Body {"direction": "up"|"down"} or {"after": <task id>|null} (null = top)"""
+    task = get_own_task(task_id)
+    data = json_body()
+
+    if "after" in data:
+        after = None
+        if data["after"] is not None:
+            if not is_task_id(data["after"]):
+                abort(400, description='"after" must be a task id or null')
+            after = Task.query.filter_by(id=data["after"], user_id=session["user_id"]).first()
+            if after is None or not is_sibling(task, after):
+                abort(400, description="Tasks can only be moved within the same day and section")
+        moved = move_after(task, after)
+        details = {"after": data["after"]}
+    elif data.get("direction") in ("up", "down"):
+        moved = move_up(task) if data["direction"] == "up" else move_down(task)
+        details = {"direction": data["direction"]}
+    else:
+        abort(400, description='Expected "direction" or "after"')
+
+    event = task_event("reordered", task, **details)
+    if moved:
+        commit_task_changes(session["user_id"], event)
+    return jsonify(event["task"])
+
+
+@api.route("/tasks/<int:task_id>", methods=["DELETE"])
+@retry_on_busy
+def delete(task_id):
+    task = get_own_task(task_id)
+    event = task_event("deleted", task)
+    remove_task(task)
+    commit_task_changes(session["user_id"], event)
+    return "", 204
+
+
+@api.route("/archive/<int:task_id>/restore", methods=["POST"])
+@retry_on_busy
+def restore(task_id):
+    """Move an archived task (Past tab, "archived_at" set) back to the live tasks"""
+    restored = restore_task(session["user_id"], task_id)
+    if restored is None:
+        abort(404, description="Archived task not found")
+    return jsonify(db.session.get(Task, restored).to_dict())
+
+
+# ==================== BULK ====================
+
+@api.route("/tasks/bulk", methods=["POST"])
+@retry_on_busy
+def bulk():
+    """Apply many operations in one transaction, all or nothing
+
+    Body: {"operations": [{"op": "create", "title": ..., "due_date": ...},
+                          {"op": "update", "id": 1, "title": ...},
+                          {"op": "toggle", "id": 2},
+                          {"op": "delete", "id": 3}]}
+
+    Every operation is validated before anything is written; the first
+    invalid one is reported with its index and the batch is rejected, as
+    is a batch that uses a task again after deleting it. An update
+    applies on top of the batch's earlier updates to the same task.
+    Results come back in request order, each showing the task as its
+    operation left it.
+    """
+    operations = json_body().get("operations")
+    if not isinstance(operations, list):
+        abort(400, description='Expected "operations" to be a list')
+    if len(operations) > current_app.config["API_BULK_MAX_OPERATIONS"]:
+        abort(413, description="Too many operations in one request")
+
+    user_id = session["user_id"]
+
+    # One query for every task the batch refers to
+    ids = {op["id"] for op in operations
+           if isinstance(op, dict) and op.get("op") != "create" and is_task_id(op.get("id"))}
+    tasks = {}
+    if ids:
+        tasks = {task.id: task for task in Task.query.filter(Task.user_id == user_id, Task.id.in_(ids))}
+
+    # Validate everything first
+    planned = []
+    deleted = set()
+    # Task id -> its fields after the batch's updates so far
+    updated = {}
+    for index, op in enumerate(operations):
+        kind = op.get("op") if isinstance(op, dict) else None
+        if kind not in BULK_OPERATIONS:
+            raise BulkError(index, f"op must be one of {', '.join(BULK_OPERATIONS)}")
+
+        try:
+            if kind == "create":
+                planned.append((kind, None, new_fields(op)))
+                continue
+
+            if not is_task_id(op.get("id")):
+                raise BulkError(index, "id must be an integer")
+            if op["id"] in deleted:
+                raise BulkError(index, "Task was deleted earlier in this batch")
+            task = tasks.get(op["id"])
+            if task is None:
+                raise BulkError(index, "Task not found", 404)
+            if kind == "delete":
+                deleted.add(op["id"])
+            fields = None
+            if kind == "update":
+                fields = merged_fields(updated.get(task.id) or task_fields(task), op)
+                updated[task.id] = fields
+            planned.append((kind, task, fields))
+        except ValidationError as e:
+            raise BulkError(index, str(e))
+
+    # Then apply; creates go out as one batched INSERT
+    created = iter(create_tasks(user_id, [fields for kind, _, fields in planned if kind == "create"]))
+    results = []
+    for kind, task, fields in planned:
+        if kind == "create":
+            # Serialised once the flush below has given it an id
+            results.append(next(created))
+            continue
+        if kind == "update":
+            update_task(task, fields)
+        elif kind == "toggle":
+            toggle_task(task)
+        else:
+            remove_task(task)
+        results.append({"id": task.id, "deleted": True} if kind == "delete" else task.to_dict())
+
+    db.session.flush()
+    response = [result.to_dict() if isinstance(result, Task) else result for result in results]
+    commit_task_changes(session["user_id"])
+    return jsonify(results=response)
@@ -0,0 +1,253 @@
+import threading
+from datetime import date, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import case, delete, exists, func, insert, select
+
+from models import db, User, Task, ArchivedTask
+from services import commit_task_changes
+from shards import each_shard, find_user_id
+
+
+# ==================== ARCHIVING ====================
+# Completed tasks due more than ARCHIVE_AFTER_DAYS ago are moved from
+# `tasks` to `archived_tasks`, so the hot table and its indexes only hold
+# what the Today/Future tabs and the write paths work on. A move is an
+# INSERT ... SELECT ... RETURNING into the archive followed by a DELETE
+# of the returned ids, one user and at most ARCHIVE_BATCH_SIZE rows per
+# transaction, so writers never wait long behind the archiver. Each batch
+# bumps the user's task revision like any other write to their tasks.
+#
+# Rows keep their ids both ways, so the Past tab can page through both
+# tables on one (due_date, id) keyset (queries.merge_archived). The
+# archive is not searchable: tasks_fts follows `tasks` only.
+
+# The columns both tables have (only `tasks` has restored_at)
+TASK_COLUMNS = [column.name for column in Task.__table__.columns if column.name != "restored_at"]
+
+# Users looked at per query when finding who has tasks to archive
+USER_PAGE_SIZE = 500
+
+
+def archive_cutoff(today, after_days):
+    """Completed tasks due before this day are archived"""
+    return today - timedelta(days=after_days)
+
+
+def archive_statement(user_id, cutoff, batch_size):
+    """INSERT ... SELECT of up to batch_size archivable tasks, returning their ids
+
+    Restored tasks are left alone, as are tasks whose id is already in the
+    archive: databases created before `tasks` used AUTOINCREMENT can hand
+    an archived id to a new task.
+    """
+    taken = ArchivedTask.__table__.alias("taken")
+    moving = select(*[Task.__table__.c[name] for name in TASK_COLUMNS]).where(
+        Task.user_id == user_id,
+        Task.completed == True,
+        Task.due_date < cutoff,
+        Task.restored_at.is_(None),
+        ~exists().where(taken.c.id == Task.id),
+    ).order_by(Task.due_date, Task.id).limit(batch_size)
+    return insert(ArchivedTask.__table__).from_select(TASK_COLUMNS, moving).returning(ArchivedTask.id)
+
+
+def archive_user(user_id, cutoff, batch_size):
+    """Move user_id's completed tasks due before cutoff to the archive; returns how many"""
+    moved = 0
+    while True:
+        ids = db.session.scalars(archive_statement(user_id, cutoff, batch_size)).all()
+        if not ids:
+            db.session.rollback()
+            return moved
+
+        db.session.execute(delete(Task).where(Task.id.in_(ids)),
+                           execution_options={"synchronize_session": False})
+        User.query.filter_by(id=user_id).update({
+            User.archived_count: User.archived_count + len(ids),
+        }, synchronize_session=False)
+        commit_task_changes(user_id)
+        moved += len(ids)
+        if len(ids) < batch_size:
+            return moved
+
+
+def archivable_users_query(user_ids, cutoff):
+    """Which of user_ids have completed tasks due before cutoff"""
+    return select(Task.user_id).distinct().where(
+        Task.user_id.in_(user_ids),
+        Task.completed == True,
+        Task.due_date < cutoff,
+        Task.restored_at.is_(None),
+    )
+
+
+def users_with_archivable_tasks(after_id, cutoff):
+    """The next USER_PAGE_SIZE user ids after after_id, and those among them with tasks to archive
+
+    Read-only; the transaction is ended so each archive batch starts as a
+    write instead of upgrading this read.
+    """
+    user_ids = db.session.scalars(
+        select(User.id).where(User.id > after_id).order_by(User.id).limit(USER_PAGE_SIZE)
+    ).all()
+    due = db.session.scalars(archivable_users_query(user_ids, cutoff)).all() if user_ids else []
+    db.session.rollback()
+    return user_ids, sorted(due)
+
+
+def archive_completed(cutoff, batch_size):
+    """Archive every user's completed tasks due before cutoff, shard by shard; returns how many moved"""
+    moved = 0
+    for _ in each_shard():
+        after_id = 0
+        while True:
+            user_ids, due = users_with_archivable_tasks(after_id, cutoff)
+            if not user_ids:
+                break
+            for user_id in due:
+                moved += archive_user(user_id, cutoff, batch_size)
+            after_id = user_ids[-1]
+    return moved
+
+
+# ==================== RESTORING ====================
+# The reverse move, for one task (the Restore button on the Past tab) or
+# a user's whole archive (the CLI). A restored task keeps its id unless
+# `tasks` has given that id to another task since, in which case SQLite
+# picks a new one. Restored tasks get restored_at set, and archive runs
+# skip them from then on, however old and complete they are.
+
+def restore_statement(user_id, ids):
+    """INSERT ... SELECT of user_id's archived tasks in ids back into `tasks`, returning their ids"""
+    taken = Task.__table__.alias("taken")
+    free_id = case((exists().where(taken.c.id == ArchivedTask.id), None), else_=ArchivedTask.id)
+    columns = [free_id] + [ArchivedTask.__table__.c[name] for name in TASK_COLUMNS[1:]] + [func.now()]
+    return insert(Task.__table__).from_select(
+        TASK_COLUMNS + ["restored_at"],
+        select(*columns).where(ArchivedTask.user_id == user_id, ArchivedTask.id.in_(ids)),
+    ).returning(Task.id)
+
+
+def restore_ids(user_id, ids):
+    """Move user_id's archived tasks in ids back to `tasks` and commit; returns their ids there"""
+    restored = db.session.scalars(restore_statement(user_id, ids)).all()
+    if not restored:
+        db.session.rollback()
+        return restored
+
+    db.session.execute(delete(ArchivedTask).where(ArchivedTask.user_id == user_id,
+                                                  ArchivedTask.id.in_(ids)),
+                       execution_options={"synchronize_session": False})
+    User.query.filter_by(id=user_id).update({
+        User.archived_count: User.archived_count - len(restored),
+    }, synchronize_session=False)
+    commit_task_changes(user_id)
+    return restored
+
+
+def restore_task(user_id, archived_id):
+    """Restore one of user_id's archived tasks; returns its id in `tasks`, or None if there is no such task"""
+    restored = restore_ids(user_id, [archived_id])
+    return restored[0] if restored else None
+
+
+def restore_user(user_id, batch_size):
+    """Restore all of user_id's archived tasks, batch_size per transaction; returns how many"""
+    restored = 0
+    while True:
+        ids = db.session.scalars(
+            select(ArchivedTask.id).where(ArchivedTask.user_id == user_id)
+            .order_by(ArchivedTask.id).limit(batch_size)
+        ).all()
+        if not ids:
+            db.session.rollback()
+            return restored
+        restored += len(restore_ids(user_id, ids))
+
+
+# ==================== BACKGROUND ARCHIVER ====================
+# With ARCHIVE_INTERVAL_SECONDS set, every process running the app
+# archives on a timer. Several workers doing so at once is safe (each
+# batch is its own transaction and skips what another has moved), just
+# redundant; a single cron job running `flask archive run` is the
+# cheaper setup.
+
+class Archiver:
+    """Runs archive_completed() every `interval` seconds on a daemon thread"""
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="archiver", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def run_once(self):
+        config = self.app.config
+        with self.app.app_context():
+            try:
+                cutoff = archive_cutoff(date.today(), config["ARCHIVE_AFTER_DAYS"])
+                moved = archive_completed(cutoff, config["ARCHIVE_BATCH_SIZE"])
+            except Exception:
+                self.app.logger.exception("Archiving failed")
+                return 0
+        if moved:
+            self.app.logger.info("Archived %d completed tasks due before %s", moved, cutoff)
+        return moved
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.run_once()
+
+
+def init_archiver(app):
+    """Start the background archiver if ARCHIVE_INTERVAL_SECONDS is set"""
+    interval = app.config["ARCHIVE_INTERVAL_SECONDS"]
+    if interval <= 0:
+        return None
+    archiver = Archiver(app, interval)
+    app.extensions["archiver"] = archiver
+    # Without background threads asgi.py calls run_once() from its event loop
+    if app.config["BACKGROUND_THREADS"]:
+        archiver.start()
+    return archiver
+
+
+# ==================== CLI ====================
+# flask archive run  /  flask archive restore <username>
+
+archive_cli = AppGroup("archive", help="Move old completed tasks to the archive and back.")
+
+
+@archive_cli.command("run")
+@click.option("--after-days", type=int, default=None,
+              help="Archive completed tasks due more than this many days ago.")
+@click.option("--batch-size", type=int, default=None, help="Tasks moved per transaction.")
+def run_command(after_days, batch_size):
+    """Archive every user's old completed tasks"""
+    config = current_app.config
+    after_days = config["ARCHIVE_AFTER_DAYS"] if after_days is None else after_days
+    cutoff = archive_cutoff(date.today(), after_days)
+    moved = archive_completed(cutoff, batch_size or config["ARCHIVE_BATCH_SIZE"])
+    click.echo(f"Archived {moved} completed tasks due before {cutoff.isoformat()}")
+
+
+@archive_cli.command("restore")
+@click.argument("username")
+@click.option("--batch-size", type=int, default=None, help="Tasks moved per transaction.")
+def restore_command(username, batch_size):
+    """Move all of USERNAME's archived tasks back to their lists"""
+    user_id = find_user_id(username)
+    if user_id is None:
+        raise click.ClickException(f"No user named {username!r}")
+    restored = restore_user(user_id, batch_size or current_app.config["ARCHIVE_BATCH_SIZE"])
+    click.echo(f"Restored {restored} archived tasks for {username}")
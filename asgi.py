@@ -0,0 +1,14 @@
+"""
+ASGI entry point: the same app, served from an asyncio event loop.
+
+    uvicorn --workers 2 asgi:application
+
+Requests run as greenlets over aiosqlite (see aio.py) instead of on
+request threads. Settings come from the environment; see AsyncConfig in
+config.py. CLI commands still run through wsgi.py (flask --app wsgi ...).
+"""
+from aio import ASGIApp
+from app import create_app
+from config import AsyncConfig
+
+application = ASGIApp(create_app(AsyncConfig))
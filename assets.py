@@ -0,0 +1,347 @@
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import AppGroup
+
+# WebP/AVIF variants and resizing need Pillow; without it images are copied as they are
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+
+# Brotli copies of CSS need the brotli package; gzip ones are always made
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# ==================== ASSET BUILD ====================
+# `flask assets build` copies static/ into static/dist/ with a content
+# hash in every file name (css/home.css -> css/home.3f2a9c01be.css) and
+# writes static/dist/manifest.json mapping each original name to its
+# copy. On the way:
+#
+#   - CSS is minified, its url()s point at the hashed images, and a
+#     background-image with variants becomes an image-set() of them
+#   - images wider than DISPLAY_WIDTHS says they are ever shown are
+#     scaled down, and get AVIF and WebP variants when those are smaller
+#   - CSS, JS and SVG get .br and .gz copies next to them
+#
+# Run it on every deploy before starting the workers; the manifest is
+# read once at startup. Without a build the app serves static/ as before.
+
+DIST = "dist"
+MANIFEST = "manifest.json"
+
+# Hex digits of the SHA-256 kept in file names
+HASH_LENGTH = 10
+
+# Widest (in device pixels) each image is shown: the background covers
+# up to a 2560px screen, the logo is 150 CSS px at up to 3x density
+DISPLAY_WIDTHS = {
+    "images/background.jpg": 2560,
+    "images/shinx.png": 450,
+}
+
+# Variants tried for every image: (MIME type, extension, Pillow format, save options)
+IMAGE_VARIANTS = [
+    ("image/avif", ".avif", "AVIF", {"quality": 60, "speed": 6}),
+    ("image/webp", ".webp", "WEBP", {"quality": 80, "method": 6}),
+]
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+COMPRESSED_EXTENSIONS = {".css", ".js", ".svg"}
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+URL = re.compile(r"""url\(\s*(['"]?)(?P<ref>[^'")]+)\1\s*\)""")
+BACKGROUND_IMAGE = re.compile(r"""background-image:url\(\s*(['"]?)(?P<ref>[^'")]+)\1\s*\)(?=[;}])""")
+
+
+def fingerprinted(path, data):
+    """path with a hash of data before its extension"""
+    stem, ext = posixpath.splitext(path)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def minify_css(css):
+    """css without comments and the whitespace around its punctuation"""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+def rewrite_css(css, path, manifest):
+    """css with url()s pointing at the built files, and background images as image-set()s of their variants"""
+    base = posixpath.dirname(path)
+
+    def built(ref):
+        if ref.startswith(("data:", "/", "#")) or "://" in ref:
+            return None
+        return manifest.get(posixpath.normpath(posixpath.join(base, ref)))
+
+    def relative(built_path):
+        return posixpath.relpath(built_path, base)
+
+    def background(match):
+        entry = built(match["ref"])
+        if entry is None or not entry.get("variants"):
+            return match[0]
+        fallback = relative(entry["file"])
+        candidates = [f'url({relative(file)}) type("{mime}")' for mime, file in entry["variants"].items()]
+        candidates.append(f'url({fallback}) type("{mimetypes.guess_type(entry["file"])[0]}")')
+        # Browsers without image-set() keep the first declaration
+        return f"background-image:url({fallback});background-image:image-set({','.join(candidates)})"
+
+    def url(match):
+        entry = built(match["ref"])
+        return f"url({relative(entry['file'])})" if entry else match[0]
+
+    return URL.sub(url, BACKGROUND_IMAGE.sub(background, css))
+
+
+def _encode(image, image_format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def build_image(path, data):
+    """The fallback bytes of one image and its smaller variants as {MIME type: bytes}"""
+    if Image is None:
+        return data, {}
+
+    with Image.open(io.BytesIO(data)) as image:
+        image_format, palette = image.format, image.mode == "P"
+        if image.mode not in ("RGB", "RGBA"):
+            transparent = image.mode in ("LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if transparent else "RGB")
+        else:
+            image.load()
+
+    width = DISPLAY_WIDTHS.get(path)
+    if width and image.width > width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.Resampling.LANCZOS)
+        if image_format == "JPEG":
+            data = _encode(image, "JPEG", quality=85, optimize=True, progressive=True)
+        else:
+            # Back to a palette if it had one; RGBA would be several times the size
+            resized = image.quantize(256, method=Image.Quantize.FASTOCTREE) if palette else image
+            data = _encode(resized, image_format, optimize=True)
+
+    variants = {}
+    for mime, _, variant_format, options in IMAGE_VARIANTS:
+        if not features.check(variant_format.lower()):
+            continue
+        variant = _encode(image, variant_format, **options)
+        if len(variant) < len(data):
+            variants[mime] = variant
+    # Smallest first: image-set() and <picture> take the first type the browser supports
+    return data, dict(sorted(variants.items(), key=lambda item: len(item[1])))
+
+
+def compressed_copies(data):
+    """{Content-Encoding: bytes} for the encodings that make data smaller"""
+    copies = {"gzip": gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        copies["br"] = brotli.compress(data, quality=11)
+    return {encoding: copy for encoding, copy in copies.items() if len(copy) < len(data)}
+
+
+def source_files(static_folder):
+    """Paths of everything under static_folder except a previous build, images first and CSS last"""
+    paths = []
+    for root, dirs, files in os.walk(static_folder):
+        rel_root = os.path.relpath(root, static_folder)
+        if rel_root == DIST or rel_root.startswith(DIST + os.sep):
+            dirs[:] = []
+            continue
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if not name.startswith("."):
+                paths.append(posixpath.normpath(posixpath.join(rel_root.replace(os.sep, "/"), name)))
+    # CSS is rewritten with the names of what it references, so goes after it
+    return sorted(paths, key=lambda path: path.endswith(".css"))
+
+
+def build_assets(static_folder):
+    """Replace static_folder/dist with a fresh build; returns the manifest
+
+    Each manifest entry is {"file": hashed copy, "variants": {MIME type:
+    file}, "encodings": {Content-Encoding: file}, "size": bytes of the
+    original}, paths relative to dist/.
+    """
+    out_dir = os.path.join(static_folder, DIST)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    manifest = {}
+
+    def write(path, data):
+        full_path = os.path.join(out_dir, *path.split("/"))
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "wb") as f:
+            f.write(data)
+        return path
+
+    for path in source_files(static_folder):
+        with open(os.path.join(static_folder, *path.split("/")), "rb") as f:
+            data = f.read()
+        entry = {"size": len(data)}
+        ext = posixpath.splitext(path)[1].lower()
+
+        if ext == ".css":
+            data = rewrite_css(minify_css(data.decode("utf-8")), path, manifest).encode("utf-8")
+        elif ext in IMAGE_EXTENSIONS:
+            data, variants = build_image(path, data)
+            stem = posixpath.splitext(path)[0]
+            extensions = {mime: extension for mime, extension, _, _ in IMAGE_VARIANTS}
+            entry["variants"] = {
+                mime: write(fingerprinted(stem + extensions[mime], variant), variant)
+                for mime, variant in variants.items()
+            }
+
+        entry["file"] = write(fingerprinted(path, data), data)
+        if ext in COMPRESSED_EXTENSIONS:
+            entry["encodings"] = {
+                encoding: write(entry["file"] + ENCODING_SUFFIXES[encoding], copy)
+                for encoding, copy in compressed_copies(data).items()
+            }
+        manifest[path] = entry
+
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+# ==================== SERVING ====================
+# With a manifest, url_for('static', filename='css/home.css') returns the
+# hashed copy's URL (not under the debug server, so edits show up
+# without a rebuild) and image_sources() lists an image's variants for
+# <picture>. Hashed files never change, so they are served with a year's
+# immutable Cache-Control, and as their .br/.gz copy when the client
+# accepts one. Anything else under /static is served as Flask always
+# has: revalidated on every use.
+
+# One year, the longest max-age caches are asked to honour
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class AssetManifest:
+    """The hashed copies of static files from the last `flask assets build`"""
+
+    def __init__(self, entries):
+        self.entries = entries
+        # Every built file (relative to dist/) -> its precompressed copies by encoding
+        self.built = {}
+        for entry in entries.values():
+            self.built[entry["file"]] = entry.get("encodings", {})
+            for variant in entry.get("variants", {}).values():
+                self.built[variant] = {}
+
+    @classmethod
+    def load(cls, static_folder):
+        """The manifest under static_folder, or an empty one if nothing was built"""
+        try:
+            with open(os.path.join(static_folder, DIST, MANIFEST)) as f:
+                return cls(json.load(f))
+        except FileNotFoundError:
+            return cls({})
+
+    def filename(self, filename):
+        """The static filename to serve for filename: its hashed copy if built"""
+        entry = self.entries.get(filename)
+        return f"{DIST}/{entry['file']}" if entry else filename
+
+    def variants(self, filename):
+        """[(MIME type, static filename)] of filename's image variants, best first"""
+        entry = self.entries.get(filename)
+        if not entry:
+            return []
+        return [(mime, f"{DIST}/{file}") for mime, file in entry.get("variants", {}).items()]
+
+
+def _manifest():
+    return current_app.extensions["assets"]
+
+
+def fingerprint_static_urls(endpoint, values):
+    """url_defaults hook pointing url_for('static', ...) at the hashed copy"""
+    if endpoint == "static" and "filename" in values and not current_app.debug:
+        values["filename"] = _manifest().filename(values["filename"])
+
+
+def image_sources(filename):
+    """[(MIME type, URL)] of the variants of a static image, for <source> tags"""
+    if current_app.debug:
+        return []
+    return [(mime, current_app.url_for("static", filename=path))
+            for mime, path in _manifest().variants(filename)]
+
+
+def static_view(filename):
+    """GET /static/<filename>, with long-lived caching and precompressed copies for built files"""
+    built = None
+    if filename.startswith(DIST + "/"):
+        built = _manifest().built.get(filename[len(DIST) + 1:])
+    if built is None:
+        return current_app.send_static_file(filename)
+
+    path, encoding = filename, None
+    for name in ("br", "gzip"):
+        if name in built and request.accept_encodings[name]:
+            path, encoding = f"{DIST}/{built[name]}", name
+            break
+
+    response = send_from_directory(current_app.static_folder, path,
+                                   mimetype=mimetypes.guess_type(filename)[0],
+                                   max_age=IMMUTABLE_MAX_AGE)
+    if built:
+        response.vary.add("Accept-Encoding")
+    if encoding:
+        response.content_encoding = encoding
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_assets(app):
+    """Read the asset manifest and serve /static through it"""
+    manifest = AssetManifest.load(app.static_folder)
+    app.extensions["assets"] = manifest
+    app.url_defaults(fingerprint_static_urls)
+    app.add_template_global(image_sources)
+    app.view_functions["static"] = static_view
+    return manifest
+
+
+# ==================== CLI ====================
+# flask assets build
+
+assets_cli = AppGroup("assets", help="Build hashed, compressed copies of the static files.")
+
+
+@assets_cli.command("build")
+def build_command():
+    """Write static/dist/ and its manifest"""
+    if Image is None:
+        click.echo("Pillow is not installed: images are copied without resizing or WebP/AVIF variants")
+    if brotli is None:
+        click.echo("brotli is not installed: CSS gets gzip copies only")
+
+    static_folder = current_app.static_folder
+    manifest = build_assets(static_folder)
+    for path, entry in manifest.items():
+        sizes = [os.path.getsize(os.path.join(static_folder, DIST, file))
+                 for file in [entry["file"], *entry.get("variants", {}).values(),
+                              *entry.get("encodings", {}).values()]]
+        click.echo(f"{path}: {entry['size']:,} -> {min(sizes):,} bytes  ({entry['file']})")
+    click.echo(f"Built {len(manifest)} files into {os.path.join(static_folder, DIST)}")
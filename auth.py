@@ -0,0 +1,130 @@
+from flask import Blueprint, render_template, url_for, redirect, request, session, flash
+
+from models import db
+from shards import add_user, find_user, username_taken
+from sqlite_tuning import retry_on_busy, is_database_busy
+from profiles import remember_profile
+from passwords import PasswordHasherBusy, password_hasher
+
+auth = Blueprint("auth", __name__)
+
+
+# ==================== AUTHENTICATION ROUTES ====================
+
+@auth.route("/", methods=["GET", "POST"])
+@auth.route("/login", methods=["GET", "POST"])
+def login():
+    """Handle user login"""
+    if "username" in session:
+        return redirect(url_for("tasks.home"))
+    
+    if request.method == "POST":
+        username = request.form.get("username", "").strip()
+        password = request.form.get("password", "")
+        
+        if not username or not password:
+            flash("Username and password are required", "error")
+            return render_template("login.html")
+        
+        # Sharded, this also selects the user's shard for the rest of the request
+        found_user = find_user(username)
+        hasher = password_hasher()
+        
+        try:
+            valid = found_user is not None and hasher.verify(found_user.password_hash, password)
+        except PasswordHasherBusy:
+            flash("Too many sign-ins right now. Please try again in a moment.", "error")
+            return render_template("login.html"), 503
+        
+        if valid:
+            if hasher.needs_rehash(found_user.password_hash):
+                upgrade_password_hash(found_user, password)
+            
+            session.permanent = True
+            session["username"] = found_user.username
+            session["user_id"] = found_user.id
+            remember_profile(found_user)
+            flash(f"Welcome back, {found_user.full_name}!", "success")
+            return redirect(url_for("tasks.home"))
+        else:
+            flash("Invalid username or password", "error")
+            return render_template("login.html")
+    
+    return render_template("login.html")
+
+
+@auth.route("/register", methods=["GET", "POST"])
+@retry_on_busy
+def register():
+    """Handle user registration"""
+    if "username" in session:
+        return redirect(url_for("tasks.home"))
+    
+    if request.method == "POST":
+        full_name = request.form.get("name", "").strip()
+        username = request.form.get("username", "").strip()
+        password = request.form.get("password", "")
+        
+        if not full_name or not username or not password:
+            flash("All fields are required", "error")
+            return render_template("register.html")
+        
+        if len(username) < 3:
+            flash("Username must be at least 3 characters", "error")
+            return render_template("register.html")
+        
+        if len(password) < 6:
+            flash("Password must be at least 6 characters", "error")
+            return render_template("register.html")
+        
+        if username_taken(username):
+            flash("Username already taken. Please choose another.", "error")
+            return render_template("register.html")
+        
+        try:
+            hashed = password_hasher().hash(password)
+            user = add_user(full_name, username, hashed)
+            db.session.commit()
+            
+            session.permanent = True
+            session["username"] = user.username
+            session["user_id"] = user.id
+            remember_profile(user)
+            
+            flash(f"Welcome, {full_name}! Your account has been created.", "success")
+            return redirect(url_for("tasks.home"))
+        
+        except PasswordHasherBusy:
+            flash("Too many sign-ups right now. Please try again in a moment.", "error")
+            return render_template("register.html"), 503
+        
+        except Exception as e:
+            db.session.rollback()
+            if is_database_busy(e):
+                raise  # retried by @retry_on_busy
+            flash("An error occurred. Please try again.", "error")
+            print(f"Registration error: {e}")
+            return render_template("register.html")
+    
+    return render_template("register.html")
+
+
+def upgrade_password_hash(user, password):
+    """Re-hash a just-verified password with the configured method and cost
+    
+    Best effort: a failure here must not fail the login itself.
+    """
+    try:
+        user.password_hash = password_hasher().hash(password)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Password rehash error: {e}")
+
+
+@auth.route("/logout", methods=["POST"])
+def logout():
+    """Handle user logout"""
+    session.clear()
+    flash("You have been logged out", "success")
+    return redirect(url_for("auth.login"))
@@ -0,0 +1,212 @@
+"""
+Concurrency the threaded (wsgi.py) and async (asgi.py) servers reach within a memory budget.
+
+Seeds a fresh SQLite file like benchmarks.routes, then for each
+--concurrency level starts each server as one worker process on it:
+gunicorn gthread with that many request threads (and pooled connections,
+one per thread, as config.py sizes them), and uvicorn running asgi.py,
+whose requests share the fixed ASYNC_DB_POOL_SIZE connections. Level
+clients, each logged in as its own user, then send --requests requests
+at once (four GET /home to every POST /new-task). Reports throughput,
+p95 latency, errors and the server's peak resident memory per level, and
+per server the highest level served without errors inside --memory-mib.
+Exits non-zero if the async server fits fewer concurrent clients than the
+threaded one. Needs gunicorn, uvicorn and httpx installed.
+
+    python -m benchmarks.async_concurrency [--concurrency 8,32,128]
+        [--memory-mib N] [--requests N]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from app import create_app
+from benchmarks.routes import HASH_METHOD, PASSWORD, bench_config, percentile, seed
+from models import db
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_TIMEOUT = 30
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_command(mode, port, concurrency):
+    """(argv, extra environment) starting one worker of mode on port"""
+    if mode == "wsgi":
+        return ([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:application"],
+                {"WEB_BIND": f"127.0.0.1:{port}", "WEB_WORKERS": "1",
+                 "WEB_THREADS": str(concurrency), "WEB_WORKER_CLASS": "gthread"})
+    return ([sys.executable, "-m", "uvicorn", "asgi:application", "--port", str(port),
+             "--workers", "1", "--no-access-log", "--log-level", "warning"], {})
+
+
+def process_tree(pid):
+    """pid and every process below it"""
+    pids = [pid]
+    for parent in pids:
+        try:
+            with open(f"/proc/{parent}/task/{parent}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def peak_rss_kib(pid):
+    """Sum of the peak resident memory of pid and its children (gunicorn's arbiter and worker)"""
+    total = 0
+    for each in process_tree(pid):
+        try:
+            with open(f"/proc/{each}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total
+
+
+async def wait_until_up(base_url, process):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited with {process.returncode}")
+            try:
+                await client.get("/login")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"server not up after {STARTUP_TIMEOUT}s")
+
+
+async def client_loop(base_url, username, requests, rng, latencies):
+    """One logged-in user's requests; returns how many failed"""
+    failed = 0
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        response = await client.post("/login", data={"username": username, "password": PASSWORD})
+        failed += response.status_code >= 400
+        for n in range(requests):
+            start = time.perf_counter()
+            try:
+                if n % 5 == 4:
+                    response = await client.post("/new-task", data={
+                        "title": "Benchmark task", "description": "",
+                        "due_date": time.strftime("%Y-%m-%d")})
+                else:
+                    response = await client.get(f"/home?tab={rng.choice(['today', 'past', 'future'])}")
+                failed += response.status_code >= 400
+            except httpx.TransportError:
+                # Dropped by the server (e.g. a worker killed for timing out)
+                failed += 1
+            latencies.append(time.perf_counter() - start)
+    return failed
+
+
+async def drive(base_url, usernames, requests, seed_value):
+    latencies = []
+    started = time.perf_counter()
+    failures = await asyncio.gather(*[
+        client_loop(base_url, username, requests, random.Random(f"{seed_value}-{n}"), latencies)
+        for n, username in enumerate(usernames)
+    ])
+    wall = time.perf_counter() - started
+    return latencies, sum(failures), wall
+
+
+def run_level(mode, concurrency, db_path, args):
+    port = free_port()
+    argv, extra = server_command(mode, port, concurrency)
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", PASSWORD_HASH_METHOD=HASH_METHOD,
+               SECRET_KEY="benchmark", LIVE_EVENTS_BACKEND="null", **extra)
+    env.pop("ASYNC_DATABASE_URL", None)
+    process = subprocess.Popen(argv, cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        asyncio.run(wait_until_up(base_url, process))
+        usernames = [f"user{n}" for n in range(concurrency)]
+        latencies, errors, wall = asyncio.run(drive(base_url, usernames, args.requests, args.seed))
+        peak = peak_rss_kib(process.pid)
+    finally:
+        process.terminate()
+        process.wait(timeout=STARTUP_TIMEOUT)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": round(len(latencies) / wall, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "peak_rss_mib": round(peak / 1024, 1),
+    }
+
+
+def run(args, levels):
+    results = {"wsgi": {}, "asgi": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        app = create_app(bench_config(db_path))
+        with app.app_context():
+            db.create_all()
+            seed(max(levels), args.tasks, random.Random(args.seed))
+            db.engine.dispose()
+
+        for concurrency in levels:
+            for mode in results:
+                results[mode][concurrency] = run_level(mode, concurrency, db_path, args)
+    return results
+
+
+def fits(results, memory_mib):
+    """Highest level served without errors within memory_mib, or 0"""
+    return max((level for level, stats in results.items()
+                if not stats["errors"] and stats["peak_rss_mib"] <= memory_mib), default=0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", default="8,32,128",
+                        help="comma-separated numbers of concurrent clients")
+    parser.add_argument("--memory-mib", type=float, default=160,
+                        help="peak resident memory a server may use")
+    parser.add_argument("--requests", type=int, default=25, help="requests per client")
+    parser.add_argument("--tasks", type=int, default=200, help="seeded tasks per user")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    if httpx is None:
+        parser.error("needs httpx (pip install httpx gunicorn uvicorn)")
+    levels = sorted(int(level) for level in args.concurrency.split(","))
+
+    results = run(args, levels)
+    fitted = {mode: fits(stats, args.memory_mib) for mode, stats in results.items()}
+    failures = []
+    if fitted["asgi"] < fitted["wsgi"]:
+        failures.append(f"asgi serves {fitted['asgi']} clients within {args.memory_mib} MiB, "
+                        f"wsgi {fitted['wsgi']}")
+
+    print(json.dumps({
+        "settings": {"memory_mib": args.memory_mib, "requests": args.requests, "tasks": args.tasks},
+        "results": results,
+        "max_concurrency_within_budget": fitted,
+        "failures": failures,
+    }, indent=2))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+Idle-subscriber check for the GET /events live update streams.
+
+Opens --streams event streams at once through the test client, spread
+over --users users, each read by its own thread (standing in for the
+greenlet a gevent worker would give it). Once they are all idle it
+measures the memory each stream holds, the CPU they burn doing nothing
+for --idle seconds, and how long one event per user takes to reach every
+stream. Prints the numbers as JSON and exits non-zero if a stream costs
+more than --max-kib Python heap, or idle streams use more than
+--max-idle-cpu of one core. tests/test_live.py makes the same checks, and
+that idle streams start no threads and hold no database connections, at
+a fixed size; this script is for trying other sizes.
+
+    python -m benchmarks.live_subscribers [--streams N] [--users N] [--idle SECONDS]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from sqlalchemy import insert
+
+from config import Config
+from models import db, User
+
+# Small stacks: each reader thread only iterates one response
+READER_STACK_SIZE = 256 * 1024
+
+
+def bench_config(db_path, streams):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        LIVE_EVENTS_BACKEND = "memory"
+        LIVE_MAX_STREAMS = streams
+        # Nothing but the published events should wake a stream during the run
+        LIVE_HEARTBEAT_SECONDS = 3600
+        METRICS_ENABLED = False
+    return BenchConfig
+
+
+def rss_kib():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+class Readers:
+    """Counts chunks received across every reader thread"""
+
+    def __init__(self):
+        self.received = 0
+        self.condition = threading.Condition()
+
+    def read(self, response):
+        """Count one stream's chunks up to its first event, then close it"""
+        try:
+            for chunk in response.response:
+                if chunk.startswith(b":"):
+                    continue  # keep-alive
+                with self.condition:
+                    self.received += 1
+                    self.condition.notify_all()
+                if chunk.startswith(b"id:"):
+                    break
+        finally:
+            response.close()
+
+    def wait_for(self, count, timeout):
+        with self.condition:
+            return self.condition.wait_for(lambda: self.received >= count, timeout)
+
+
+def open_streams(app, user_ids, streams, readers):
+    """Open streams spread over user_ids, each read by its own thread; returns the threads"""
+    clients = []
+    for user_id in user_ids:
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["user_id"] = user_id
+        clients.append(client)
+
+    threads = []
+    previous_stack_size = threading.stack_size(READER_STACK_SIZE)
+    try:
+        for n in range(streams):
+            response = clients[n % len(clients)].get("/events", buffered=False)
+            if response.status_code != 200:
+                raise RuntimeError(f"stream {n}: HTTP {response.status_code}")
+            thread = threading.Thread(target=readers.read, args=(response,), daemon=True)
+            thread.start()
+            threads.append(thread)
+    finally:
+        threading.stack_size(previous_stack_size)
+    return threads
+
+
+def run(args):
+    from app import create_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(bench_config(os.path.join(tmp, "bench.db"), args.streams))
+        broker = app.extensions["live_events"]
+        with app.app_context():
+            db.create_all()
+            db.session.execute(insert(User), [
+                {"full_name": f"User {i}", "username": f"user{i}", "password_hash": "x"}
+                for i in range(args.users)
+            ])
+            db.session.commit()
+            user_ids = [row[0] for row in db.session.query(User.id).order_by(User.id)]
+
+        readers = Readers()
+        rss_before = rss_kib()
+        tracemalloc.start()
+        heap_before, _ = tracemalloc.get_traced_memory()
+
+        started = time.perf_counter()
+        open_streams(app, user_ids, args.streams, readers)
+        # The "retry:" line comes first; then each stream reads its revision and waits
+        if not readers.wait_for(args.streams, 60):
+            raise RuntimeError(f"only {readers.received} of {args.streams} streams started")
+        while broker.stats()["streams"] < args.streams:
+            time.sleep(0.01)
+        time.sleep(0.5)
+        opened = time.perf_counter() - started
+
+        heap_after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss_after = rss_kib()
+
+        cpu_before = time.process_time()
+        time.sleep(args.idle)
+        idle_cpu = (time.process_time() - cpu_before) / args.idle
+
+        streams_open = broker.stats()["streams"]
+        # One event per user reaches every one of their streams, whose readers then close them
+        expected = readers.received + args.streams
+        started = time.perf_counter()
+        for user_id in user_ids:
+            broker.publish(user_id, (10 ** 9, {"type": "changed"}))
+        delivered = readers.wait_for(expected, 60)
+        fan_out = time.perf_counter() - started
+
+        return {
+            "streams_open": streams_open,
+            "open_seconds": round(opened, 2),
+            "heap_kib_per_stream": round((heap_after - heap_before) / 1024 / args.streams, 2),
+            "rss_kib_per_stream": round((rss_after - rss_before) / args.streams, 2),
+            "idle_cpu_fraction": round(idle_cpu, 4),
+            "fan_out_ms": round(fan_out * 1000, 1),
+            "all_delivered": delivered,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--streams", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--idle", type=float, default=3.0, help="seconds to measure idle CPU over")
+    parser.add_argument("--max-kib", type=float, default=64.0,
+                        help="most Python heap one idle stream may hold")
+    parser.add_argument("--max-idle-cpu", type=float, default=0.05,
+                        help="most of one core idle streams may use (0.05 = 5%%)")
+    args = parser.parse_args(argv)
+    if args.users > args.streams:
+        parser.error("--users cannot exceed --streams")
+
+    results = run(args)
+    failures = []
+    if results["heap_kib_per_stream"] > args.max_kib:
+        failures.append(f"{results['heap_kib_per_stream']} KiB per stream (limit {args.max_kib})")
+    if results["idle_cpu_fraction"] > args.max_idle_cpu:
+        failures.append(f"idle streams used {results['idle_cpu_fraction']:.1%} of a core")
+    if not results["all_delivered"]:
+        failures.append("not every stream received its event")
+
+    print(json.dumps({
+        "settings": {name: getattr(args, name) for name in ("streams", "users", "idle")},
+        "results": results,
+        "failures": failures,
+    }, indent=2))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Password hashing benchmark for PASSWORD_HASH_METHOD candidates.
+
+For each method: raw hashes per second through the bounded hashing pool,
+then a login storm -- several threads posting to /login as fast as they
+can against a fresh database -- reporting logins per second, latency
+percentiles and how many attempts were refused with a 503 because the
+hashing queue was full. Results are printed as JSON.
+
+    python -m benchmarks.password_hashing [--threads N] [--seconds S]
+        [--method pbkdf2:sha256:600000 --method scrypt:32768:8:1 ...]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from config import Config
+from models import db, User
+from passwords import PasswordHasher
+
+DEFAULT_METHODS = [
+    "pbkdf2:sha256:260000",
+    "pbkdf2:sha256:600000",
+    "scrypt:16384:8:1",
+    "scrypt:32768:8:1",
+]
+PASSWORD = "correct horse"
+
+
+def bench_config(db_path, method, workers, max_pending):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        FRAGMENT_CACHE_BACKEND = "null"
+        PASSWORD_HASH_METHOD = method
+        PASSWORD_HASH_WORKERS = workers
+        PASSWORD_HASH_MAX_PENDING = max_pending
+    return BenchConfig
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def hash_rate(method, workers, seconds):
+    """Hashes per second with `workers` callers sharing one pool"""
+    hasher = PasswordHasher(method, workers=workers, max_pending=workers)
+    deadline = time.perf_counter() + seconds
+    counts = []
+
+    def loop():
+        count = 0
+        while time.perf_counter() < deadline:
+            hasher.hash(PASSWORD)
+            count += 1
+        counts.append(count)
+
+    with ThreadPoolExecutor(max_workers=workers) as callers:
+        for _ in range(workers):
+            callers.submit(loop)
+    hasher.shutdown()
+    return sum(counts) / seconds
+
+
+def login_storm(method, threads, workers, max_pending, seconds):
+    from app import create_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(bench_config(os.path.join(tmp, "bench.db"), method, workers, max_pending))
+        with app.app_context():
+            db.create_all()
+            stored = generate_password_hash(PASSWORD, method)
+            db.session.execute(insert(User), [
+                {"full_name": f"User {i}", "username": f"user{i}", "password_hash": stored}
+                for i in range(threads)
+            ])
+            db.session.commit()
+
+        latencies = []
+        refused = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def loop(n):
+            client = app.test_client()
+            mine, busy = [], 0
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = client.post("/login", data={"username": f"user{n}", "password": PASSWORD})
+                elapsed = time.perf_counter() - start
+                if response.status_code == 503:
+                    busy += 1
+                    continue
+                mine.append(elapsed)
+                # Log out again so the next attempt hashes instead of redirecting
+                with client.session_transaction() as sess:
+                    sess.clear()
+            with lock:
+                latencies.extend(mine)
+                refused.append(busy)
+
+        with ThreadPoolExecutor(max_workers=threads) as callers:
+            for n in range(threads):
+                callers.submit(loop, n)
+
+        app.extensions["password_hasher"].shutdown()
+        with app.app_context():
+            db.engine.dispose()
+
+    return {
+        "logins": len(latencies),
+        "refused": sum(refused),
+        "logins_per_second": round(len(latencies) / seconds, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--method", action="append", dest="methods")
+    parser.add_argument("--threads", type=int, default=16, help="concurrent login clients")
+    parser.add_argument("--workers", type=int, default=Config.PASSWORD_HASH_WORKERS)
+    parser.add_argument("--max-pending", type=int, default=Config.PASSWORD_HASH_MAX_PENDING)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args(argv)
+
+    report = []
+    for method in args.methods or DEFAULT_METHODS:
+        result = {"method": method, "workers": args.workers, "threads": args.threads,
+                  "hashes_per_second": round(hash_rate(method, args.workers, args.seconds), 1)}
+        result.update(login_storm(method, args.threads, args.workers, args.max_pending, args.seconds))
+        report.append(result)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+SQL statement budget check for every route.
+
+Seeds a throwaway SQLite file with a small user (a few tasks) and a
+large one (hundreds), then requests each route as both with
+RAISE_ON_LAZY_LOAD on, counting statements with querycount. Exits
+non-zero if a route goes over its budget, if the large user needs more
+statements than the small one (an N+1 in the making), or if a lazy load
+is attempted at all.
+
+    python -m benchmarks.query_counts [--large N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+
+from config import Config
+from archive import archive_user
+from models import db, User, Task, ArchivedTask, RecurrenceRule
+from queries import PRIORITY_GAP
+from querycount import count_queries
+
+# Route name -> (method, path template, request kwargs, statement budget).
+# Paths are formatted with the user's task ids: {today} (ongoing, due
+# today), {other} (a sibling of {today}), {past} (completed, overdue),
+# {archived}/{archived_other} (two archived tasks). Budgets include the
+# request's session: reading it costs every route a BEGIN and a SELECT,
+# and a route that flashes a message pays a BEGIN IMMEDIATE and an
+# INSERT to store it.
+ROUTES = {
+    "home today": ("GET", "/home?tab=today", {}, 6),
+    "home past": ("GET", "/home?tab=past", {}, 7),
+    "home future": ("GET", "/home?tab=future", {}, 6),
+    "load more": ("GET", "/home/more?tab=past&section=complete&after={past_cursor}", {}, 5),
+    "search": ("GET", "/search?q=task", {}, 5),
+    "edit task page": ("GET", "/edit-task/{today}", {}, 5),
+    "new task": ("POST", "/new-task", {"data": {"title": "New", "due_date": "{date}"}}, 7),
+    "edit task": ("POST", "/edit-task/{today}",
+                  {"data": {"title": "Edited", "description": "", "due_date": "{date}"}}, 8),
+    "toggle": ("POST", "/toggle-complete/{past}", {"data": {"tab": "past"}}, 6),
+    "reorder": ("POST", "/reorder-task/{other}?direction=up", {"data": {"tab": "today"}}, 7),
+    "move": ("POST", "/move-task/{today}", {"data": {"tab": "today", "after": "{other}"}}, 8),
+    "api list": ("GET", "/api/v1/tasks?tab=today", {}, 6),
+    "api get": ("GET", "/api/v1/tasks/{today}", {}, 4),
+    "api patch": ("PATCH", "/api/v1/tasks/{today}", {"json": {"title": "Patched"}}, 6),
+    "api toggle": ("POST", "/api/v1/tasks/{past}/toggle", {}, 6),
+    "api search": ("GET", "/api/v1/search?q=task", {}, 5),
+    "api bulk": ("POST", "/api/v1/tasks/bulk",
+                 {"json": {"operations": [{"op": "create", "title": f"Bulk {n}", "due_date": "{date}"}
+                                          for n in range(20)]}}, 6),
+    "api export": ("GET", "/api/v1/tasks/export?format=ndjson", {}, 5),
+    "admin users": ("GET", "/admin/", {}, 6),
+    "admin tasks": ("GET", "/admin/tasks", {}, 5),
+    "restore": ("POST", "/archive/{archived}/restore", {}, 9),
+    "api restore": ("POST", "/api/v1/archive/{archived_other}/restore", {}, 9),
+    "delete": ("POST", "/delete-task/{today}", {}, 8),
+}
+
+
+def bench_config(db_path):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        FRAGMENT_CACHE_BACKEND = "null"
+        RAISE_ON_LAZY_LOAD = True
+    return BenchConfig
+
+
+def seed(today, tasks):
+    """One admin user with `tasks` tasks around today, and a fifth as many archived; returns the ids routes need"""
+    username = f"user{tasks}"
+    db.session.execute(insert(User), [{"full_name": username, "username": username,
+                                       "password_hash": "x", "is_admin": True}])
+    user_id = db.session.query(User.id).filter_by(username=username).scalar()
+    db.session.execute(insert(Task), [
+        {"user_id": user_id, "title": f"Task {n}", "description": "seeded task",
+         "due_date": today + timedelta(days=(n % 9) - 4), "completed": n % 9 < 4 and n % 2 == 0,
+         "priority": (n + 1) * PRIORITY_GAP}
+        for n in range(tasks)
+    ] + [
+        {"user_id": user_id, "title": f"Old task {n}", "due_date": today - timedelta(days=400 + n),
+         "completed": True, "priority": PRIORITY_GAP}
+        for n in range(tasks // 5)
+    ])
+    # A daily repeating task, so routes pay for recurrence as well
+    db.session.execute(insert(RecurrenceRule), [{"user_id": user_id, "title": "Daily", "frequency": "daily",
+                                                 "interval": 1, "starts_on": today}])
+    User.query.filter_by(id=user_id).update({User.next_occurrence_on: today})
+    db.session.commit()
+    archive_user(user_id, today - timedelta(days=365), 1000)
+
+    def first(due_date, completed):
+        return Task.query.filter_by(user_id=user_id, due_date=due_date, completed=completed) \
+            .order_by(Task.priority).limit(2).all()
+
+    today_tasks = first(today, False)
+    past = first(today - timedelta(days=4), True)[0]
+    archived = ArchivedTask.query.filter_by(user_id=user_id).order_by(ArchivedTask.id).limit(2).all()
+    return user_id, {
+        "username": username,
+        "today": today_tasks[0].id,
+        "other": today_tasks[1].id,
+        "past": past.id,
+        "past_cursor": f"{past.due_date.isoformat()}.{past.id}",
+        "archived": archived[0].id,
+        "archived_other": archived[1].id,
+        "date": today.isoformat(),
+    }
+
+
+def fill(value, ids):
+    if isinstance(value, str):
+        return value.format(**ids)
+    if isinstance(value, dict):
+        return {key: fill(item, ids) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill(item, ids) for item in value]
+    return value
+
+
+def measure(app, user_id, ids):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+        sess["username"] = ids["username"]
+    client.get("/home")  # warm the profile cache and create today's repeating task
+
+    counts = {}
+    for name, (method, path, kwargs, _) in ROUTES.items():
+        # Redirects are not followed, so drop what the last route flashed
+        with client.session_transaction() as sess:
+            sess.pop("_flashes", None)
+        with app.app_context(), count_queries() as queries:
+            response = client.open(fill(path, ids), method=method, **fill(kwargs, ids))
+            response.get_data()
+        if response.status_code >= 500:
+            raise RuntimeError(f"{name}: HTTP {response.status_code}")
+        counts[name] = len(queries)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--small", type=int, default=20, help="tasks of the small user")
+    parser.add_argument("--large", type=int, default=500, help="tasks of the large user")
+    args = parser.parse_args(argv)
+
+    from app import create_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(bench_config(os.path.join(tmp, "bench.db")))
+        today = date.today()
+        with app.app_context():
+            db.create_all()
+            small = seed(today, args.small)
+            large = seed(today, args.large)
+
+        small_counts = measure(app, *small)
+        large_counts = measure(app, *large)
+
+        with app.app_context():
+            db.engine.dispose()
+
+    failures = 0
+    for name, (_, _, _, budget) in ROUTES.items():
+        problems = []
+        if large_counts[name] > budget:
+            problems.append(f"over budget of {budget}")
+        if large_counts[name] > small_counts[name]:
+            problems.append("grows with the number of tasks")
+        failures += bool(problems)
+        status = "FAIL" if problems else "ok"
+        print(f"[{status}] {name}: {small_counts[name]} / {large_counts[name]} statements"
+              + (f" ({', '.join(problems)})" if problems else ""))
+
+    if failures:
+        print(f"\n{failures} route{'s' if failures != 1 else ''} over budget")
+        return 1
+    print("\nAll routes within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
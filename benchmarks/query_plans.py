@@ -0,0 +1,143 @@
+"""
+Query-plan regression check for the hot Task queries.
+
+Seeds a throwaway SQLite database, runs EXPLAIN QUERY PLAN on every query
+in queries.py (and recurrence.py's, archive.py's and sessions.py's) and
+exits non-zero if any of them falls back to a full scan of the tasks,
+archived_tasks, recurrence_rules, recurrence_skips or sessions table.
+
+    python -m benchmarks.query_plans [--users N] [--tasks-per-user N]
+
+tests/test_query_plans.py runs the same check under pytest.
+"""
+import argparse
+import re
+import sys
+from datetime import date, timedelta
+
+from flask import Flask
+from sqlalchemy import insert, select
+
+from config import Config
+from models import db, User, Task, ArchivedTask, RecurrenceSkip
+import archive
+import queries
+import recurrence
+import sessions
+
+# "SCAN tasks" with no index is a full table scan; "SCAN tasks USING
+# [COVERING] INDEX ..." walks an index and is fine.
+FULL_SCAN = re.compile(r"\bSCAN ((archived_)?tasks\w*|recurrence_\w+|sessions)(?! USING (COVERING )?INDEX)")
+
+
+def create_check_app():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    return app
+
+
+def seed(users, tasks_per_user, today):
+    """Bulk insert users and tasks spread around today"""
+    db.session.execute(insert(User), [
+        {"full_name": f"User {i}", "username": f"user{i}", "password_hash": "x"}
+        for i in range(users)
+    ])
+    user_ids = [row[0] for row in db.session.query(User.id)]
+    rows = []
+    for user_id in user_ids:
+        for n in range(tasks_per_user):
+            rows.append({
+                "user_id": user_id,
+                "title": f"Task {n}",
+                "due_date": today + timedelta(days=(n % 90) - 60),
+                "completed": n % 3 == 0,
+                "priority": (n + 1) * queries.PRIORITY_GAP,
+            })
+    db.session.execute(insert(Task), rows)
+    db.session.commit()
+    # Give the planner real statistics, as a long-lived database would have
+    db.session.execute(db.text("ANALYZE"))
+    return user_ids[0]
+
+
+def explain(query):
+    """Return the EXPLAIN QUERY PLAN detail lines for an ORM query"""
+    statement = getattr(query, "statement", query)
+    # render_postcompile expands IN (...) lists into one placeholder per value
+    compiled = statement.compile(dialect=db.engine.dialect,
+                                 compile_kwargs={"render_postcompile": True})
+    params = [compiled.params[name] for name in compiled.positiontup]
+    params = [p.isoformat() if isinstance(p, date) else p for p in params]
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), tuple(params))
+        return [row[-1] for row in rows]
+
+
+def hot_queries(user_id, today, page_size=50):
+    """Every query the request handlers run against the tasks table"""
+    cursor = f"{today.isoformat()}.1"
+    sibling = Task(id=1, user_id=user_id, due_date=today, completed=False, priority=queries.PRIORITY_GAP)
+    return {
+        **{f"home {tab}": queries.dashboard_query(user_id, tab, today, page_size)
+           for tab in queries.TABS},
+        **{f"load more {tab}/{section}": queries.section_query(user_id, tab, today, section)
+                                             .filter(queries.after_cursor(tab, cursor))
+                                             .limit(page_size + 1)
+           for tab in queries.PAGED_TABS
+           for section in queries.TAB_SECTIONS[tab]},
+        "new_task next priority": select(queries.next_priority(user_id, today)),
+        "reorder neighbours up": queries.neighbours_query(sibling, "up").limit(2),
+        "reorder neighbours down": queries.neighbours_query(sibling, "down").limit(2),
+        "rebalance siblings": queries.reorder_siblings_query(user_id, today, False),
+        "admin user aggregates": queries.user_aggregates_query(list(range(user_id, user_id + 100)), today),
+        "admin recent tasks": queries.recent_tasks_query(queries.NEWEST, page_size),
+        "recurrence active rules": recurrence.active_rules(user_id, today),
+        "recurrence upcoming": recurrence.upcoming_query(user_id, today, today + timedelta(days=90)),
+        "recurrence skips due": select(RecurrenceSkip.rule_id).where(RecurrenceSkip.rule_id.in_([1, 2]),
+                                                                     RecurrenceSkip.day == today),
+        "archive past page": queries.archived_query(user_id).limit(page_size + 1),
+        "archive load more": queries.archived_query(user_id)
+                                    .filter(queries.after_cursor("past", cursor, ArchivedTask))
+                                    .limit(page_size + 1),
+        "archive users": archive.archivable_users_query(list(range(user_id, user_id + 100)), today),
+        "archive batch": archive.archive_statement(user_id, today, 1000),
+        "restore batch": archive.restore_statement(user_id, [1, 2, 3]),
+        "session load": sessions.load_statement("0" * 64, 0),
+        "session sweep": sessions.expired_statement(0, 1000),
+        "session revoke": sessions.user_sessions_statement(user_id),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--tasks-per-user", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    app = create_check_app()
+    failures = 0
+    with app.app_context():
+        db.create_all()
+        today = date.today()
+        user_id = seed(args.users, args.tasks_per_user, today)
+
+        for name, query in hot_queries(user_id, today).items():
+            plan = explain(query)
+            scans = [line for line in plan if FULL_SCAN.search(line)]
+            status = "FAIL" if scans else "ok"
+            failures += bool(scans)
+            print(f"[{status}] {name}")
+            for line in plan:
+                print(f"       {line}")
+
+    if failures:
+        print(f"\n{failures} quer{'y' if failures == 1 else 'ies'} fell back to a full table scan")
+        return 1
+    print("\nAll queries use an index")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""
+Load test for the HTML routes, with a stored baseline to compare against.
+
+Seeds a fresh SQLite file with --users users of --tasks tasks each
+(spread over the weeks around today, some completed), then runs one
+phase per scenario: --threads test clients, each logged in as its own
+user, send --requests requests to that route at once. Every phase
+reports throughput, latency percentiles and errors as JSON.
+
+--save FILE stores the report as a baseline; --baseline FILE compares
+against one and exits non-zero if any scenario's p95 latency rose, or
+its throughput fell, by more than --tolerance. Baselines only mean
+something on the machine that recorded them.
+
+    python -m benchmarks.routes [--users N] [--tasks N] [--threads N]
+        [--requests N] [--save FILE | --baseline FILE]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from config import Config
+from models import db, User, Task
+from queries import PRIORITY_GAP
+
+PASSWORD = "correct horse"
+# Login cost is benchmarks/password_hashing.py's business; keep it cheap here
+HASH_METHOD = "pbkdf2:sha256:1000"
+
+
+def bench_config(db_path):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        PASSWORD_HASH_METHOD = HASH_METHOD
+    return BenchConfig
+
+
+def seed(users, tasks, rng):
+    """users users with tasks tasks each; returns [(username, [task ids])]"""
+    today = date.today()
+    stored = generate_password_hash(PASSWORD, HASH_METHOD)
+    db.session.execute(insert(User), [
+        {"full_name": f"User {i}", "username": f"user{i}", "password_hash": stored}
+        for i in range(users)
+    ])
+    user_ids = [row[0] for row in db.session.query(User.id).order_by(User.id)]
+
+    rows = []
+    for user_id in user_ids:
+        for n in range(tasks):
+            offset = rng.randint(-30, 30)
+            rows.append({"user_id": user_id, "title": f"Task {n}",
+                         "description": "Seeded for benchmarks.routes" if n % 3 == 0 else None,
+                         "due_date": today + timedelta(days=offset),
+                         "completed": offset < 0 and rng.random() < 0.7,
+                         "priority": (n + 1) * PRIORITY_GAP})
+    db.session.execute(insert(Task), rows)
+    db.session.commit()
+
+    task_ids = {}
+    for user_id, task_id in db.session.query(Task.user_id, Task.id).order_by(Task.id):
+        task_ids.setdefault(user_id, []).append(task_id)
+    return [(f"user{i}", task_ids.get(user_id, [])) for i, user_id in enumerate(user_ids)]
+
+
+# ==================== SCENARIOS ====================
+# Each takes (client, worker state, rng) and sends one request. Worker
+# state is the user's username and a shuffled list of their task ids;
+# delete_task pops from it, so it runs last.
+
+def login(client, state, rng):
+    with client.session_transaction() as sess:
+        sess.clear()
+    return client.post("/login", data={"username": state["username"], "password": PASSWORD})
+
+
+def home(tab):
+    def scenario(client, state, rng):
+        return client.get(f"/home?tab={tab}")
+    return scenario
+
+
+def new_task(client, state, rng):
+    due = date.today() + timedelta(days=rng.randint(0, 7))
+    return client.post("/new-task", data={"title": "Benchmark task", "description": "",
+                                          "due_date": due.isoformat()})
+
+
+def edit_task(client, state, rng):
+    due = date.today() + timedelta(days=rng.randint(-3, 7))
+    return client.post(f"/edit-task/{rng.choice(state['tasks'])}",
+                       data={"title": "Edited task", "description": "Edited by the benchmark",
+                             "due_date": due.isoformat()})
+
+
+def toggle_complete(client, state, rng):
+    return client.post(f"/toggle-complete/{rng.choice(state['tasks'])}", data={"tab": "today"})
+
+
+def reorder_task(client, state, rng):
+    return client.post(f"/reorder-task/{rng.choice(state['tasks'])}?direction={rng.choice(['up', 'down'])}",
+                       data={"tab": "today"})
+
+
+def delete_task(client, state, rng):
+    return client.post(f"/delete-task/{state['tasks'].pop()}")
+
+
+SCENARIOS = {
+    "login": login,
+    "home_today": home("today"),
+    "home_past": home("past"),
+    "home_future": home("future"),
+    "new_task": new_task,
+    "edit_task": edit_task,
+    "toggle_complete": toggle_complete,
+    "reorder_task": reorder_task,
+    "delete_task": delete_task,
+}
+
+
+# ==================== RUNNING ====================
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_phase(scenario, clients, states, rngs, requests):
+    """Every client sends `requests` requests at once; returns the phase's stats"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    start_line = threading.Barrier(len(clients) + 1)
+
+    def loop(n):
+        client, state, rng = clients[n], states[n], rngs[n]
+        mine, failed = [], 0
+        start_line.wait()
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = scenario(client, state, rng)
+            response.get_data()
+            mine.append(time.perf_counter() - start)
+            failed += response.status_code >= 400
+        with lock:
+            latencies.extend(mine)
+            errors.append(failed)
+
+    with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+        futures = [pool.submit(loop, n) for n in range(len(clients))]
+        start_line.wait()
+        started = time.perf_counter()
+        for future in futures:
+            future.result()
+        wall = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors),
+        "requests_per_second": round(len(latencies) / wall, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def run(args):
+    from app import create_app
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(bench_config(os.path.join(tmp, "bench.db")))
+        with app.app_context():
+            db.create_all()
+            users = seed(args.users, args.tasks, rng)
+
+        clients, states, rngs = [], [], []
+        for n in range(args.threads):
+            username, task_ids = users[n]
+            rng.shuffle(task_ids)
+            clients.append(app.test_client())
+            states.append({"username": username, "tasks": task_ids})
+            rngs.append(random.Random(f"{args.seed}-{n}"))
+
+        results = {}
+        for name, scenario in SCENARIOS.items():
+            results[name] = run_phase(scenario, clients, states, rngs, args.requests)
+
+        with app.app_context():
+            db.engine.dispose()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Human-readable regressions of results against a baseline report"""
+    regressions = []
+    for name, before in baseline["scenarios"].items():
+        now = results.get(name)
+        if now is None:
+            continue
+        if now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {now['p95_ms']}ms")
+        if now["requests_per_second"] < before["requests_per_second"] * (1 - tolerance):
+            regressions.append(f"{name}: {before['requests_per_second']} -> "
+                               f"{now['requests_per_second']} requests/s")
+        if now["errors"] > before["errors"]:
+            regressions.append(f"{name}: {before['errors']} -> {now['errors']} errors")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--tasks", type=int, default=500, help="tasks per user")
+    parser.add_argument("--threads", type=int, default=8, help="concurrent clients, one user each")
+    parser.add_argument("--requests", type=int, default=100, help="requests per client per scenario")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", metavar="FILE", help="write the report here as a baseline")
+    parser.add_argument("--baseline", metavar="FILE", help="compare against this report")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown before a scenario counts as regressed (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+    if args.threads > args.users:
+        parser.error("--threads cannot exceed --users")
+    if args.requests > args.tasks:
+        parser.error("--requests cannot exceed --tasks (delete_task removes one task per request)")
+
+    report = {
+        "settings": {name: getattr(args, name) for name in ("users", "tasks", "threads", "requests", "seed")},
+        "scenarios": run(args),
+    }
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != report["settings"]:
+            print("warning: baseline was recorded with different settings", file=sys.stderr)
+        report["regressions"] = compare(report["scenarios"], baseline, args.tolerance)
+        status = 1 if report["regressions"] else 0
+
+    print(json.dumps(report, indent=2))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Full-text search benchmark on a large synthetic corpus.
+
+Seeds a fresh SQLite file with --tasks tasks (one million by default)
+spread over --users users; the FTS index is filled by the same triggers
+the application relies on. Then runs a mix of query shapes (a common
+word, a rare word, two words, a prefix) for random users through
+search.search_tasks(), and the same queries as a user-scoped LIKE for
+comparison. Reports seeding time and per-shape p50/p99 latency as JSON.
+
+    python -m benchmarks.search [--tasks N] [--users N] [--queries N]
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+
+from config import Config
+from models import db, User, Task
+from queries import PRIORITY_GAP
+from search import search_tasks, like_search
+
+BATCH = 10000
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "do", "fi", "gu", "he"]
+
+
+def bench_config(db_path):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        FRAGMENT_CACHE_BACKEND = "null"
+    return BenchConfig
+
+
+def vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+def seed(app, rng, words, tasks, users):
+    """Insert users and tasks; word frequencies follow a Zipf-like curve"""
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    start_day = date.today() - timedelta(days=365)
+
+    def text(k):
+        return " ".join(rng.choices(words, cum_weights=cum_weights, k=k))
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(User), [
+            {"full_name": f"User {i}", "username": f"user{i}", "password_hash": "x"}
+            for i in range(users)
+        ])
+        for offset in range(0, tasks, BATCH):
+            db.session.execute(insert(Task), [
+                {"user_id": 1 + n % users, "title": text(rng.randint(2, 6)),
+                 "description": text(rng.randint(0, 30)) or None,
+                 "due_date": start_day + timedelta(days=n % 730),
+                 "completed": n % 3 == 0, "priority": (n // users + 1) * PRIORITY_GAP}
+                for n in range(offset, min(offset + BATCH, tasks))
+            ])
+            db.session.commit()
+
+
+def measure(app, rng, words, users, queries, search):
+    """p50/p99 milliseconds per query shape"""
+    shapes = {
+        "common_word": lambda: words[rng.randint(0, 9)],
+        "rare_word": lambda: words[rng.randint(len(words) // 2, len(words) - 1)],
+        "two_words": lambda: f"{words[rng.randint(0, 49)]} {words[rng.randint(0, 49)]}",
+        "prefix": lambda: words[rng.randint(0, 99)][:4] + "*",
+    }
+    limit = Config.SEARCH_RESULTS_LIMIT
+    report = {}
+    with app.app_context():
+        for shape, make_query in shapes.items():
+            timings = []
+            for _ in range(queries):
+                user_id, query = rng.randint(1, users), make_query()
+                start = time.perf_counter()
+                search(user_id, query, limit)
+                timings.append((time.perf_counter() - start) * 1000)
+                db.session.rollback()
+            timings.sort()
+            report[shape] = {"p50_ms": round(statistics.median(timings), 2),
+                             "p99_ms": round(timings[int(len(timings) * 0.99)], 2)}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--words", type=int, default=5000, help="vocabulary size")
+    parser.add_argument("--queries", type=int, default=200, help="queries per shape")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    from app import create_app
+
+    rng = random.Random(args.seed)
+    words = vocabulary(rng, args.words)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        app = create_app(bench_config(db_path))
+
+        start = time.perf_counter()
+        seed(app, rng, words, args.tasks, args.users)
+        seed_seconds = time.perf_counter() - start
+
+        report = {
+            "tasks": args.tasks,
+            "users": args.users,
+            "seed_seconds": round(seed_seconds, 1),
+            "database_mb": round(os.path.getsize(db_path) / 2 ** 20, 1),
+            "fts5": measure(app, random.Random(args.seed), words, args.users, args.queries, search_tasks),
+            "like": measure(app, random.Random(args.seed), words, args.users, args.queries, like_search),
+        }
+        with app.app_context():
+            db.engine.dispose()
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
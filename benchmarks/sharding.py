@@ -0,0 +1,177 @@
+"""
+Concurrent write load test for per-user sharding (shards.py).
+
+Runs the same workload once per --shards count against fresh database
+files: 0 is today's single database, any other count splits the users
+over that many shard files. Several processes, each logged in as its own
+user, toggle and reorder that user's tasks through the JSON API as fast as
+they can, as benchmarks.sqlite_writes does. Reports throughput and failed
+requests per count, and the time writes spent waiting for SQLite's write
+lock. Writers on different shards never wait on each other's lock, so on
+a multi-core box throughput grows with the shard count until the cores
+run out; with a single core the writes are CPU-bound either way. Exits
+non-zero if any write fails, or if on a multi-core box the most shards
+write slower than the single database.
+
+    python -m benchmarks.sharding [--shards 0,2,4] [--synchronous FULL]
+        [--workers N] [--seconds S]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from flask import g
+from sqlalchemy import event, insert
+
+from benchmarks.sqlite_writes import TASKS_PER_USER
+from config import Config
+from models import db, Task
+from queries import PRIORITY_GAP
+from shards import add_user
+
+
+def bench_config(tmp, shards, synchronous):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        DB_SHARDS = shards
+        DB_SHARD_URL = f"sqlite:///{os.path.join(tmp, 'bench-shard{shard}.db')}"
+        SQLITE_SYNCHRONOUS = synchronous
+        FRAGMENT_CACHE_BACKEND = "null"
+    return BenchConfig
+
+
+def seed(app, users):
+    """{user_id: task ids} for `users` new users, and how many users each database got"""
+    from app import init_db
+
+    task_ids = {}
+    placement = Counter()
+    with app.app_context():
+        init_db()
+        for i in range(users):
+            user = add_user(f"User {i}", f"user{i}", "x")
+            db.session.flush()
+            db.session.execute(insert(Task), [
+                {"user_id": user.id, "title": f"Task {n}", "due_date": date.today(),
+                 "completed": False, "priority": (n + 1) * PRIORITY_GAP}
+                for n in range(TASKS_PER_USER)
+            ])
+            db.session.commit()
+            task_ids[user.id] = [row[0] for row in db.session.query(Task.id).filter_by(user_id=user.id)]
+            placement[g.get("shard") or "main"] += 1
+        for engine in db.engines.values():
+            engine.dispose()
+    return task_ids, dict(placement)
+
+
+def time_lock_waits(app):
+    """A one-item list the seconds app's requests spend in BEGIN IMMEDIATE accumulate in"""
+    waited = [0.0]
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        if statement == "BEGIN IMMEDIATE":
+            conn.info["lock_requested"] = time.perf_counter()
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        if statement == "BEGIN IMMEDIATE":
+            waited[0] += time.perf_counter() - conn.info.pop("lock_requested")
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", before)
+            event.listen(engine, "after_cursor_execute", after)
+    return waited
+
+
+def worker(tmp, shards, synchronous, user_id, task_ids, seconds):
+    """Hammer the write endpoints for one user; returns (ok, failed, seconds waiting for the write lock)"""
+    from app import create_app
+
+    app = create_app(bench_config(tmp, shards, synchronous))
+    lock_wait = time_lock_waits(app)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+
+    ok = failed = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        task_id = random.choice(task_ids)
+        if random.random() < 0.5:
+            response = client.post(f"/api/v1/tasks/{task_id}/toggle")
+        else:
+            response = client.post(f"/api/v1/tasks/{task_id}/reorder",
+                                   json={"direction": random.choice(["up", "down"])})
+        if response.status_code < 400:
+            ok += 1
+        else:
+            failed += 1
+    return ok, failed, lock_wait[0]
+
+
+def run(shards, synchronous, workers, seconds):
+    from app import create_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        task_ids, placement = seed(create_app(bench_config(tmp, shards, synchronous)), workers)
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(worker, tmp, shards, synchronous, user_id, ids, seconds)
+                       for user_id, ids in task_ids.items()]
+            results = [f.result() for f in futures]
+
+    ok = sum(r[0] for r in results)
+    failed = sum(r[1] for r in results)
+    lock_wait = sum(r[2] for r in results)
+    return {
+        "shards": shards,
+        "users_per_shard": placement,
+        "workers": workers,
+        "seconds": seconds,
+        "writes_ok": ok,
+        "writes_failed": failed,
+        "writes_per_second": round(ok / seconds, 1),
+        "lock_wait_ms_per_write": round(lock_wait * 1000 / max(ok, 1), 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--shards", default="0,2,4",
+                        help="comma-separated shard counts (0: one unsharded database)")
+    parser.add_argument("--synchronous", default="FULL",
+                        help="SQLITE_SYNCHRONOUS; FULL syncs every commit while it holds the write lock")
+    parser.add_argument("--workers", type=int, default=max(os.cpu_count() or 4, 4))
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args(argv)
+    counts = sorted(int(count) for count in args.shards.split(","))
+
+    report = [run(count, args.synchronous, args.workers, args.seconds) for count in counts]
+    baseline, most = report[0], report[-1]
+    cores = os.cpu_count() or 1
+    failures = []
+    if cores > 1 and most["writes_per_second"] < baseline["writes_per_second"]:
+        failures.append(f"{most['shards']} shards write {most['writes_per_second']}/s, "
+                        f"{baseline['shards']} write {baseline['writes_per_second']}/s")
+    failures.extend(f"{result['writes_failed']} writes failed with {result['shards']} shards"
+                    for result in report if result["writes_failed"])
+
+    print(json.dumps({
+        "settings": {"synchronous": args.synchronous, "workers": args.workers,
+                     "seconds": args.seconds, "cores": cores},
+        "results": report,
+        "speedup": round(most["writes_per_second"] / max(baseline["writes_per_second"], 0.1), 2),
+        "failures": failures,
+    }, indent=2))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Concurrent write load test for the SQLite tuning in sqlite_tuning.py.
+
+Runs the same workload twice against a fresh database file: once with
+SQLITE_TUNING off (rollback journal, deferred transactions, no retries)
+and once with the configured WAL/pragma/retry settings. Several processes
+each toggle and reorder their user's tasks through the JSON API as fast as
+they can; the report shows throughput and failed requests for each run.
+
+    python -m benchmarks.sqlite_writes [--workers N] [--seconds S]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from sqlalchemy import insert
+
+from config import Config
+from models import db, User, Task
+from queries import PRIORITY_GAP
+
+TASKS_PER_USER = 20
+
+
+def bench_config(db_path, tuned):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        SQLITE_TUNING = tuned
+        DB_WRITE_RETRIES = Config.DB_WRITE_RETRIES if tuned else 0
+        FRAGMENT_CACHE_BACKEND = "null"
+    return BenchConfig
+
+
+def seed(app, users):
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(User), [
+            {"full_name": f"User {i}", "username": f"user{i}", "password_hash": "x"}
+            for i in range(users)
+        ])
+        user_ids = [row[0] for row in db.session.query(User.id).order_by(User.id)]
+        db.session.execute(insert(Task), [
+            {"user_id": user_id, "title": f"Task {n}", "due_date": date.today(),
+             "completed": False, "priority": (n + 1) * PRIORITY_GAP}
+            for user_id in user_ids for n in range(TASKS_PER_USER)
+        ])
+        db.session.commit()
+        task_ids = {
+            user_id: [row[0] for row in db.session.query(Task.id).filter_by(user_id=user_id)]
+            for user_id in user_ids
+        }
+        db.engine.dispose()
+    return task_ids
+
+
+def worker(db_path, tuned, user_id, task_ids, seconds):
+    """Hammer the write endpoints for one user; returns (ok, failed)"""
+    from app import create_app
+
+    app = create_app(bench_config(db_path, tuned))
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+
+    ok = failed = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        task_id = random.choice(task_ids)
+        if random.random() < 0.5:
+            response = client.post(f"/api/v1/tasks/{task_id}/toggle")
+        else:
+            response = client.post(f"/api/v1/tasks/{task_id}/reorder",
+                                   json={"direction": random.choice(["up", "down"])})
+        if response.status_code < 400:
+            ok += 1
+        else:
+            failed += 1
+    return ok, failed
+
+
+def run(tuned, workers, seconds):
+    from app import create_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        task_ids = seed(create_app(bench_config(db_path, tuned)), workers)
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(worker, db_path, tuned, user_id, ids, seconds)
+                       for user_id, ids in task_ids.items()]
+            results = [f.result() for f in futures]
+
+    ok = sum(r[0] for r in results)
+    failed = sum(r[1] for r in results)
+    return {
+        "sqlite_tuning": tuned,
+        "workers": workers,
+        "seconds": seconds,
+        "writes_ok": ok,
+        "writes_failed": failed,
+        "writes_per_second": round(ok / seconds, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args(argv)
+
+    report = [run(tuned, args.workers, args.seconds) for tuned in (False, True)]
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""
+Startup-time benchmark for the application factory.
+
+Each run starts a fresh interpreter, imports app.py, calls create_app()
+and checks that no URL rule was registered twice. Reports median and best
+times over all runs as JSON.
+
+    python -m benchmarks.startup [--runs N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+
+rules = [(r.rule, tuple(sorted(r.methods))) for r in application.url_map.iter_rules()]
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "rules": len(rules),
+    "duplicate_rules": len(rules) - len(set(rules)),
+}))
+"""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    samples = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, "-c", PROBE], cwd=root,
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output))
+
+    report = {"runs": args.runs, "rules": samples[0]["rules"],
+              "duplicate_rules": samples[0]["duplicate_rules"]}
+    for key in ("import_ms", "create_app_ms"):
+        values = [sample[key] for sample in samples]
+        report[key] = {"median": round(statistics.median(values), 2),
+                       "best": round(min(values), 2)}
+    print(json.dumps(report, indent=2))
+    return 1 if report["duplicate_rules"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""
+First-paint bytes and repeat-visit requests for the pages, before and after `flask assets build`.
+
+Copies static/ to a temporary folder and loads /login, /register and
+/home through the test client the way a current browser would (Accept-
+Encoding: br, gzip; AVIF and WebP accepted), fetching every stylesheet,
+icon and image the page uses and the images its CSS uses. Does this
+once serving the plain files and once serving a fresh build, and prints
+per page the bytes transferred and how many of the assets a repeat visit
+must ask the server about again (anything not cached as immutable).
+Exits non-zero if the build does not cut both.
+
+    python -m benchmarks.static_assets
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from sqlalchemy import insert
+
+from assets import AssetManifest, brotli, build_assets
+from config import Config
+from models import db, User
+
+PAGES = ["/login", "/register", "/home"]
+BROWSER_HEADERS = {
+    "Accept-Encoding": "br, gzip",
+    "Accept": "image/avif,image/webp,image/png,image/*;q=0.8,*/*;q=0.5",
+}
+BROWSER_IMAGE_TYPES = ("image/avif", "image/webp", "image/png", "image/jpeg")
+
+CSS_IMAGE_SET = re.compile(r"image-set\(([^;}]*)\)")
+CSS_FALLBACK = re.compile(r"background-image:url\([^)]*\);(?=background-image:image-set\()")
+CSS_URL = re.compile(r"""url\(\s*['"]?([^'")]+)['"]?\s*\)""")
+
+
+def bench_config(db_path):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        METRICS_ENABLED = False
+    return BenchConfig
+
+
+class PageAssets(HTMLParser):
+    """URLs a browser fetches for a page's stylesheets, icons and images"""
+
+    def __init__(self):
+        super().__init__()
+        self.urls = []
+        self._source_picked = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "link" and attrs.get("rel") in ("stylesheet", "icon"):
+            self.urls.append(attrs["href"])
+        elif tag == "picture":
+            self._source_picked = False
+        elif tag == "source" and not self._source_picked and attrs.get("type") in BROWSER_IMAGE_TYPES:
+            self.urls.append(attrs["srcset"])
+            self._source_picked = True
+        elif tag == "img":
+            if not self._source_picked:
+                self.urls.append(attrs["src"])
+            self._source_picked = False
+
+
+def css_images(css):
+    """URLs a browser fetches for the images in a stylesheet: the first of each image-set(), and every other url()"""
+    # The plain url() declared before an image-set() is overridden, not fetched
+    css = CSS_FALLBACK.sub("", css)
+    urls = [CSS_URL.search(image_set[1])[1] for image_set in CSS_IMAGE_SET.finditer(css)]
+    return urls + CSS_URL.findall(CSS_IMAGE_SET.sub("", css))
+
+
+def load_page(client, path):
+    """{"bytes", "requests", "repeat_requests"} for loading path and everything it uses"""
+    response = client.get(path, headers=BROWSER_HEADERS)
+    html = response.get_data(as_text=True)
+    total = len(response.get_data())
+
+    parser = PageAssets()
+    parser.feed(html)
+    queue = list(parser.urls)
+    seen = set()
+    assets = revalidated = 0
+    while queue:
+        url = queue.pop(0)
+        if url in seen:
+            continue
+        seen.add(url)
+        response = client.get(url, headers=BROWSER_HEADERS)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path}: {url} returned HTTP {response.status_code}")
+        body = response.get_data()
+        total += len(body)
+        assets += 1
+        if not response.cache_control.immutable:
+            revalidated += 1
+        if response.mimetype == "text/css":
+            css = _decoded(body, response.content_encoding)
+            queue.extend(urljoin(url, ref) for ref in css_images(css))
+    return {"bytes": total, "requests": 1 + assets, "repeat_requests": 1 + revalidated}
+
+
+def _decoded(body, encoding):
+    if encoding == "br":
+        return brotli.decompress(body).decode("utf-8")
+    if encoding == "gzip":
+        return gzip.decompress(body).decode("utf-8")
+    return body.decode("utf-8")
+
+
+def load_pages(app):
+    client = app.test_client()
+    with app.app_context():
+        user_id = db.session.query(User.id).filter_by(username="bench").scalar()
+    results = {}
+    for path in PAGES:
+        with client.session_transaction() as sess:
+            sess.clear()
+            if path == "/home":
+                sess["user_id"] = user_id
+                sess["username"] = "bench"
+        results[path] = load_page(client, path)
+    return results
+
+
+def run():
+    from app import create_app
+
+    source = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+    with tempfile.TemporaryDirectory() as tmp:
+        static_folder = os.path.join(tmp, "static")
+        shutil.copytree(source, static_folder, ignore=shutil.ignore_patterns("dist"))
+
+        app = create_app(bench_config(os.path.join(tmp, "bench.db")))
+        app.static_folder = static_folder
+        with app.app_context():
+            db.create_all()
+            db.session.execute(insert(User), [{"full_name": "Bench", "username": "bench",
+                                               "password_hash": "x"}])
+            db.session.commit()
+
+        app.extensions["assets"] = AssetManifest.load(static_folder)
+        before = load_pages(app)
+        build_assets(static_folder)
+        app.extensions["assets"] = AssetManifest.load(static_folder)
+        after = load_pages(app)
+
+        with app.app_context():
+            db.engine.dispose()
+    return before, after
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.parse_args(argv)
+
+    before, after = run()
+    failures = []
+    for path in PAGES:
+        if after[path]["bytes"] >= before[path]["bytes"]:
+            failures.append(f"{path}: {after[path]['bytes']} bytes built, {before[path]['bytes']} before")
+        if after[path]["repeat_requests"] > 1:
+            failures.append(f"{path}: {after[path]['repeat_requests'] - 1} built assets are revalidated")
+
+    print(json.dumps({
+        "pages": {path: {"before": before[path], "after": after[path]} for path in PAGES},
+        "failures": failures,
+    }, indent=2))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
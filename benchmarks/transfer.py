@@ -0,0 +1,116 @@
+"""
+Import/export throughput for the streaming task transfer endpoints.
+
+Builds a CSV and an NDJSON file of --tasks tasks, imports each into a
+fresh user through POST /api/v1/tasks/import and streams it back out
+through GET /api/v1/tasks/export, all against a fresh SQLite file.
+Reports tasks per second for each direction and format as JSON.
+
+    python -m benchmarks.transfer [--tasks N] [--batch-size N]
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from config import Config
+from models import db
+from transfer import EXPORT_FIELDS
+
+
+def bench_config(db_path, batch_size):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        FRAGMENT_CACHE_BACKEND = "null"
+        IMPORT_BATCH_SIZE = batch_size
+        PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+    return BenchConfig
+
+
+def sample_rows(tasks, rng):
+    start = date.today() - timedelta(days=180)
+    for n in range(tasks):
+        completed = rng.random() < 0.4
+        yield {
+            "title": f"Task {n} {rng.choice(['call', 'buy', 'write', 'fix', 'plan'])}",
+            "description": f"Details for task {n}" if rng.random() < 0.5 else None,
+            "due_date": (start + timedelta(days=rng.randint(0, 365))).isoformat(),
+            "completed": completed,
+            "completed_at": "2024-01-01T12:00:00" if completed else None,
+            "created_at": "2024-01-01T09:00:00",
+        }
+
+
+def as_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, EXPORT_FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({key: ("true" if value else "false") if isinstance(value, bool) else value
+                         for key, value in row.items()})
+    return buffer.getvalue().encode()
+
+
+def as_ndjson(rows):
+    return "".join(json.dumps(row) + "\n" for row in rows).encode()
+
+
+def run(app, fmt, body, tasks, username):
+    client = app.test_client()
+    client.post("/register", data={"name": username, "username": username, "password": "secret1"})
+
+    start = time.perf_counter()
+    response = client.post(f"/api/v1/tasks/import?format={fmt}", data=body)
+    imported = time.perf_counter() - start
+    assert response.status_code == 201, response.get_json()
+    assert response.get_json()["imported"] == tasks
+
+    start = time.perf_counter()
+    response = client.get(f"/api/v1/tasks/export?format={fmt}", buffered=False)
+    size = sum(len(chunk) for chunk in response.response)
+    exported = time.perf_counter() - start
+    response.close()
+
+    return {
+        "format": fmt,
+        "tasks": tasks,
+        "mb": round(len(body) / 2 ** 20, 1),
+        "import_tasks_per_second": round(tasks / imported),
+        "export_tasks_per_second": round(tasks / exported),
+        "export_mb": round(size / 2 ** 20, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=200_000)
+    parser.add_argument("--batch-size", type=int, default=Config.IMPORT_BATCH_SIZE)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    from app import create_app
+
+    rows = list(sample_rows(args.tasks, random.Random(args.seed)))
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(bench_config(os.path.join(tmp, "bench.db"), args.batch_size))
+        with app.app_context():
+            db.create_all()
+
+        report = [run(app, "csv", as_csv(rows), args.tasks, "csvuser"),
+                  run(app, "ndjson", as_ndjson(rows), args.tasks, "ndjsonuser")]
+
+        with app.app_context():
+            db.engine.dispose()
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import threading
+from collections import OrderedDict
+
+from signals import tasks_changed
+
+
+# ==================== RENDERED FRAGMENT CACHE ====================
+# home() caches the rendered tab bar and task lists keyed by
+# (user_id, tab, date). Entries are dropped whenever tasks_changed fires
+# for their user, so a hit is always what a fresh render would produce.
+# Callers read version(user_id) before querying and pass it to set(), so
+# a render that raced with a write is never stored.
+
+class FragmentCache:
+    """Interface every fragment cache backend implements"""
+
+    def get(self, key):
+        """Cached value for key, or None"""
+        raise NotImplementedError
+
+    def version(self, user_id):
+        """Opaque token that changes every time user_id is invalidated"""
+        raise NotImplementedError
+
+    def set(self, key, value, version):
+        """Store value unless key's user was invalidated since version was read"""
+        raise NotImplementedError
+
+    def invalidate_user(self, user_id):
+        """Drop every entry whose key starts with user_id"""
+        raise NotImplementedError
+
+    def stats(self):
+        """Dict of hits, misses and current size"""
+        raise NotImplementedError
+
+
+class NullFragmentCache(FragmentCache):
+    """Caches nothing; every lookup is a miss"""
+
+    def __init__(self, **options):
+        self.misses = 0
+
+    def get(self, key):
+        self.misses += 1
+        return None
+
+    def version(self, user_id):
+        return 0
+
+    def set(self, key, value, version):
+        pass
+
+    def invalidate_user(self, user_id):
+        pass
+
+    def stats(self):
+        return {"hits": 0, "misses": self.misses, "size": 0}
+
+
+class MemoryFragmentCache(FragmentCache):
+    """Bounded in-process LRU cache
+
+    Each worker process holds its own copy and invalidation only reaches
+    the process that handled the write. home() stores the user's task
+    revision with each entry, so other workers miss instead of serving a
+    stale page, but they do not free the memory until LRU eviction.
+    """
+
+    def __init__(self, max_entries=1024, **options):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def version(self, user_id):
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def set(self, key, value, version):
+        with self._lock:
+            if self._versions.get(key[0], 0) != version:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._keys_by_user.setdefault(key[0], set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._forget_key(evicted)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            for key in self._keys_by_user.pop(user_id, ()):
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def _forget_key(self, key):
+        user_keys = self._keys_by_user.get(key[0])
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._keys_by_user[key[0]]
+
+
+FRAGMENT_CACHE_BACKENDS = {
+    "memory": MemoryFragmentCache,
+    "null": NullFragmentCache,
+}
+
+
+def init_fragment_cache(app):
+    """Create the configured backend and hook it up to tasks_changed"""
+    backend = FRAGMENT_CACHE_BACKENDS[app.config["FRAGMENT_CACHE_BACKEND"]]
+    cache = backend(max_entries=app.config["FRAGMENT_CACHE_MAX_ENTRIES"])
+    app.extensions["fragment_cache"] = cache
+
+    def invalidate(sender, user_id, **extra):
+        cache.invalidate_user(user_id)
+
+    tasks_changed.connect(invalidate, sender=app, weak=False)
+    return cache
@@ -0,0 +1,49 @@
+from datetime import datetime, time, timezone
+
+from flask import make_response, request, session
+
+
+# ==================== CONDITIONAL GET ====================
+# Pages derived from a user's tasks are tagged with the user's
+# task_revision (bumped by services.commit_task_changes()), so a client
+# that already has the current version gets an empty 304 instead of a
+# re-rendered body.
+
+def day_start(day):
+    """Midnight at the start of day, local time, as an aware UTC datetime"""
+    return datetime.combine(day, time()).astimezone(timezone.utc)
+
+
+def conditional_response(etag, last_modified, render):
+    """304 if the client's copy matches etag/last_modified, else render()
+
+    Pending flash messages are part of the body, so a page with flashes
+    waiting to be shown is always rendered in full.
+    """
+    fresh = False
+    if not session.get("_flashes"):
+        if request.if_none_match:
+            fresh = request.if_none_match.contains_weak(etag)
+        elif request.if_modified_since and last_modified:
+            fresh = last_modified.replace(microsecond=0) <= request.if_modified_since
+
+    response = make_response("" if fresh else render(), 304 if fresh else 200)
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    # Let browsers keep the page but make them ask before reusing it
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def tasks_last_modified(user, today):
+    """Last-Modified for a page of user's tasks
+
+    Never earlier than today's midnight, because the tabs change with the
+    date even when no task does.
+    """
+    updated_at = user.tasks_updated_at
+    if updated_at is not None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return max(filter(None, [updated_at, day_start(today)]))
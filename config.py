@@ -7,8 +7,147 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', 'shinxity-dev-key-change-in-production')
     
     # Database configuration
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///shinxity.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///shinxity.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Make lazy relationship loads raise instead of running a query per
+    # object (tests, development and benchmarks/query_counts.py; off in production)
+    RAISE_ON_LAZY_LOAD = os.environ.get('RAISE_ON_LAZY_LOAD', '0') == '1'
+    
+    # Connection pool, per worker process (see create_app()). Each request
+    # thread holds at most one connection, so size the pool to WEB_THREADS.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', os.environ.get('WEB_THREADS', 4)))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 2))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+    
+    # Per-user shards (shards.py). With DB_SHARDS above 0 each user's rows
+    # live in one of that many databases, DB_SHARD_URL with {shard} filled
+    # in, picked by consistent hashing of the user id; DATABASE_URL keeps
+    # only the username directory. DB_SHARDS may grow but not shrink: stop
+    # the app and run `flask shards rebalance` after raising it
+    DB_SHARDS = int(os.environ.get('DB_SHARDS', 0))
+    DB_SHARD_URL = os.environ.get('DB_SHARD_URL', 'sqlite:///shinxity-shard{shard}.db')
+    # Points per shard on the hash ring: more spreads users more evenly
+    DB_SHARD_VNODES = int(os.environ.get('DB_SHARD_VNODES', 64))
+    # Users whose shard each process remembers
+    DB_SHARD_CACHE_MAX_ENTRIES = int(os.environ.get('DB_SHARD_CACHE_MAX_ENTRIES', 65536))
+    
+    # SQLite pragmas applied to every connection (sqlite_tuning.py); None skips one.
+    # SQLITE_TUNING=0 turns all of it off, including BEGIN IMMEDIATE for writes.
+    SQLITE_TUNING = os.environ.get('SQLITE_TUNING', '1') == '1'
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -16000))  # negative = KiB
+    
+    # Write routes re-run on "database is locked" this many times, backing off
+    DB_WRITE_RETRIES = int(os.environ.get('DB_WRITE_RETRIES', 3))
+    DB_WRITE_RETRY_DELAY = float(os.environ.get('DB_WRITE_RETRY_DELAY', 0.05))
+    
+    # Per-route request metrics at GET /metrics (Prometheus text format, per
+    # worker process) and X-Response-Time/Server-Timing headers. With
+    # METRICS_TOKEN set, /metrics wants "Authorization: Bearer <token>"
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # SQL statements slower than this are logged with their parameters
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+    
+    # Live task updates at GET /events (live.py): "memory" or "null" to
+    # switch them off. Each open stream holds a request thread under the
+    # default gthread workers, so by default only half of WEB_THREADS may
+    # stream; with WEB_WORKER_CLASS=gevent a stream is a greenlet and
+    # thousands per worker are cheap
+    LIVE_EVENTS_BACKEND = os.environ.get('LIVE_EVENTS_BACKEND', 'memory')
+    LIVE_MAX_STREAMS = int(os.environ.get('LIVE_MAX_STREAMS', (
+        1000 if os.environ.get('WEB_WORKER_CLASS') in ('gevent', 'eventlet')
+        else max(1, int(os.environ.get('WEB_THREADS', 4)) // 2))))
+    # Events queued for a slow stream before it is told to reload instead
+    LIVE_QUEUE_SIZE = int(os.environ.get('LIVE_QUEUE_SIZE', 100))
+    # Seconds between keep-alives, when streams also pick up other workers' writes
+    LIVE_HEARTBEAT_SECONDS = float(os.environ.get('LIVE_HEARTBEAT_SECONDS', 15))
+    
     # Session configuration
-    PERMANENT_SESSION_LIFETIME = timedelta(days=5)
\ No newline at end of file
+    PERMANENT_SESSION_LIFETIME = timedelta(days=5)
+    # Where sessions live (sessions.py): "database" (the sessions table),
+    # "memory" (per process, so a single worker only) or "cookie" (Flask's
+    # signed cookie; nothing to revoke). Server-side sessions expire
+    # PERMANENT_SESSION_LIFETIME after their last save and are deleted every
+    # SESSION_SWEEP_INTERVAL_SECONDS (0: only via `flask sessions sweep`)
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'database')
+    SESSION_SWEEP_INTERVAL_SECONDS = int(os.environ.get('SESSION_SWEEP_INTERVAL_SECONDS', 3600))
+    SESSION_SWEEP_BATCH_SIZE = int(os.environ.get('SESSION_SWEEP_BATCH_SIZE', 1000))
+    
+    # Tasks per page on the Past and Future tabs (and per "load more")
+    TASKS_PAGE_SIZE = int(os.environ.get('TASKS_PAGE_SIZE', 50))
+    
+    # How far ahead the Future tab lists occurrences of repeating tasks
+    RECURRENCE_HORIZON_DAYS = int(os.environ.get('RECURRENCE_HORIZON_DAYS', 90))
+    
+    # Completed tasks due more than ARCHIVE_AFTER_DAYS ago move to
+    # archived_tasks, ARCHIVE_BATCH_SIZE rows per transaction. Archiving runs
+    # from `flask archive run` (cron), or every ARCHIVE_INTERVAL_SECONDS in a
+    # background thread of each worker when that is above 0
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 90))
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 1000))
+    ARCHIVE_INTERVAL_SECONDS = int(os.environ.get('ARCHIVE_INTERVAL_SECONDS', 0))
+    
+    # Periodic jobs (archiving, session sweeps) run on a thread of their own
+    # per worker; AsyncConfig runs them on the event loop instead
+    BACKGROUND_THREADS = True
+    
+    # Rows per page on the /admin stats pages
+    ADMIN_PAGE_SIZE = int(os.environ.get('ADMIN_PAGE_SIZE', 100))
+    
+    # Most results returned by a search (/search and /api/v1/search)
+    SEARCH_RESULTS_LIMIT = int(os.environ.get('SEARCH_RESULTS_LIMIT', 50))
+    
+    # Rendered home.html fragment cache ("memory" or "null" to disable)
+    FRAGMENT_CACHE_BACKEND = os.environ.get('FRAGMENT_CACHE_BACKEND', 'memory')
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 1024))
+    
+    # Per-process cache of usernames/full names (seconds before re-reading)
+    PROFILE_CACHE_MAX_ENTRIES = int(os.environ.get('PROFILE_CACHE_MAX_ENTRIES', 4096))
+    PROFILE_CACHE_TTL = int(os.environ.get('PROFILE_CACHE_TTL', 300))
+    
+    # Password hashing: any werkzeug method string, e.g. "pbkdf2:sha256:600000"
+    # or "scrypt:32768:8:1". Hashes stored with other parameters are
+    # upgraded the next time their user logs in
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    # Hashes computed at once, and how many more may wait before logins are refused
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64))
+    
+    # Most operations accepted by one POST /api/v1/tasks/bulk request
+    API_BULK_MAX_OPERATIONS = int(os.environ.get('API_BULK_MAX_OPERATIONS', 1000))
+    
+    # Rows per executemany batch when importing tasks (API and CLI)
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 5000))
+
+
+def async_database_url(url):
+    """url with SQLite's driver swapped for aiosqlite"""
+    scheme, sep, rest = url.partition("://")
+    if scheme in ("sqlite", "sqlite+pysqlite"):
+        return f"sqlite+aiosqlite{sep}{rest}"
+    return url
+
+
+class AsyncConfig(Config):
+    """Config for asgi.py: the same app served from an event loop (aio.py)"""
+    
+    # The same database through aiosqlite; ASYNC_DATABASE_URL overrides it
+    SQLALCHEMY_DATABASE_URI = os.environ.get('ASYNC_DATABASE_URL',
+                                             async_database_url(Config.SQLALCHEMY_DATABASE_URI))
+    DB_SHARD_URL = async_database_url(Config.DB_SHARD_URL)
+    
+    # Requests in flight wait on the pool instead of on threads, so it is
+    # sized to ASYNC_DB_POOL_SIZE rather than WEB_THREADS
+    DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 8))
+    
+    # An open GET /events stream would hold the event loop
+    LIVE_EVENTS_BACKEND = 'null'
+    
+    BACKGROUND_THREADS = False
@@ -0,0 +1,35 @@
+"""
+Recommended gunicorn settings for Shinxity.
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Every value can be overridden from the environment. Requests are short and
+mostly waiting on SQLite, so each worker process runs a few threads; the
+per-process connection pool (DB_POOL_SIZE in config.py) defaults to the
+same thread count.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("WEB_BIND", "0.0.0.0:8000")
+
+# One process per core (plus one) spreads CPU-bound rendering and password
+# hashing across the machine
+workers = int(os.environ.get("WEB_WORKERS", multiprocessing.cpu_count() + 1))
+worker_class = os.environ.get("WEB_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("WEB_THREADS", 4))
+# Only used by WEB_WORKER_CLASS=gevent (pip install gevent): open
+# connections per worker, idle GET /events streams included
+worker_connections = int(os.environ.get("WEB_WORKER_CONNECTIONS", 1000))
+
+# Recycle workers now and then to cap slow memory growth, staggered so they
+# do not all restart at once
+max_requests = int(os.environ.get("WEB_MAX_REQUESTS", 5000))
+max_requests_jitter = int(os.environ.get("WEB_MAX_REQUESTS_JITTER", 500))
+
+timeout = int(os.environ.get("WEB_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("WEB_KEEPALIVE", 5))
+
+accesslog = os.environ.get("WEB_ACCESS_LOG", "-")
+errorlog = os.environ.get("WEB_ERROR_LOG", "-")
@@ -0,0 +1,274 @@
+import json
+import threading
+from collections import deque
+
+from flask import Response, abort, current_app, request, session
+
+from models import db
+from profiles import get_revision
+from shards import select_user_shard
+from signals import tasks_changed
+
+
+# ==================== LIVE EVENT BROKER ====================
+# Every open GET /events stream subscribes to its user's events. Write
+# routes describe their change to commit_task_changes() (see
+# services.task_event()), tasks_changed carries it here after the commit,
+# and the broker copies it into each of that user's subscriptions. An
+# idle subscription is a small queue and a condition variable; it costs
+# no CPU and holds no database connection while it waits.
+#
+# The memory broker only reaches streams in the process that handled the
+# write. Streams also compare the user's task revision on every
+# heartbeat, so a change made through another worker still arrives, as a
+# plain "changed" event, within LIVE_HEARTBEAT_SECONDS. A broker shared
+# between processes would implement the same four methods.
+
+class Subscription:
+    """Events for one open stream, queued until the stream sends them"""
+
+    __slots__ = ("user_id", "max_events", "overflowed", "_events", "_ready")
+
+    def __init__(self, user_id, max_events):
+        self.user_id = user_id
+        self.max_events = max_events
+        self.overflowed = False
+        self._events = deque()
+        self._ready = threading.Condition(threading.Lock())
+
+    def put(self, event):
+        with self._ready:
+            # A client this far behind reloads instead of catching up
+            if len(self._events) >= self.max_events:
+                self._events.clear()
+                self.overflowed = True
+            else:
+                self._events.append(event)
+            self._ready.notify()
+
+    def get(self, timeout):
+        """Queued events after waiting at most timeout seconds for one, and whether any were dropped"""
+        with self._ready:
+            if not self._events and not self.overflowed:
+                self._ready.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            overflowed, self.overflowed = self.overflowed, False
+        return events, overflowed
+
+
+class EventBroker:
+    """Interface every live event broker implements"""
+
+    def subscribe(self, user_id):
+        """A new Subscription to user_id's events, or None if no more streams are allowed"""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+    def publish(self, user_id, event):
+        """Queue event for every subscription of user_id"""
+        raise NotImplementedError
+
+    def stats(self):
+        """Dict of open streams, users with streams and events published"""
+        raise NotImplementedError
+
+
+class NullEventBroker(EventBroker):
+    """Live updates switched off; GET /events tells clients not to reconnect"""
+
+    def __init__(self, **options):
+        pass
+
+    def subscribe(self, user_id):
+        return None
+
+    def unsubscribe(self, subscription):
+        pass
+
+    def publish(self, user_id, event):
+        pass
+
+    def stats(self):
+        return {"streams": 0, "users": 0, "published": 0}
+
+
+class MemoryEventBroker(EventBroker):
+    """In-process fan-out to at most max_streams open streams"""
+
+    def __init__(self, max_streams=1000, queue_size=100, **options):
+        self.max_streams = max_streams
+        self.queue_size = queue_size
+        self.streams = 0
+        self.published = 0
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, self.queue_size)
+        with self._lock:
+            if self.streams >= self.max_streams:
+                return None
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+            self.streams += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            user_subscriptions = self._subscriptions.get(subscription.user_id)
+            if user_subscriptions is None or subscription not in user_subscriptions:
+                return
+            user_subscriptions.discard(subscription)
+            if not user_subscriptions:
+                del self._subscriptions[subscription.user_id]
+            self.streams -= 1
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+            self.published += 1
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def stats(self):
+        with self._lock:
+            return {"streams": self.streams, "users": len(self._subscriptions),
+                    "published": self.published}
+
+
+EVENT_BROKER_BACKENDS = {
+    "memory": MemoryEventBroker,
+    "null": NullEventBroker,
+}
+
+
+# ==================== EVENT STREAM ====================
+# GET /events is a text/event-stream for the logged-in user. Each event
+# has the user's new task revision as its id and the change as JSON:
+#
+#     id: 42
+#     event: toggled
+#     data: {"type": "toggled", "revision": 42, "task": {...}}
+#
+# Types are created, updated (with the "previous_due_date"), toggled,
+# reordered (with "direction" or "after", as the request gave them),
+# deleted, and changed: something changed that the route did not
+# describe (bulk writes, imports, repeating tasks, archiving) or that
+# this stream may have missed, so the client should reload what it
+# shows. Pages open the stream with ?since=<the revision they were
+# rendered at>, and a reconnecting EventSource sends Last-Event-ID; if
+# the revision has moved on since either, the stream starts with
+# "changed".
+
+# How long a disconnected EventSource waits before reconnecting
+RECONNECT_MS = 3000
+
+
+def format_event(event, revision):
+    data = json.dumps({**event, "revision": revision}, separators=(",", ":"))
+    return f"id: {revision}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+def _current_revision(app, user_id):
+    # Each check borrows a pooled connection only for the one query
+    with app.app_context():
+        select_user_shard(user_id)
+        revision = get_revision(user_id)
+        db.session.remove()
+    return revision.task_revision if revision is not None else None
+
+
+def event_stream(app, subscription, since, heartbeat):
+    """The body of one GET /events response; unsubscribes when the client goes away
+
+    since is the revision the client's page was rendered at, if known.
+    """
+    broker = app.extensions["live_events"]
+    try:
+        yield f"retry: {RECONNECT_MS}\n\n"
+        revision = _current_revision(app, subscription.user_id)
+        if revision is None:
+            return
+        if since is not None and revision != since:
+            yield format_event({"type": "changed"}, revision)
+        # last_seen: newest revision sent; reloaded: the client has every change up to here
+        last_seen = reloaded = revision
+
+        while True:
+            events, overflowed = subscription.get(heartbeat)
+            if overflowed:
+                revision = _current_revision(app, subscription.user_id)
+                if revision is None:
+                    return
+                last_seen = reloaded = revision
+                yield format_event({"type": "changed"}, revision)
+                continue
+
+            for revision, event in events:
+                if revision is None or revision <= reloaded:
+                    continue
+                if revision < last_seen:
+                    # Published after a later change was sent: applying it now could undo that
+                    event, revision = {"type": "changed"}, last_seen
+                    reloaded = last_seen
+                last_seen = revision
+                yield format_event(event, revision)
+            if events:
+                continue
+
+            # Idle: catch writes other workers handled, and keep proxies from timing out
+            revision = _current_revision(app, subscription.user_id)
+            if revision is None:
+                return
+            if revision > last_seen:
+                last_seen = reloaded = revision
+                yield format_event({"type": "changed"}, revision)
+            else:
+                yield ": keep-alive\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def events_view():
+    """GET /events: the current user's task changes as server-sent events"""
+    if "user_id" not in session:
+        abort(401)
+
+    broker = current_app.extensions["live_events"]
+    subscription = broker.subscribe(session["user_id"])
+    if subscription is None:
+        if isinstance(broker, NullEventBroker):
+            # 204 tells EventSource to stop reconnecting
+            return Response(status=204)
+        abort(503, description="Too many open event streams, please try again later.")
+
+    # A reconnecting EventSource sends the last id it got; a fresh one, the page's revision
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", type=int)
+    stream = event_stream(current_app._get_current_object(), subscription, since,
+                          current_app.config["LIVE_HEARTBEAT_SECONDS"])
+    response = Response(stream, mimetype="text/event-stream")
+    # Also for a client gone before the first byte, when the stream never starts
+    response.call_on_close(lambda: broker.unsubscribe(subscription))
+    response.headers["Cache-Control"] = "no-cache"
+    # Tell nginx not to buffer the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+def init_live_events(app):
+    """Create the configured broker, feed it from tasks_changed and serve GET /events"""
+    backend = EVENT_BROKER_BACKENDS[app.config["LIVE_EVENTS_BACKEND"]]
+    broker = backend(max_streams=app.config["LIVE_MAX_STREAMS"],
+                     queue_size=app.config["LIVE_QUEUE_SIZE"])
+    app.extensions["live_events"] = broker
+
+    def publish(sender, user_id, revision=None, event=None, **extra):
+        broker.publish(user_id, (revision, event or {"type": "changed"}))
+
+    tasks_changed.connect(publish, sender=app, weak=False)
+    app.add_url_rule("/events", "live_events", events_view)
+    return broker
@@ -0,0 +1,253 @@
+import threading
+import time
+from bisect import bisect_left
+
+from flask import (Response, abort, before_render_template, current_app, g, has_request_context,
+                   request, request_finished, request_started, template_rendered)
+from sqlalchemy import event
+
+from models import db
+
+
+# ==================== REQUEST TIMINGS ====================
+# Every request collects its SQL statement count and time (engine
+# events), template render time (Flask's render signals) and total
+# latency (request_started/request_finished) in g.request_timings. The
+# totals go out on the response as X-Response-Time and Server-Timing and
+# are added to the per-route counters behind GET /metrics. Streamed
+# responses (the export) are timed up to their headers, not their body.
+
+class RequestTimings:
+    """What one request spent, in seconds"""
+
+    __slots__ = ("started", "queries", "db", "render", "render_depth", "render_started")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.render = 0.0
+        self.render_depth = 0
+        self.render_started = 0.0
+
+
+def _timings():
+    if has_request_context():
+        return g.get("request_timings")
+    return None
+
+
+def _start_request(sender, **extra):
+    g.request_timings = RequestTimings()
+
+
+def _finish_request(sender, response, **extra):
+    timings = g.pop("request_timings", None)
+    if timings is None:
+        return
+    elapsed = time.perf_counter() - timings.started
+
+    response.headers["X-Response-Time"] = f"{elapsed * 1000:.1f}ms"
+    response.headers["Server-Timing"] = (
+        f'db;dur={timings.db * 1000:.1f};desc="{timings.queries} queries", '
+        f"render;dur={timings.render * 1000:.1f}, "
+        f"total;dur={elapsed * 1000:.1f}"
+    )
+    endpoint = request.endpoint or "unmatched"
+    sender.extensions["request_metrics"].observe(endpoint, request.method, response.status_code,
+                                                 elapsed, timings)
+
+
+def _start_render(sender, template, context, **extra):
+    timings = _timings()
+    if timings is not None:
+        # Only the outermost render counts; fragments rendered inside a page add nothing
+        if timings.render_depth == 0:
+            timings.render_started = time.perf_counter()
+        timings.render_depth += 1
+
+
+def _finish_render(sender, template, context, **extra):
+    timings = _timings()
+    if timings is not None and timings.render_depth:
+        timings.render_depth -= 1
+        if timings.render_depth == 0:
+            timings.render += time.perf_counter() - timings.render_started
+
+
+# ==================== SQL TIMING ====================
+# Statements are timed between the cursor events, so the figure is time
+# spent in the driver (SQLite itself), not in building ORM objects.
+# Anything slower than SLOW_QUERY_MS is logged with its parameters.
+
+SLOW_QUERY_PARAMETERS_CHARS = 500
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _describe_parameters(parameters):
+    # An executemany batch can carry thousands of rows; the start tells the story
+    shown = repr(parameters)
+    if len(shown) > SLOW_QUERY_PARAMETERS_CHARS:
+        shown = shown[:SLOW_QUERY_PARAMETERS_CHARS] + "..."
+    return shown
+
+
+# ==================== ROUTE METRICS ====================
+# Counters per endpoint, in the Prometheus text format. Like the other
+# in-process caches they belong to one worker process: each gunicorn
+# worker reports its own requests, so scrape every worker or sum the
+# series the scraper sees.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RouteStats:
+    """Running totals for one endpoint"""
+
+    __slots__ = ("buckets", "count", "latency", "queries", "db", "render")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # last one is +Inf
+        self.count = 0
+        self.latency = 0.0
+        self.queries = 0
+        self.db = 0.0
+        self.render = 0.0
+
+
+class RequestMetrics:
+    """Thread-safe per-route request counters"""
+
+    def __init__(self):
+        self.routes = {}
+        self.responses = {}
+        self.slow_queries = 0
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, method, status, elapsed, timings):
+        bucket = bisect_left(LATENCY_BUCKETS, elapsed)
+        with self._lock:
+            stats = self.routes.get(endpoint)
+            if stats is None:
+                stats = self.routes[endpoint] = RouteStats()
+            stats.buckets[bucket] += 1
+            stats.count += 1
+            stats.latency += elapsed
+            stats.queries += timings.queries
+            stats.db += timings.db
+            stats.render += timings.render
+            key = (endpoint, method, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def slow_query(self):
+        with self._lock:
+            self.slow_queries += 1
+
+    def render(self):
+        """Everything so far in the Prometheus text exposition format"""
+        with self._lock:
+            routes = {endpoint: (list(stats.buckets), stats.count, stats.latency,
+                                 stats.queries, stats.db, stats.render)
+                      for endpoint, stats in self.routes.items()}
+            responses = dict(self.responses)
+            slow_queries = self.slow_queries
+
+        lines = [
+            "# HELP shinxity_http_requests_total Requests handled, by endpoint, method and status.",
+            "# TYPE shinxity_http_requests_total counter",
+        ]
+        for (endpoint, method, status), count in sorted(responses.items()):
+            lines.append(f'shinxity_http_requests_total{{endpoint="{endpoint}",method="{method}",'
+                         f'status="{status}"}} {count}')
+
+        lines += [
+            "# HELP shinxity_http_request_duration_seconds Request latency, by endpoint.",
+            "# TYPE shinxity_http_request_duration_seconds histogram",
+        ]
+        for endpoint, (buckets, count, latency, _, _, _) in sorted(routes.items()):
+            cumulative = 0
+            for bound, seen in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+                cumulative += seen
+                lines.append(f'shinxity_http_request_duration_seconds_bucket{{endpoint="{endpoint}",'
+                             f'le="{bound}"}} {cumulative}')
+            lines.append(f'shinxity_http_request_duration_seconds_sum{{endpoint="{endpoint}"}} {latency:.6f}')
+            lines.append(f'shinxity_http_request_duration_seconds_count{{endpoint="{endpoint}"}} {count}')
+
+        for name, index, text in (
+            ("shinxity_db_queries_total", 3, "SQL statements run, by endpoint."),
+            ("shinxity_db_duration_seconds_total", 4, "Time spent in SQL statements, by endpoint."),
+            ("shinxity_render_duration_seconds_total", 5, "Time spent rendering templates, by endpoint."),
+        ):
+            lines += [f"# HELP {name} {text}", f"# TYPE {name} counter"]
+            for endpoint, values in sorted(routes.items()):
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {values[index]:g}')
+
+        lines += [
+            "# HELP shinxity_slow_queries_total SQL statements slower than SLOW_QUERY_MS.",
+            "# TYPE shinxity_slow_queries_total counter",
+            f"shinxity_slow_queries_total {slow_queries}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def metrics_view():
+    """GET /metrics, optionally behind "Authorization: Bearer <METRICS_TOKEN>" """
+    token = current_app.config["METRICS_TOKEN"]
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        abort(404)
+    return Response(current_app.extensions["request_metrics"].render(),
+                    mimetype="text/plain; version=0.0.4")
+
+
+def init_metrics(app):
+    """Time every request and SQL statement, and serve the totals at /metrics"""
+    if not app.config["METRICS_ENABLED"]:
+        return None
+
+    metrics = RequestMetrics()
+    app.extensions["request_metrics"] = metrics
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    slow_seconds = app.config["SLOW_QUERY_MS"] / 1000
+
+    def finish_statement(conn):
+        """Seconds the statement conn just ran took, also added to the request's totals"""
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        timings = _timings()
+        if timings is not None:
+            timings.queries += 1
+            timings.db += elapsed
+        return elapsed
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = finish_statement(conn)
+        if elapsed >= slow_seconds:
+            metrics.slow_query()
+            where = f"{request.method} {request.path}" if has_request_context() else "outside a request"
+            app.logger.warning("Slow query (%.1fms, %s%s): %s\nParameters: %s",
+                               elapsed * 1000, where, ", executemany" if executemany else "",
+                               statement, _describe_parameters(parameters))
+
+    def handle_error(exception_context):
+        # A failed statement (a busy lock, say) gets no after_cursor_execute;
+        # its start time must not be left for the connection's next statement
+        conn = exception_context.connection
+        if conn is not None and not conn.closed and conn.info.get("query_started"):
+            finish_statement(conn)
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", after_cursor_execute)
+        event.listen(engine, "handle_error", handle_error)
+
+    request_started.connect(_start_request, app, weak=False)
+    request_finished.connect(_finish_request, app, weak=False)
+    before_render_template.connect(_start_render, app, weak=False)
+    template_rendered.connect(_finish_render, app, weak=False)
+
+    app.add_url_rule("/metrics", "metrics", metrics_view)
+    return metrics
@@ -1,8 +1,22 @@
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from datetime import datetime
 
+
+class RoutingSession(Session):
+    """db.session, sending each statement to its shard when DB_SHARDS is set (see shards.py)"""
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            router = current_app.extensions.get("shards")
+            if router is not None:
+                bind = router.get_bind(mapper, clause)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
 # Initialize SQLAlchemy (no app attached yet)
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 
 class User(db.Model):
@@ -14,8 +28,32 @@ class User(db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.now())
     
-    # Relationship to tasks
-    tasks = db.relationship("Task", backref="user", lazy=True, cascade="all, delete-orphan")
+    # Bumped with every write to the user's tasks; drives ETag/Last-Modified
+    task_revision = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    tasks_updated_at = db.Column(db.DateTime, nullable=True)
+    
+    # May open the /admin stats pages (flask admin grant/revoke)
+    is_admin = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
+    
+    # Tasks moved to archived_tasks (archive.py), for the Past tab's count
+    archived_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    
+    # Earliest day a recurrence rule may need a Task row created (None: no
+    # active rules). Read with the task revision, so home() knows for free
+    # whether recurrence.materialize_due() has anything to do
+    next_occurrence_on = db.Column(db.Date, nullable=True)
+    
+    # A user's tasks can run into the thousands, so read them through
+    # queries.py, or opt in per query with selectinload(User.tasks).
+    # "selectin" or "joined" here would load them with every User, i.e.
+    # at each login (shards.find_user). The dashboard and admin pages
+    # select columns (queries.py load_dashboard, load_user_stats,
+    # load_recent_tasks) and touch no relationship. Tests run with
+    # RAISE_ON_LAZY_LOAD, which turns a stray lazy load into an error,
+    # and tests/test_query_counts.py holds those routes to their
+    # statement budgets.
+    tasks = db.relationship("Task", back_populates="user", lazy="select",
+                            cascade="all, delete-orphan")
 
     def __init__(self, full_name, username, password_hash):
         self.full_name = full_name
@@ -26,8 +64,38 @@ class User(db.Model):
         return f"<User {self.username}>"
 
 
+class DirectoryEntry(db.Model):
+    """Where a user's data lives when the database is sharded (shards.py)
+
+    The only per-user table kept in the DATABASE_URL database: ids are
+    handed out here so they stay unique across shards, and logins find a
+    username's shard here.
+    """
+    __tablename__ = "user_directory"
+    __table_args__ = {"sqlite_autoincrement": True}
+    
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(100), unique=True, nullable=False)
+    # Bind key of the shard holding the user's rows, e.g. "shard0"
+    shard = db.Column(db.String(32), nullable=True)
+    
+    def __repr__(self):
+        return f"<DirectoryEntry {self.username} on {self.shard}>"
+
+
 class Task(db.Model):
     __tablename__ = "tasks"
+    __table_args__ = (
+        # Today tab, max(priority) on insert and the reorder neighbour lookup
+        db.Index("ix_tasks_user_due_completed_priority",
+                 "user_id", "due_date", "completed", "priority"),
+        # Past/Future tabs: range on due_date within one completion state
+        db.Index("ix_tasks_user_completed_due", "user_id", "completed", "due_date"),
+        # At most one row per occurrence of a recurrence rule
+        db.Index("ux_tasks_recurrence_due", "recurrence_id", "due_date", unique=True),
+        # Never reuse an id, so one moved to archived_tasks stays unique across both
+        {"sqlite_autoincrement": True},
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -39,6 +107,130 @@ class Task(db.Model):
     created_at = db.Column(db.DateTime, default=db.func.now())
     completed_at = db.Column(db.DateTime, nullable=True)
     
+    # The rule this task is an occurrence of, if any (see recurrence.py)
+    recurrence_id = db.Column(db.Integer, db.ForeignKey("recurrence_rules.id"), nullable=True)
+    # When the task was brought back from the archive, which then leaves it alone
+    restored_at = db.Column(db.DateTime, nullable=True)
+    
+    # Usually served from the identity map (the session's own user); use
+    # joinedload(Task.user) when listing tasks of many users. "joined" by
+    # default would add a users JOIN to every task query, the dashboard's
+    # included, for a row none of them reads.
+    user = db.relationship("User", back_populates="tasks", lazy="select")
+    
+    def to_dict(self):
+        """JSON-serialisable view of the task"""
+        return {
+            "id": self.id,
+            "title": self.title,
+            "description": self.description,
+            "due_date": self.due_date.isoformat(),
+            "completed": self.completed,
+            "priority": self.priority,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+            "recurrence_id": self.recurrence_id,
+        }
+    
     def __repr__(self):
         status = "✓" if self.completed else "○"
-        return f"<Task {status} {self.title}>"
\ No newline at end of file
+        return f"<Task {status} {self.title}>"
+
+
+class ArchivedTask(db.Model):
+    """A completed task moved out of `tasks` by archive.py, with its id kept
+
+    Same columns as Task, so rows can move back and forth with INSERT ...
+    SELECT. The Past tab reads both tables; nothing else touches this one.
+    """
+    __tablename__ = "archived_tasks"
+    __table_args__ = (
+        # Past tab: (due_date, id) keyset within one user
+        db.Index("ix_archived_tasks_user_due", "user_id", "due_date"),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text, nullable=True)
+    due_date = db.Column(db.Date, nullable=False)
+    completed = db.Column(db.Boolean, default=True, nullable=False)
+    priority = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    recurrence_id = db.Column(db.Integer, nullable=True)
+    archived_at = db.Column(db.DateTime, default=db.func.now())
+    
+    def to_dict(self):
+        """JSON-serialisable view, like Task.to_dict() plus the archive time"""
+        return {
+            "id": self.id,
+            "title": self.title,
+            "description": self.description,
+            "due_date": self.due_date.isoformat(),
+            "completed": self.completed,
+            "priority": self.priority,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+            "recurrence_id": self.recurrence_id,
+            "archived_at": self.archived_at.isoformat() if self.archived_at else None,
+        }
+    
+    def __repr__(self):
+        return f"<ArchivedTask {self.title}>"
+
+
+class RecurrenceRule(db.Model):
+    """A task that repeats every `interval` days or weeks from starts_on
+
+    The rule holds the title and description its occurrences are created
+    with. Occurrences are not stored ahead of time: recurrence.py creates
+    a Task row for one only when it is due today or is completed early.
+    """
+    __tablename__ = "recurrence_rules"
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text, nullable=True)
+    frequency = db.Column(db.String(10), nullable=False)  # "daily" or "weekly"
+    interval = db.Column(db.Integer, default=1, nullable=False)
+    starts_on = db.Column(db.Date, nullable=False)
+    ends_on = db.Column(db.Date, nullable=True)  # last day it may occur, inclusive
+    # Every occurrence up to this day has been created (or deliberately not)
+    materialized_through = db.Column(db.Date, nullable=True)
+    created_at = db.Column(db.DateTime, default=db.func.now())
+    
+    def __repr__(self):
+        return f"<RecurrenceRule {self.frequency}/{self.interval} {self.title}>"
+
+
+class RecurrenceSkip(db.Model):
+    """A day a rule must not create or show an occurrence for
+
+    Written when an occurrence's task is deleted or moved to another day,
+    so the empty slot is not taken for a fresh occurrence.
+    """
+    __tablename__ = "recurrence_skips"
+    
+    rule_id = db.Column(db.Integer, db.ForeignKey("recurrence_rules.id"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
+
+
+class ServerSession(db.Model):
+    """One login session kept server-side (sessions.py); the cookie holds only its id
+
+    `key` is a SHA-256 of the cookie's id, so a copy of this table cannot
+    be replayed as cookies.
+    """
+    __tablename__ = "sessions"
+    
+    key = db.Column(db.String(64), primary_key=True)
+    # Who is logged in, if anyone; revoking deletes all of a user's rows
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True, index=True)
+    # The session dict, as Flask's tagged JSON
+    data = db.Column(db.Text, nullable=False)
+    # Unix time after which the session is gone; swept in bulk
+    expires_at = db.Column(db.Integer, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f"<ServerSession user={self.user_id}>"
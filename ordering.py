@@ -0,0 +1,98 @@
+from models import db, Task
+from queries import PRIORITY_GAP, neighbours_query, reorder_siblings_query
+
+
+# ==================== TASK ORDERING ====================
+# A move rewrites only the moving task's priority, picking a value between
+# its new neighbours. When two neighbours are adjacent integers there is no
+# room left, so the whole list is respaced once and the move retried.
+
+def priority_between(lower, upper):
+    """A priority strictly between two neighbours (None = list end), or None if full"""
+    if lower is None and upper is None:
+        return PRIORITY_GAP
+    if lower is None:
+        return upper - PRIORITY_GAP
+    if upper is None:
+        return lower + PRIORITY_GAP
+
+    middle = (lower + upper) // 2
+    if lower < middle < upper:
+        return middle
+    return None
+
+
+def rebalance(user_id, due_date, completed):
+    """Respace a position list to multiples of PRIORITY_GAP, keeping its order"""
+    siblings = reorder_siblings_query(user_id, due_date, completed).all()
+    for position, sibling in enumerate(siblings, start=1):
+        sibling.priority = position * PRIORITY_GAP
+    db.session.flush()
+
+
+def _place(task, find_bounds):
+    """Give task a priority between the bounds returned by find_bounds()"""
+    for _ in range(2):
+        bounds = find_bounds()
+        if bounds is None:
+            return False
+
+        priority = priority_between(*bounds)
+        if priority is not None:
+            task.priority = priority
+            return True
+
+        rebalance(task.user_id, task.due_date, task.completed)
+
+    return False
+
+
+def move_up(task):
+    """Swap a task above its predecessor; False if it is already first"""
+    def bounds():
+        before = neighbours_query(task, "up").limit(2).all()
+        if not before:
+            return None
+        lower = before[1].priority if len(before) > 1 else None
+        return lower, before[0].priority
+
+    return _place(task, bounds)
+
+
+def move_down(task):
+    """Swap a task below its successor; False if it is already last"""
+    def bounds():
+        after = neighbours_query(task, "down").limit(2).all()
+        if not after:
+            return None
+        upper = after[1].priority if len(after) > 1 else None
+        return after[0].priority, upper
+
+    return _place(task, bounds)
+
+
+def move_after(task, after=None):
+    """Move a task directly below another task in its list, or to the top
+
+    after must be a sibling (same user, day and completion state).
+    """
+    def bounds():
+        if after is None:
+            first = reorder_siblings_query(
+                task.user_id, task.due_date, task.completed
+            ).filter(Task.id != task.id).first()
+            return None, first.priority if first else None
+
+        following = neighbours_query(after, "down", exclude_id=task.id).first()
+        return after.priority, following.priority if following else None
+
+    if after is not None and after.id == task.id:
+        return False
+    return _place(task, bounds)
+
+
+def is_sibling(task, other):
+    """True if both tasks share one position list"""
+    return (other.user_id == task.user_id
+            and other.due_date == task.due_date
+            and other.completed == task.completed)
@@ -0,0 +1,74 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from aio import wait_for
+
+
+# ==================== PASSWORD HASHING ====================
+# Hashing is deliberately slow, so a burst of logins can tie up every
+# request thread on CPU. Hashes are computed on a small bounded pool:
+# at most PASSWORD_HASH_WORKERS run at once (hashlib releases the GIL, so
+# they really run in parallel), up to PASSWORD_HASH_MAX_PENDING more may
+# queue, and anything beyond that is turned away at once with
+# PasswordHasherBusy instead of piling up behind the others.
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full"""
+
+
+class PasswordHasher:
+    """werkzeug password hashing with a configurable method, run on a bounded pool"""
+
+    def __init__(self, method, workers=2, max_pending=64):
+        self.method = method
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    @cached_property
+    def prefix(self):
+        """Method as werkzeug writes it into a hash, with defaults filled in
+
+        e.g. "pbkdf2:sha256" is stored as "pbkdf2:sha256:600000"
+        """
+        return generate_password_hash("", self.method, salt_length=1).split("$", 1)[0]
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        # Under asgi.py other requests run while this one waits
+        return wait_for(future)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True if password_hash was made with a different method or cost"""
+        return password_hash.split("$", 1)[0] != self.prefix
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def init_password_hasher(app):
+    hasher = PasswordHasher(app.config["PASSWORD_HASH_METHOD"],
+                            workers=app.config["PASSWORD_HASH_WORKERS"],
+                            max_pending=app.config["PASSWORD_HASH_MAX_PENDING"])
+    app.extensions["password_hasher"] = hasher
+    return hasher
+
+
+def password_hasher():
+    return current_app.extensions["password_hasher"]
@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app, g, has_app_context
+from sqlalchemy import event
+
+from models import db, User
+
+
+# ==================== USER PROFILE CACHE ====================
+# Pages only need a user's id, username and full name, which almost never
+# change. They are looked up once per request (g), and otherwise served
+# from a small per-process LRU filled at login. Entries expire after
+# PROFILE_CACHE_TTL seconds so a change made in another worker process is
+# picked up eventually; changes made through the ORM in this process evict
+# the entry immediately.
+
+Profile = namedtuple("Profile", ["id", "username", "full_name"])
+
+# Task revision and its timestamp: the part of the user row that changes
+# with every task write, so it is always read from the database. Along
+# for the ride: the next day a recurrence rule needs a task created
+Revision = namedtuple("Revision", ["task_revision", "tasks_updated_at", "next_occurrence_on"])
+
+
+class ProfileCache:
+    """Bounded, thread-safe LRU of Profile tuples with a TTL"""
+
+    def __init__(self, max_entries=4096, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            profile, expires = entry
+            if expires < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return profile
+
+    def set(self, profile):
+        with self._lock:
+            self._entries[profile.id] = (profile, time.monotonic() + self.ttl)
+            self._entries.move_to_end(profile.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+def init_profile_cache(app):
+    cache = ProfileCache(max_entries=app.config["PROFILE_CACHE_MAX_ENTRIES"],
+                         ttl=app.config["PROFILE_CACHE_TTL"])
+    app.extensions["profile_cache"] = cache
+    return cache
+
+
+def remember_profile(user):
+    """Cache a freshly loaded or created user, e.g. at login"""
+    profile = Profile(user.id, user.username, user.full_name)
+    current_app.extensions["profile_cache"].set(profile)
+    g.profile = profile
+    return profile
+
+
+def get_profile(user_id):
+    """Profile for user_id from the request, the process cache or the database
+
+    Returns None if the user no longer exists.
+    """
+    profile = g.get("profile")
+    if profile is not None and profile.id == user_id:
+        return profile
+
+    profile = current_app.extensions["profile_cache"].get(user_id)
+    if profile is None:
+        row = db.session.query(User.id, User.username, User.full_name).filter_by(id=user_id).first()
+        if row is None:
+            return None
+        profile = Profile(*row)
+        current_app.extensions["profile_cache"].set(profile)
+
+    g.profile = profile
+    return profile
+
+
+def get_revision(user_id):
+    """The user's current task revision, or None if the user no longer exists
+
+    Never cached: ETags, fragment cache entries and live streams are all
+    checked against it, and it is how this process learns of writes made
+    by another one. It costs one primary-key read of the users row per
+    request, which is the only users read a page view makes once the
+    profile is cached.
+    """
+    row = db.session.query(User.task_revision, User.tasks_updated_at,
+                           User.next_occurrence_on).filter_by(id=user_id).first()
+    return Revision(*row) if row is not None else None
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _forget_changed_user(mapper, connection, user):
+    """Evict a user whose row was changed or deleted through the ORM"""
+    if has_app_context() and "profile_cache" in current_app.extensions:
+        current_app.extensions["profile_cache"].discard(user.id)
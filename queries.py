@@ -0,0 +1,363 @@
+import heapq
+from collections import namedtuple
+from datetime import date
+from itertools import islice
+
+from sqlalchemy import and_, case, func, or_, select, true, union_all
+from sqlalchemy.orm import aliased
+
+from models import db, User, Task, ArchivedTask
+from shards import MAX_SHARDS, each_shard
+
+
+TABS = ('today', 'past', 'future')
+
+# Sections of home.html shown on each tab, keyed by Task.completed
+SECTIONS = {'ongoing': False, 'complete': True}
+TAB_SECTIONS = {
+    'today': ('ongoing', 'complete'),
+    'past': ('complete',),
+    'future': ('ongoing', 'complete'),
+}
+
+# Past and Future grow without bound, so they are paged; Today is not
+PAGED_TABS = ('past', 'future')
+
+# Active tab's first page of tasks, split into the two sections of
+# home.html, the cursor for each section's next page (None when there is
+# nothing more) and the per-tab counts shown as badges in the tab bar
+Dashboard = namedtuple('Dashboard', ['ongoing_tasks', 'complete_tasks', 'next_cursors', 'counts'])
+
+# One page of a section, for the "load more" endpoint
+Page = namedtuple('Page', ['tasks', 'next_cursor'])
+
+# A user on the admin stats page with aggregates over their tasks
+UserStats = namedtuple('UserStats', ['id', 'username', 'full_name', 'created_at', 'is_admin',
+                                     'tasks', 'completed', 'overdue', 'last_due'])
+
+
+# ==================== HOME TAB QUERIES ====================
+# Each query is shaped to be answered by one of the composite indexes on
+# Task (see Task.__table_args__). benchmarks/query_plans.py runs EXPLAIN
+# QUERY PLAN on every one of them, so keep the two in sync.
+
+def tab_filter(tab, today):
+    """Which tasks belong on a tab"""
+    if tab == 'today':
+        return Task.due_date == today
+    elif tab == 'past':
+        return and_(Task.completed == True, Task.due_date < today)
+    else:  # future
+        return Task.due_date > today
+
+
+def section_order(tab, entity=Task):
+    """Sort order within a section; paged tabs sort on the (due_date, id) keyset"""
+    if tab == 'today':
+        return (entity.priority, entity.id)
+    elif tab == 'past':
+        return (entity.due_date.desc(), entity.id.desc())
+    else:  # future
+        return (entity.due_date, entity.id)
+
+
+def section_query(user_id, tab, today, section):
+    """Tasks in one section of a tab, in display order"""
+    return Task.query.filter(
+        Task.user_id == user_id,
+        Task.completed == SECTIONS[section],
+        tab_filter(tab, today)
+    ).order_by(*section_order(tab))
+
+
+def tab_counts_subquery(user_id, today):
+    """One row with ongoing/complete counts for every tab"""
+    def count(*conditions):
+        return func.coalesce(func.sum(case((and_(*conditions), 1), else_=0)), 0)
+
+    in_tab = {
+        'today': Task.due_date == today,
+        'past': Task.due_date < today,
+        'future': Task.due_date > today,
+    }
+    columns = []
+    for tab in TABS:
+        columns.append(count(in_tab[tab], Task.completed == False).label(f'{tab}_ongoing'))
+        columns.append(count(in_tab[tab], Task.completed == True).label(f'{tab}_complete'))
+    # Archived tasks are all complete and past; their count is kept on the user
+    columns.append(select(User.archived_count).where(User.id == user_id)
+                   .scalar_subquery().label('archived'))
+
+    return select(*columns).where(Task.user_id == user_id).subquery('tab_counts')
+
+
+def dashboard_query(user_id, tab, today, page_size):
+    """Counts for every tab plus the first page of each section, in one statement
+
+    Each section is cut to page_size + 1 rows inside its own indexed
+    subquery (the extra row tells us whether there is a next page), so the
+    work done does not grow with the user's history. The counts row is
+    outer-joined so it comes back even when the active tab is empty (the
+    Task entity is then None).
+    """
+    limit = page_size + 1 if tab in PAGED_TABS else None
+    sections = [
+        select(section_query(user_id, tab, today, section).limit(limit).subquery())
+        for section in TAB_SECTIONS[tab]
+    ]
+    tab_tasks = aliased(Task, union_all(*sections).subquery('tab_tasks'))
+    counts = tab_counts_subquery(user_id, today)
+
+    return db.session.query(tab_tasks, counts).select_from(counts).outerjoin(
+        tab_tasks, true()
+    ).order_by(tab_tasks.completed, *section_order(tab, tab_tasks))
+
+
+def load_dashboard(user_id, tab, today, page_size):
+    """Run dashboard_query() and unpack it for home.html"""
+    tasks = {'ongoing': [], 'complete': []}
+    counts = None
+    archived = 0
+
+    for row in dashboard_query(user_id, tab, today, page_size):
+        if counts is None:
+            counts = {
+                name: {'ongoing': getattr(row, f'{name}_ongoing'),
+                       'complete': getattr(row, f'{name}_complete')}
+                for name in TABS
+            }
+            counts['past']['complete'] += row.archived
+            archived = row.archived
+        task = row[0]
+        if task is None:
+            break
+        tasks['complete' if task.completed else 'ongoing'].append(task)
+
+    next_cursors = {}
+    for section, section_tasks in tasks.items():
+        next_cursors[section] = None
+        if tab in PAGED_TABS and len(section_tasks) > page_size:
+            del section_tasks[page_size:]
+            next_cursors[section] = encode_cursor(section_tasks[-1])
+
+    if tab == 'past' and archived:
+        archived_tasks = archived_query(user_id).limit(page_size + 1).all()
+        tasks['complete'], next_cursors['complete'] = merge_archived(
+            tasks['complete'], next_cursors['complete'], archived_tasks, page_size)
+
+    return Dashboard(tasks['ongoing'], tasks['complete'], next_cursors, counts)
+
+
+# ==================== KEYSET PAGINATION ====================
+
+def encode_cursor(task):
+    """Opaque position of a task in a paged section"""
+    return f"{task.due_date.isoformat()}.{task.id}"
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(); raises ValueError on a malformed cursor"""
+    due_date, _, task_id = cursor.partition('.')
+    return date.fromisoformat(due_date), int(task_id)
+
+
+def after_cursor(tab, cursor, entity=Task):
+    """Rows strictly after a cursor in section_order()
+
+    The redundant due_date bound keeps this a range scan on the index
+    instead of an OR that SQLite cannot seek on.
+    """
+    due_date, task_id = decode_cursor(cursor)
+    if tab == 'past':
+        return and_(entity.due_date <= due_date,
+                    or_(entity.due_date < due_date, entity.id < task_id))
+    return and_(entity.due_date >= due_date,
+                or_(entity.due_date > due_date, entity.id > task_id))
+
+
+def load_page(user_id, tab, today, section, cursor, page_size):
+    """The page of a section that follows cursor"""
+    tasks = section_query(user_id, tab, today, section).filter(
+        after_cursor(tab, cursor)
+    ).limit(page_size + 1).all()
+
+    next_cursor = None
+    if len(tasks) > page_size:
+        del tasks[page_size:]
+        next_cursor = encode_cursor(tasks[-1])
+
+    if tab == 'past':
+        archived_tasks = archived_query(user_id).filter(
+            after_cursor(tab, cursor, ArchivedTask)
+        ).limit(page_size + 1).all()
+        return Page(*merge_archived(tasks, next_cursor, archived_tasks, page_size))
+    return Page(tasks, next_cursor)
+
+
+# ==================== ARCHIVE QUERIES ====================
+# Old completed tasks live in archived_tasks (see archive.py) with their
+# ids kept, so the Past tab pages through both tables on the same
+# (due_date, id) keyset: a page of each, merged in Python.
+
+def archived_query(user_id):
+    """A user's archived tasks in Past tab order"""
+    return ArchivedTask.query.filter(
+        ArchivedTask.user_id == user_id
+    ).order_by(*section_order('past', ArchivedTask))
+
+
+def merge_archived(tasks, next_cursor, archived_tasks, page_size):
+    """Merge a Past page of tasks with up to page_size + 1 archived tasks after the same cursor
+
+    Returns the combined page and its next cursor (None when neither
+    table has more).
+    """
+    merged = list(islice(heapq.merge(tasks, archived_tasks, reverse=True,
+                                     key=lambda task: (task.due_date, task.id)),
+                         page_size + 1))
+    more = next_cursor is not None or len(merged) > page_size
+    del merged[page_size:]
+    return merged, encode_cursor(merged[-1]) if more and merged else None
+
+
+# ==================== ORDERING QUERIES ====================
+# Priorities within a (user, due_date, completed) list are spaced
+# PRIORITY_GAP apart so a task can be moved by rewriting only its own
+# priority to a value between its new neighbours (see ordering.py).
+
+PRIORITY_GAP = 1024
+
+
+def next_priority(user_id, due_date):
+    """SQL expression for the priority of a task appended to a day's ongoing list
+
+    Evaluated inside the INSERT, so creating a task costs no extra round-trip.
+    """
+    return select(
+        func.coalesce(func.max(Task.priority), 0) + PRIORITY_GAP
+    ).where(
+        Task.user_id == user_id,
+        Task.due_date == due_date,
+        Task.completed == False
+    ).scalar_subquery()
+
+
+def neighbours_query(task, direction, exclude_id=None):
+    """Siblings of a task (same user, day and completion state) nearest first
+
+    direction "up" walks towards the top of the list, "down" towards the
+    bottom. Siblings are ordered by (priority, id) so ties stay stable.
+    """
+    query = Task.query.filter(
+        Task.user_id == task.user_id,
+        Task.due_date == task.due_date,
+        Task.completed == task.completed
+    )
+    if exclude_id is not None:
+        query = query.filter(Task.id != exclude_id)
+
+    if direction == "up":
+        return query.filter(
+            Task.priority <= task.priority,
+            or_(Task.priority < task.priority, Task.id < task.id)
+        ).order_by(Task.priority.desc(), Task.id.desc())
+    return query.filter(
+        Task.priority >= task.priority,
+        or_(Task.priority > task.priority, Task.id > task.id)
+    ).order_by(Task.priority, Task.id)
+
+
+def reorder_siblings_query(user_id, due_date, completed):
+    """Every task in one position list, top to bottom"""
+    return Task.query.filter_by(
+        user_id=user_id,
+        due_date=due_date,
+        completed=completed
+    ).order_by(Task.priority, Task.id)
+
+
+# ==================== ADMIN STATS QUERIES ====================
+# Both listings are keyset-paged on id and never count whole tables, so
+# a page costs the same however many users and tasks there are. With
+# DB_SHARDS set, every shard contributes a page and the pages are merged.
+
+# Largest SQLite integer: "before" cursor for the first page of tasks
+NEWEST = 2 ** 63 - 1
+
+
+def users_page_query(after_id, page_size):
+    """Users with id > after_id, one more than a page to detect a next page"""
+    return select(
+        User.id, User.username, User.full_name, User.created_at, User.is_admin
+    ).where(User.id > after_id).order_by(User.id).limit(page_size + 1)
+
+
+def user_aggregates_query(user_ids, today):
+    """Task counts per user for just user_ids, from the (user_id, completed, due_date) index"""
+    return select(
+        Task.user_id,
+        func.count().label('tasks'),
+        func.sum(case((Task.completed == True, 1), else_=0)).label('completed'),
+        func.sum(case((and_(Task.completed == False, Task.due_date < today), 1),
+                      else_=0)).label('overdue'),
+        func.max(Task.due_date).label('last_due'),
+    ).where(Task.user_id.in_(user_ids)).group_by(Task.user_id)
+
+
+def recent_tasks_query(before_id, page_size):
+    """Tasks with id < before_id, newest first, joined to their owner's username"""
+    return select(
+        Task.id, Task.title, Task.due_date, Task.completed, Task.priority, User.username
+    ).join(User, User.id == Task.user_id).where(
+        Task.id < before_id
+    ).order_by(Task.id.desc()).limit(page_size + 1)
+
+
+def shard_user_stats(after_id, today, page_size):
+    """UserStats for up to page_size + 1 users with id > after_id in the selected database"""
+    users = db.session.execute(users_page_query(after_id, page_size)).all()
+
+    aggregates = {}
+    if users:
+        query = user_aggregates_query([user.id for user in users], today)
+        aggregates = {row.user_id: row for row in db.session.execute(query)}
+
+    stats = []
+    for user in users:
+        row = aggregates.get(user.id)
+        if row is None:
+            stats.append(UserStats(*user, 0, 0, 0, None))
+        else:
+            stats.append(UserStats(*user, row.tasks, row.completed, row.overdue, row.last_due))
+    return stats
+
+
+def load_user_stats(after_id, today, page_size):
+    """A page of UserStats and the cursor for the next one (None at the end)
+
+    User ids are unique across shards, so the id is the cursor either way.
+    """
+    pages = [shard_user_stats(after_id, today, page_size) for _ in each_shard()]
+    stats = list(islice(heapq.merge(*pages, key=lambda user: user.id), page_size + 1))
+    next_cursor = stats[page_size - 1].id if len(stats) > page_size else None
+    return stats[:page_size], next_cursor
+
+
+def load_recent_tasks(before, page_size):
+    """A page of recent_tasks_query() rows and the cursor for the next one
+
+    Task ids are only unique within a shard, so sharded the cursor is
+    id * MAX_SHARDS + the shard's number: tasks with the same id on
+    different shards still come in a fixed order. Unsharded it is the id.
+    """
+    pages = []
+    for number, shard in enumerate(each_shard()):
+        slots = 1 if shard is None else MAX_SHARDS
+        # Tasks of this shard positioned before the cursor
+        before_id = (before - number + slots - 1) // slots
+        rows = db.session.execute(recent_tasks_query(before_id, page_size)).all()
+        pages.append([(row.id * slots + number, row) for row in rows])
+
+    tasks = list(islice(heapq.merge(*pages, reverse=True, key=lambda task: task[0]), page_size + 1))
+    next_cursor = tasks[page_size - 1][0] if len(tasks) > page_size else None
+    return [row for _, row in tasks[:page_size]], next_cursor
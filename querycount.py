@@ -0,0 +1,64 @@
+from contextlib import contextmanager
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import raiseload
+
+from models import db
+
+
+# ==================== QUERY COUNTING ====================
+# Counts the SQL statements an engine runs while a block executes, e.g.
+# a request through the test client. tests/test_query_counts.py (through
+# the count_queries fixture) and benchmarks/query_counts.py use it to
+# hold each route to a statement budget.
+
+class QueryCount:
+    """Statements seen by count_queries(), in order"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __len__(self):
+        return len(self.statements)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries(engine=None):
+    """Record every statement engine (default: db.engine) runs inside the block"""
+    engine = engine or db.engine
+    counter = QueryCount()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        counter.statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+# ==================== LAZY LOAD GUARD ====================
+# With RAISE_ON_LAZY_LOAD set, every ORM query gets raiseload("*",
+# sql_only=True): touching a relationship that was not loaded up front
+# raises instead of quietly running one query per object. Relationships
+# already in the identity map (a task's own user, say) still resolve.
+# Meant for development and checks; production leaves it off.
+
+def _raise_on_lazy_load(state):
+    if not (state.is_select and has_app_context() and current_app.config["RAISE_ON_LAZY_LOAD"]):
+        return
+    if state.is_column_load or state.is_relationship_load:
+        return
+    state.statement = state.statement.options(raiseload("*", sql_only=True))
+
+
+def init_lazy_load_guard(app):
+    if app.config["RAISE_ON_LAZY_LOAD"] and not event.contains(db.session, "do_orm_execute",
+                                                                _raise_on_lazy_load):
+        event.listen(db.session, "do_orm_execute", _raise_on_lazy_load)
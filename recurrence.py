@@ -0,0 +1,367 @@
+import heapq
+from collections import namedtuple
+from datetime import date, timedelta
+from itertools import islice
+
+from sqlalchemy import and_, or_, select, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import aliased
+
+from models import db, User, Task, RecurrenceRule, RecurrenceSkip
+from queries import NEWEST, Page, decode_cursor, encode_cursor, load_dashboard, load_page, next_priority
+from profiles import get_revision
+from services import ValidationError, commit_task_changes
+from sqlite_tuning import immediate_transaction, is_database_busy
+
+
+# ==================== RECURRENCE RULES ====================
+# A rule repeats every `interval` days ("daily") or weeks ("weekly") from
+# starts_on. Its occurrences are not stored ahead of time; one becomes a
+# Task row (with recurrence_id set) only when
+#   - it is due today and the user loads their tasks (materialize_due()),
+#   - or it is completed or edited early (materialize_occurrence()).
+# Until then the Future tab shows it straight from the rule (Upcoming),
+# up to RECURRENCE_HORIZON_DAYS ahead. A missed day is not backfilled.
+# Deleting an occurrence's task, or moving it to another day, leaves a
+# RecurrenceSkip for its day (services.skip_occurrence()), so the day is
+# neither listed as Upcoming nor created again.
+
+FREQUENCIES = {"daily": 1, "weekly": 7}
+UNITS = {"daily": ("day", "days"), "weekly": ("week", "weeks")}
+MAX_INTERVAL = 365
+
+
+def parse_recurrence(frequency, interval):
+    """Validated (frequency, interval) from form or JSON input; (None, None) for no repeat"""
+    frequency = (frequency or "").strip().lower()
+    if frequency in ("", "never"):
+        return None, None
+    if frequency not in FREQUENCIES:
+        raise ValidationError("Repeat must be daily or weekly")
+    try:
+        interval = int(interval or 1)
+    except (TypeError, ValueError):
+        raise ValidationError("Repeat interval must be a whole number")
+    if not 1 <= interval <= MAX_INTERVAL:
+        raise ValidationError(f"Repeat interval must be between 1 and {MAX_INTERVAL}")
+    return frequency, interval
+
+
+def describe(rule):
+    """"Repeats every day", "Repeats every 2 weeks", ..."""
+    one, many = UNITS[rule.frequency]
+    every = one if rule.interval == 1 else f"{rule.interval} {many}"
+    return f"Repeats every {every}"
+
+
+def first_occurrence(rule, on_or_after):
+    """The rule's first occurrence on or after a day, or None if it has ended by then"""
+    day = rule.starts_on
+    if on_or_after > day:
+        step = FREQUENCIES[rule.frequency] * rule.interval
+        periods = -(-(on_or_after - day).days // step)  # ceiling division
+        day += timedelta(days=periods * step)
+    if rule.ends_on is not None and day > rule.ends_on:
+        return None
+    return day
+
+
+def occurs_on(rule, day):
+    return first_occurrence(rule, day) == day
+
+
+def occurrence_dates(rule, start, end):
+    """The rule's occurrences from start to end inclusive, lazily"""
+    step = timedelta(days=FREQUENCIES[rule.frequency] * rule.interval)
+    last = end if rule.ends_on is None else min(end, rule.ends_on)
+    day = first_occurrence(rule, start)
+    while day is not None and day <= last:
+        yield day
+        day += step
+
+
+def active_rules(user_id, day):
+    """user_id's rules that can still occur on or after day"""
+    return RecurrenceRule.query.filter(
+        RecurrenceRule.user_id == user_id,
+        or_(RecurrenceRule.ends_on.is_(None), RecurrenceRule.ends_on >= day)
+    )
+
+
+def refresh_next_occurrence(user_id, today, rules=None):
+    """Store the earliest day any of user_id's rules next needs a Task row"""
+    days = []
+    for rule in rules if rules is not None else active_rules(user_id, today):
+        start = today
+        if rule.materialized_through is not None and rule.materialized_through >= today:
+            start = rule.materialized_through + timedelta(days=1)
+        days.append(first_occurrence(rule, start))
+
+    User.query.filter_by(id=user_id).update(
+        {User.next_occurrence_on: min(filter(None, days), default=None)},
+        synchronize_session=False
+    )
+
+
+def create_rule(user_id, fields, frequency, interval):
+    """Add a rule whose first occurrence is fields["due_date"]; nothing is committed"""
+    rule = RecurrenceRule(user_id=user_id,
+                          title=fields["title"],
+                          description=fields["description"],
+                          frequency=frequency,
+                          interval=interval,
+                          starts_on=fields["due_date"])
+    db.session.add(rule)
+    refresh_next_occurrence(user_id, date.today())
+    return rule
+
+
+def stop_rule(rule, today):
+    """End a rule after today; tasks already created for it are kept"""
+    rule.ends_on = today
+    refresh_next_occurrence(rule.user_id, today)
+
+
+def get_own_rule(user_id, rule_id):
+    """A rule by id if it belongs to user_id, else None"""
+    return RecurrenceRule.query.filter_by(id=rule_id, user_id=user_id).first()
+
+
+def skipped_rules(rule_ids, day):
+    """Which of rule_ids have their occurrence on day skipped"""
+    return set(db.session.scalars(
+        select(RecurrenceSkip.rule_id).where(RecurrenceSkip.rule_id.in_(rule_ids), RecurrenceSkip.day == day)
+    ))
+
+
+# ==================== MATERIALIZING ====================
+
+def occurrence_insert(user_id, day):
+    """INSERT for occurrences due on day, appended to the day's ongoing list
+
+    Rows that already exist (the unique (recurrence_id, due_date) index)
+    are left as they are, e.g. one completed ahead of time.
+    """
+    return sqlite_insert(Task.__table__).values(
+        priority=next_priority(user_id, day)
+    ).on_conflict_do_nothing(index_elements=["recurrence_id", "due_date"])
+
+
+def occurrence_values(rule, day):
+    return {"user_id": rule.user_id, "title": rule.title, "description": rule.description,
+            "due_date": day, "completed": False, "recurrence_id": rule.id}
+
+
+def materialize_due(user_id, today):
+    """Create the Task rows for user_id's occurrences due today, and commit
+
+    Runs in a write transaction of its own, so it can be called from GET
+    routes. Returns False, leaving the work for the next request, if the
+    database stays busy.
+    """
+    try:
+        with immediate_transaction():
+            rules = active_rules(user_id, today).all()
+            pending = [rule for rule in rules
+                       if rule.materialized_through is None or rule.materialized_through < today]
+            due_rules = [rule for rule in pending if occurs_on(rule, today)]
+            skipped = skipped_rules([rule.id for rule in due_rules], today) if due_rules else set()
+            due = [occurrence_values(rule, today) for rule in due_rules if rule.id not in skipped]
+            if due:
+                db.session.execute(occurrence_insert(user_id, today), due)
+            for rule in pending:
+                rule.materialized_through = today
+            refresh_next_occurrence(user_id, today, rules)
+            commit_task_changes(user_id)
+    except OperationalError as e:
+        if not is_database_busy(e):
+            raise
+        return False
+    return True
+
+
+def catch_up(user_id, revision, today):
+    """materialize_due() if the user's revision says it has work; returns the current revision"""
+    if revision is not None and revision.next_occurrence_on is not None \
+            and revision.next_occurrence_on <= today:
+        if materialize_due(user_id, today):
+            revision = get_revision(user_id)
+    return revision
+
+
+def materialize_occurrence(rule, day):
+    """The Task row for rule's occurrence on day, created (ongoing) if there is none yet"""
+    db.session.execute(occurrence_insert(rule.user_id, day), [occurrence_values(rule, day)])
+    return Task.query.filter_by(recurrence_id=rule.id, due_date=day).one()
+
+
+# ==================== UPCOMING OCCURRENCES ====================
+# The Future tab's ongoing section is keyset-paged on (due_date, id).
+# Occurrences without a row are merged into it lazily: each rule yields
+# its days in order, heapq.merge() interleaves them with the page of
+# tasks, and only one page's worth is ever built. They sort after the
+# tasks due the same day, by rule id, and their cursors read "date.r<id>".
+
+class Occurrence(namedtuple("Occurrence", ["rule_id", "title", "description", "due_date"])):
+    """An occurrence with no Task row yet; stands in for an ongoing Task in templates and JSON"""
+
+    __slots__ = ()
+    id = None
+    completed = False
+    completed_at = None
+    priority = None
+
+    @property
+    def recurrence_id(self):
+        return self.rule_id
+
+    def to_dict(self):
+        return {
+            "id": None,
+            "title": self.title,
+            "description": self.description,
+            "due_date": self.due_date.isoformat(),
+            "completed": False,
+            "priority": None,
+            "completed_at": None,
+            "recurrence_id": self.rule_id,
+        }
+
+
+def sort_key(item):
+    """Position of a Task or Occurrence in the Future tab's ongoing section"""
+    if item.id is None:
+        return (item.due_date, 1, item.rule_id)
+    return (item.due_date, 0, item.id)
+
+
+def encode_key(item):
+    if item.id is None:
+        return f"{item.due_date.isoformat()}.r{item.rule_id}"
+    return encode_cursor(item)
+
+
+def decode_key(cursor):
+    """(sort_key() of the cursor's item, cursor to page tasks with); ValueError if malformed"""
+    due_date, _, rest = cursor.partition(".")
+    if rest.startswith("r"):
+        day = date.fromisoformat(due_date)
+        # Tasks after an occurrence are the ones due on a later day
+        return (day, 1, int(rest[1:])), f"{day.isoformat()}.{NEWEST}"
+    day, task_id = decode_cursor(cursor)
+    return (day, 0, task_id), cursor
+
+
+class Upcoming:
+    """Active rules and the days they already have rows (or skips) for, from start to end"""
+
+    def __init__(self, rules, existing, start, end):
+        self.rules = rules
+        self.existing = existing
+        self.start = start
+        self.end = end
+
+    def occurrences(self, after=None):
+        """Occurrences without a Task row in sort_key() order, strictly after key `after`"""
+        return heapq.merge(*(self._stream(rule, after) for rule in self.rules), key=sort_key)
+
+    def count(self):
+        return sum(1 for _ in self.occurrences())
+
+    def _stream(self, rule, after):
+        start = self.start if after is None else max(self.start, after[0])
+        for day in occurrence_dates(rule, start, self.end):
+            if (rule.id, day) in self.existing:
+                continue
+            occurrence = Occurrence(rule.id, rule.title, rule.description, day)
+            if after is None or sort_key(occurrence) > after:
+                yield occurrence
+
+
+def upcoming_query(user_id, start, end):
+    """Each active rule, once per day from start to end it already has a row or a skip for
+    (or once with None)
+
+    Both halves of the UNION run on a unique (rule, day) index.
+    """
+    active = and_(RecurrenceRule.user_id == user_id,
+                  or_(RecurrenceRule.ends_on.is_(None), RecurrenceRule.ends_on >= start))
+    with_rows = select(RecurrenceRule, Task.due_date.label("day")).outerjoin(
+        Task, and_(Task.recurrence_id == RecurrenceRule.id,
+                   Task.due_date >= start,
+                   Task.due_date <= end)
+    ).where(active)
+    with_skips = select(RecurrenceRule, RecurrenceSkip.day).join(
+        RecurrenceSkip, and_(RecurrenceSkip.rule_id == RecurrenceRule.id,
+                             RecurrenceSkip.day >= start,
+                             RecurrenceSkip.day <= end)
+    ).where(active)
+    taken = union_all(with_rows, with_skips).subquery("taken")
+    return db.session.query(aliased(RecurrenceRule, taken), taken.c.day)
+
+
+def load_upcoming(user_id, today, horizon_days):
+    """Upcoming for the days after today, in one query; None if the user has no active rules"""
+    start = today + timedelta(days=1)
+    end = today + timedelta(days=horizon_days)
+    rows = upcoming_query(user_id, start, end).all()
+    if not rows:
+        return None
+
+    rules = {}
+    existing = set()
+    for rule, day in rows:
+        rules[rule.id] = rule
+        if day is not None:
+            existing.add((rule.id, day))
+    return Upcoming(list(rules.values()), existing, start, end)
+
+
+def merge_upcoming(tasks, next_cursor, upcoming, page_size, after=None):
+    """Merge one page of ongoing Future tasks with the occurrences around it
+
+    tasks and next_cursor are a page as load_dashboard()/load_page() give
+    it, starting after sort key `after`. Returns the merged page and its
+    next cursor.
+    """
+    merged = heapq.merge(tasks, upcoming.occurrences(after), key=sort_key)
+    page = list(islice(merged, page_size + 1))
+    more = next_cursor is not None or len(page) > page_size
+    del page[page_size:]
+    return page, encode_key(page[-1]) if more and page else None
+
+
+def with_upcoming(dashboard, upcoming, tab, page_size):
+    """A Dashboard with upcoming occurrences in the Future count, and in the list on that tab"""
+    future = dict(dashboard.counts["future"])
+    future["ongoing"] += upcoming.count()
+    dashboard = dashboard._replace(counts=dict(dashboard.counts, future=future))
+    if tab != "future":
+        return dashboard
+
+    ongoing, cursor = merge_upcoming(dashboard.ongoing_tasks, dashboard.next_cursors["ongoing"],
+                                     upcoming, page_size)
+    return dashboard._replace(ongoing_tasks=ongoing,
+                              next_cursors=dict(dashboard.next_cursors, ongoing=cursor))
+
+
+def load_dashboard_with_upcoming(user_id, revision, tab, today, page_size, horizon_days):
+    """load_dashboard() plus occurrences without a row, if revision says the user has rules"""
+    dashboard = load_dashboard(user_id, tab, today, page_size)
+    if revision is None or revision.next_occurrence_on is None:
+        return dashboard
+    upcoming = load_upcoming(user_id, today, horizon_days)
+    if upcoming is None:
+        return dashboard
+    return with_upcoming(dashboard, upcoming, tab, page_size)
+
+
+def load_future_page(user_id, today, cursor, page_size, horizon_days):
+    """load_page() for the Future tab's ongoing section, occurrences included"""
+    after, task_cursor = decode_key(cursor)
+    page = load_page(user_id, "future", today, "ongoing", task_cursor, page_size)
+    upcoming = load_upcoming(user_id, today, horizon_days)
+    if upcoming is None:
+        return page
+    return Page(*merge_upcoming(page.tasks, page.next_cursor, upcoming, page_size, after))
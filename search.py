@@ -0,0 +1,163 @@
+import re
+from contextlib import contextmanager
+
+from sqlalchemy import event, or_, text
+
+from models import db, Task
+
+
+# ==================== FULL-TEXT SEARCH ====================
+# Titles and descriptions are indexed in an FTS5 table kept in sync with
+# `tasks` by triggers, so every write path (routes, the JSON API, bulk
+# inserts) is covered without having to remember it. Each row also
+# indexes its owner as a token ("u<user_id>") in a column of its own, so
+# a user's search is a single MATCH that never ranks other users' tasks.
+# The FTS table stores no copy of the text: it reads it from the
+# tasks_fts_source view when it needs it (e.g. on 'rebuild').
+
+INSERT_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts (rowid, owner, title, description)
+        VALUES (new.id, 'u' || new.user_id, new.title, new.description);
+    END
+"""
+
+SEARCH_DDL = [
+    """
+    CREATE VIEW IF NOT EXISTS tasks_fts_source AS
+    SELECT id, 'u' || user_id AS owner, title, description FROM tasks
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+        owner, title, description,
+        content='tasks_fts_source', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3 4'
+    )
+    """,
+    INSERT_TRIGGER,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, owner, title, description)
+        VALUES ('delete', old.id, 'u' || old.user_id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF user_id, title, description ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, owner, title, description)
+        VALUES ('delete', old.id, 'u' || old.user_id, old.title, old.description);
+        INSERT INTO tasks_fts (rowid, owner, title, description)
+        VALUES (new.id, 'u' || new.user_id, new.title, new.description);
+    END
+    """,
+]
+
+# Title matches count ten times as much as description matches; the owner
+# column only filters
+RANKING = "bm25(tasks_fts, 0.0, 10.0, 1.0)"
+
+# A word as the unicode61 tokenizer sees it, optionally ending in * (prefix)
+WORD = re.compile(r"([^\W_]+)(\*?)")
+
+
+def create_search_index(connection):
+    """Create the FTS table, its view and triggers if missing (SQLite only)
+
+    A newly created index is filled from the existing tasks.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tasks_fts'"
+    ).first()
+    for statement in SEARCH_DDL:
+        connection.exec_driver_sql(statement)
+    if not exists:
+        connection.exec_driver_sql("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')")
+
+
+def drop_search_index(connection):
+    if connection.dialect.name != "sqlite":
+        return
+    connection.exec_driver_sql("DROP TABLE IF EXISTS tasks_fts")
+    connection.exec_driver_sql("DROP VIEW IF EXISTS tasks_fts_source")
+
+
+@contextmanager
+def bulk_indexing(connection):
+    """Index the tasks inserted inside the block with one statement at the end
+
+    Feeding FTS5 one row at a time from the insert trigger halves bulk
+    import throughput, so the trigger is dropped for the block and put
+    back afterwards. This all happens in the caller's transaction, which
+    holds the write lock from the DROP on, and SQLite DDL is transactional,
+    so no other connection ever sees the trigger missing. If the block
+    raises, the caller must roll back.
+    """
+    if connection.dialect.name != "sqlite":
+        yield
+        return
+    connection.exec_driver_sql("DROP TRIGGER IF EXISTS tasks_fts_insert")
+    last_id = connection.exec_driver_sql("SELECT coalesce(max(id), 0) FROM tasks").scalar()
+    yield
+    connection.exec_driver_sql(
+        "INSERT INTO tasks_fts (rowid, owner, title, description) "
+        "SELECT id, 'u' || user_id, title, description FROM tasks WHERE id > ?",
+        (last_id,),
+    )
+    connection.exec_driver_sql(INSERT_TRIGGER)
+
+
+# Follow the tasks table through create_all()/drop_all()
+@event.listens_for(Task.__table__, "after_create")
+def _create_with_tasks(target, connection, **kw):
+    create_search_index(connection)
+
+
+@event.listens_for(Task.__table__, "before_drop")
+def _drop_with_tasks(target, connection, **kw):
+    drop_search_index(connection)
+
+
+def match_expression(user_id, query):
+    """FTS5 query for free text: every word must match; "word*" matches as a prefix
+
+    Only word characters are kept, so user input can never be read as
+    FTS5 syntax. Prefixes are opt-in because a short prefix of a common
+    word expands to many terms and costs far more than a whole word.
+    Returns None if there is nothing to search for.
+    """
+    terms = [f'"{word}"{star}' for word, star in WORD.findall(query)]
+    if not terms:
+        return None
+    return f"owner : u{int(user_id)} AND ({' '.join(terms)})"
+
+
+def search_tasks(user_id, query, limit):
+    """user_id's tasks matching query, best matches first"""
+    expression = match_expression(user_id, query)
+    if expression is None:
+        return []
+
+    if db.engine.dialect.name != "sqlite":
+        return like_search(user_id, query, limit)
+
+    ids = db.session.execute(
+        text(f"SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH :match "
+             f"ORDER BY {RANKING} LIMIT :limit"),
+        {"match": expression, "limit": limit},
+    ).scalars().all()
+    if not ids:
+        return []
+
+    # The owner token already scopes the match; user_id is checked again here
+    found = {task.id: task for task in Task.query.filter(Task.id.in_(ids), Task.user_id == user_id)}
+    return [found[task_id] for task_id in ids if task_id in found]
+
+
+def like_search(user_id, query, limit):
+    """Unranked substring search, for databases without FTS5"""
+    conditions = [or_(Task.title.ilike(f"%{word}%"), Task.description.ilike(f"%{word}%"))
+                  for word, _ in WORD.findall(query)]
+    return (Task.query.filter(Task.user_id == user_id, *conditions)
+            .order_by(Task.due_date.desc(), Task.id.desc())
+            .limit(limit).all())
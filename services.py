@@ -0,0 +1,164 @@
+from datetime import date, datetime, timezone
+
+from flask import current_app
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, User, Task, RecurrenceSkip
+from queries import PRIORITY_GAP, next_priority
+from signals import tasks_changed
+
+
+# ==================== TASK SERVICES ====================
+# Validation and writes shared by the HTML routes in app.py and the JSON
+# API in api.py. Nothing here commits except commit_task_changes(), which
+# every write path calls to end its transaction.
+
+class ValidationError(ValueError):
+    """User input that cannot be saved; str(error) is safe to show the user"""
+
+
+def parse_task_fields(title, description, due_date):
+    """Validate raw task fields and return them cleaned up
+
+    due_date may be a "YYYY-MM-DD" string or a date. Raises
+    ValidationError with the same messages the task forms flash.
+    """
+    title = (title or "").strip()
+    description = (description or "").strip()
+
+    if not title:
+        raise ValidationError("Task title is required")
+
+    if not due_date:
+        raise ValidationError("Due date is required")
+
+    if not isinstance(due_date, date):
+        try:
+            due_date = datetime.strptime(due_date, "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            raise ValidationError("Invalid date format")
+
+    return {
+        "title": title,
+        "description": description if description else None,
+        "due_date": due_date,
+    }
+
+
+def get_own_task(user_id, task_id):
+    """A task by id if it belongs to user_id, else None, in a single query"""
+    return Task.query.filter_by(id=task_id, user_id=user_id).first()
+
+
+def tab_for(due_date, today=None):
+    """Home tab a task due on due_date is listed under"""
+    today = today or date.today()
+    if due_date == today:
+        return "today"
+    elif due_date < today:
+        return "past"
+    return "future"
+
+
+def create_task(user_id, fields):
+    """Add a new ongoing task at the bottom of its day
+
+    One INSERT ... RETURNING, so the task comes back fully loaded,
+    priority included.
+    """
+    return db.session.scalars(insert(Task).values(
+        user_id=user_id,
+        completed=False,
+        # Appended after the day's last ongoing task, computed in the INSERT
+        priority=next_priority(user_id, fields["due_date"]),
+        **fields
+    ).returning(Task)).one()
+
+
+def create_tasks(user_id, fields_list):
+    """Add many ongoing tasks at once, returned in the order given
+
+    Priorities are assigned in Python from one max() lookup over all the
+    days involved, so the rows go out as a single INSERT ... RETURNING.
+    """
+    if not fields_list:
+        return []
+
+    days = {fields["due_date"] for fields in fields_list}
+    last_by_day = dict(db.session.execute(
+        select(Task.due_date, func.max(Task.priority))
+        .where(Task.user_id == user_id, Task.completed.is_(False), Task.due_date.in_(days))
+        .group_by(Task.due_date)
+    ).all())
+
+    rows = []
+    for fields in fields_list:
+        day = fields["due_date"]
+        last_by_day[day] = (last_by_day.get(day) or 0) + PRIORITY_GAP
+        rows.append(dict(fields, user_id=user_id, completed=False, priority=last_by_day[day]))
+
+    # SQLite can't promise RETURNING order for a multi-row INSERT, but
+    # (day, priority) is unique within the batch, so match on that
+    created = db.session.scalars(insert(Task).returning(Task), rows).all()
+    by_slot = {(task.due_date, task.priority): task for task in created}
+    return [by_slot[row["due_date"], row["priority"]] for row in rows]
+
+
+def skip_occurrence(task):
+    """If task is a repeating task's occurrence, keep its day from getting a new one"""
+    if task.recurrence_id is not None:
+        db.session.execute(sqlite_insert(RecurrenceSkip.__table__).values(
+            rule_id=task.recurrence_id, day=task.due_date, user_id=task.user_id
+        ).on_conflict_do_nothing())
+
+
+def update_task(task, fields):
+    """Apply validated fields to an existing task"""
+    if fields["due_date"] != task.due_date:
+        skip_occurrence(task)
+    task.title = fields["title"]
+    task.description = fields["description"]
+    task.due_date = fields["due_date"]
+    return task
+
+
+def remove_task(task):
+    """Delete a task, keeping a repeating occurrence's day from coming back"""
+    skip_occurrence(task)
+    db.session.delete(task)
+
+
+def toggle_task(task):
+    """Flip a task between ongoing and complete"""
+    task.completed = not task.completed
+    task.completed_at = datetime.now() if task.completed else None
+    return task
+
+
+def task_event(kind, task, **details):
+    """An event for commit_task_changes() about one task ("created", "updated", ...)
+
+    Built before the commit, while the task's attributes are still loaded.
+    """
+    return {"type": kind, "task": task.to_dict(), **details}
+
+
+def commit_task_changes(user_id, event=None):
+    """Commit a write to user_id's tasks and tell everyone who derives from them
+
+    The user's task revision is bumped in the same transaction, so the
+    ETag on their pages changes exactly when their tasks do. event (see
+    task_event()) describes the change for live subscribers; without one
+    they are only told that something changed.
+    """
+    revision = db.session.execute(
+        update(User).where(User.id == user_id).values({
+            User.task_revision: User.task_revision + 1,
+            User.tasks_updated_at: datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0),
+        }).returning(User.task_revision),
+        execution_options={"synchronize_session": False},
+    ).scalar()
+    db.session.commit()
+    tasks_changed.send(current_app._get_current_object(), user_id=user_id,
+                       revision=revision, event=event)
@@ -0,0 +1,351 @@
+import hashlib
+import secrets
+import threading
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, ServerSession
+from shards import each_shard, find_user_id, session_shard
+from sqlite_tuning import immediate_transaction
+
+
+# ==================== SESSION STORES ====================
+# With SESSION_BACKEND "database" or "memory" the session cookie holds
+# nothing but a random id, and the session dict (login, flashed
+# messages) lives in a store keyed by a hash of that id. Every stored
+# session expires PERMANENT_SESSION_LIFETIME after it was last saved;
+# expired ones are ignored at once and deleted in bulk by sweep().
+# Deleting a user's rows logs them out everywhere.
+#
+# The memory store is per process, so it only suits a single worker (the
+# dev server, tests); the database store works across any number.
+
+def session_key(sid):
+    """What a store keys a session by: never the cookie's id itself"""
+    return hashlib.sha256(sid.encode()).hexdigest()
+
+
+class SessionStore:
+    """Interface every server-side session store implements"""
+
+    def load(self, key, now):
+        """(data, expires_at) of an unexpired session, or None"""
+        raise NotImplementedError
+
+    def save(self, key, user_id, data, expires_at):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def delete_user(self, user_id):
+        """Delete every session of user_id; returns how many there were"""
+        raise NotImplementedError
+
+    def sweep(self, now, batch_size):
+        """Delete sessions expired by now, batch_size per transaction; returns how many"""
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Sessions in a dict of this process"""
+
+    def __init__(self):
+        # key -> (user_id, data, expires_at)
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def load(self, key, now):
+        with self._lock:
+            stored = self._sessions.get(key)
+            if stored is None:
+                return None
+            if stored[2] <= now:
+                del self._sessions[key]
+                return None
+            return stored[1], stored[2]
+
+    def save(self, key, user_id, data, expires_at):
+        with self._lock:
+            self._sessions[key] = (user_id, data, expires_at)
+
+    def delete(self, key):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            keys = [key for key, stored in self._sessions.items() if stored[0] == user_id]
+            for key in keys:
+                del self._sessions[key]
+        return len(keys)
+
+    def sweep(self, now, batch_size):
+        with self._lock:
+            expired = [key for key, stored in self._sessions.items() if stored[2] <= now]
+            for key in expired:
+                del self._sessions[key]
+        return len(expired)
+
+
+def load_statement(key, now):
+    """The data and expiry of the unexpired session stored under key"""
+    return select(ServerSession.data, ServerSession.expires_at).where(
+        ServerSession.key == key, ServerSession.expires_at > now)
+
+
+def expired_statement(now, batch_size):
+    """DELETE of up to batch_size sessions expired by now"""
+    expired = select(ServerSession.key).where(ServerSession.expires_at <= now).limit(batch_size)
+    return delete(ServerSession).where(ServerSession.key.in_(expired))
+
+
+def user_sessions_statement(user_id):
+    """DELETE of every session of user_id"""
+    return delete(ServerSession).where(ServerSession.user_id == user_id)
+
+
+class DatabaseSessionStore(SessionStore):
+    """Sessions in the `sessions` table
+
+    Reads end their transaction straight away and writes run in their own
+    BEGIN IMMEDIATE one, so a request's session never holds the database
+    between its own statements. With DB_SHARDS set each session is on the
+    shard its key hashes to, so a user's sessions may be on any of them.
+    """
+
+    def load(self, key, now):
+        with session_shard(key):
+            row = db.session.execute(load_statement(key, now)).first()
+            db.session.rollback()
+        return tuple(row) if row else None
+
+    def save(self, key, user_id, data, expires_at):
+        values = {"user_id": user_id, "data": data, "expires_at": expires_at}
+        with session_shard(key), immediate_transaction():
+            db.session.execute(
+                sqlite_insert(ServerSession).values(key=key, **values)
+                .on_conflict_do_update(index_elements=[ServerSession.key], set_=values)
+            )
+            db.session.commit()
+
+    def delete(self, key):
+        with session_shard(key), immediate_transaction():
+            db.session.execute(delete(ServerSession).where(ServerSession.key == key))
+            db.session.commit()
+
+    def delete_user(self, user_id):
+        deleted = 0
+        for _ in each_shard():
+            with immediate_transaction():
+                deleted += db.session.execute(user_sessions_statement(user_id)).rowcount
+                db.session.commit()
+        return deleted
+
+    def sweep(self, now, batch_size):
+        swept = 0
+        for _ in each_shard():
+            while True:
+                with immediate_transaction():
+                    deleted = db.session.execute(expired_statement(now, batch_size))
+                    db.session.commit()
+                swept += deleted.rowcount
+                if deleted.rowcount < batch_size:
+                    break
+        return swept
+
+
+SESSION_STORE_BACKENDS = {
+    "database": DatabaseSessionStore,
+    "memory": MemorySessionStore,
+}
+
+
+# ==================== SESSION INTERFACE ====================
+# Flask's session, with only an id in the cookie. A session is written
+# back when it changed, or when less than half its lifetime is left (so
+# an active user stays logged in without a write on every request). A
+# session that logs in, or switches user, gets a new id, so an id handed
+# out before login (session fixation) is worthless after it.
+
+class ServerSideSession(SecureCookieSession):
+    """The session dict plus the id it was stored under"""
+
+    def __init__(self, initial=None, sid=None, expires_at=None, stale_cookie=False):
+        super().__init__(initial)
+        self.sid = sid
+        self.expires_at = expires_at
+        # The request sent an id with no session behind it (expired, revoked or made up)
+        self.stale_cookie = stale_cookie
+        self.loaded_user_id = self.get("user_id")
+        # Accessing user_id above is not the request's doing
+        self.accessed = False
+
+
+class ServerSideSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid:
+            return ServerSideSession()
+
+        stored = self.store.load(session_key(sid), int(time.time()))
+        if stored is None:
+            return ServerSideSession(stale_cookie=True)
+        data, expires_at = stored
+        return ServerSideSession(self.serializer.loads(data), sid, expires_at)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if not session:
+            if session.sid is not None:
+                self.store.delete(session_key(session.sid))
+            if session.sid is not None or session.stale_cookie:
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       httponly=self.get_cookie_httponly(app),
+                                       samesite=self.get_cookie_samesite(app))
+                response.vary.add("Cookie")
+            return
+
+        now = int(time.time())
+        lifetime = int(app.permanent_session_lifetime.total_seconds())
+        new_login = session.sid is None or session.get("user_id") != session.loaded_user_id
+        refresh = session.expires_at is None or session.expires_at - now < lifetime // 2
+        if not (session.modified or new_login or refresh):
+            return
+
+        if new_login:
+            if session.sid is not None:
+                self.store.delete(session_key(session.sid))
+            session.sid = secrets.token_urlsafe(32)
+        expires_at = now + lifetime
+        self.store.save(session_key(session.sid), session.get("user_id"),
+                        self.serializer.dumps(dict(session)), expires_at)
+
+        if new_login or (refresh and session.permanent):
+            response.set_cookie(name, session.sid,
+                                expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app),
+                                domain=domain,
+                                path=path,
+                                secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app))
+            response.vary.add("Cookie")
+
+
+# ==================== SWEEPER ====================
+# Every SESSION_SWEEP_INTERVAL_SECONDS each process deletes the expired
+# sessions, SESSION_SWEEP_BATCH_SIZE per transaction. With the database
+# store several workers sweeping is harmless, just redundant;
+# `flask sessions sweep` from cron does the same once.
+
+class SessionSweeper:
+    """Runs store.sweep() every `interval` seconds on a daemon thread"""
+
+    def __init__(self, app, store, interval):
+        self.app = app
+        self.store = store
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="session-sweeper", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def run_once(self):
+        with self.app.app_context():
+            try:
+                swept = self.store.sweep(int(time.time()), self.app.config["SESSION_SWEEP_BATCH_SIZE"])
+            except Exception:
+                self.app.logger.exception("Sweeping expired sessions failed")
+                return 0
+        if swept:
+            self.app.logger.info("Deleted %d expired sessions", swept)
+        return swept
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.run_once()
+
+
+def init_sessions(app):
+    """Keep sessions in the configured store, unless SESSION_BACKEND is "cookie"
+
+    Returns the store, or None for Flask's signed cookie sessions.
+    """
+    backend = app.config["SESSION_BACKEND"]
+    if backend == "cookie":
+        return None
+
+    store = SESSION_STORE_BACKENDS[backend]()
+    app.extensions["session_store"] = store
+    app.session_interface = ServerSideSessionInterface(store)
+
+    interval = app.config["SESSION_SWEEP_INTERVAL_SECONDS"]
+    if interval > 0:
+        sweeper = SessionSweeper(app, store, interval)
+        app.extensions["session_sweeper"] = sweeper
+        if app.config["BACKGROUND_THREADS"]:
+            sweeper.start()
+    return store
+
+
+def revoke_user_sessions(user_id):
+    """Log user_id out everywhere; returns how many sessions ended, or None if sessions are cookies"""
+    store = current_app.extensions.get("session_store")
+    if store is None:
+        return None
+    return store.delete_user(user_id)
+
+
+# ==================== CLI ====================
+# flask sessions sweep  /  flask sessions revoke <username>
+
+sessions_cli = AppGroup("sessions", help="Expire and revoke server-side sessions.")
+
+
+def _store():
+    store = current_app.extensions.get("session_store")
+    if store is None:
+        raise click.ClickException("SESSION_BACKEND is \"cookie\": there are no stored sessions")
+    return store
+
+
+@sessions_cli.command("sweep")
+def sweep_command():
+    """Delete expired sessions"""
+    swept = _store().sweep(int(time.time()), current_app.config["SESSION_SWEEP_BATCH_SIZE"])
+    click.echo(f"Deleted {swept} expired sessions")
+
+
+@sessions_cli.command("revoke")
+@click.argument("username")
+def revoke_command(username):
+    """Log USERNAME out of every session"""
+    user_id = find_user_id(username)
+    if user_id is None:
+        raise click.ClickException(f"No user named {username!r}")
+    revoked = _store().delete_user(user_id)
+    click.echo(f"Ended {revoked} sessions of {username}")
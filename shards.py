@@ -0,0 +1,487 @@
+import bisect
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+
+import click
+from flask import current_app, g, request, session
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, insert, inspect, select, update
+from sqlalchemy.sql.util import find_tables
+
+from models import db, User, Task, ArchivedTask, RecurrenceRule, RecurrenceSkip, DirectoryEntry
+
+
+# ==================== SHARD RING ====================
+# With DB_SHARDS set, every user's rows (their user row, tasks, archive,
+# repeating tasks) live in one of DB_SHARDS SQLite files, so users on
+# different shards never wait for each other's write lock. Server-side
+# sessions are spread over the same files by their key. The DATABASE_URL
+# database keeps only user_directory: usernames, the ids handed out to
+# them, and which shard each one is on.
+#
+# New users are placed by consistent hashing of their id, so growing
+# DB_SHARDS from N to N + 1 only wants about 1/(N + 1) of users moved, all
+# of them to the new shard. `flask shards rebalance` moves them.
+
+def shard_names(config):
+    """Bind keys of the configured shards: shard0, shard1, ..."""
+    return [f"shard{n}" for n in range(config["DB_SHARDS"])]
+
+
+def shard_urls(config):
+    """Database URL of every shard, from the DB_SHARD_URL pattern"""
+    return {name: config["DB_SHARD_URL"].format(shard=n)
+            for n, name in enumerate(shard_names(config))}
+
+
+def ring_hash(value):
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing of user ids and session keys onto shard names
+
+    Each shard owns `vnodes` points on a ring of 64-bit hashes; a value
+    belongs to the shard of the first point at or after its own hash.
+    """
+
+    def __init__(self, names, vnodes=64):
+        points = sorted((ring_hash(f"{name}#{n}"), name) for name in names for n in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._names = [name for _, name in points]
+
+    def shard_for(self, value):
+        index = bisect.bisect_left(self._hashes, ring_hash(value))
+        return self._names[index % len(self._names)]
+
+
+# ==================== ROUTING ====================
+# db.session (models.RoutingSession) asks the router for the engine of
+# every statement: user_directory goes to the DATABASE_URL database and
+# everything else to the shard selected in g.shard. Requests of a
+# logged-in user select that user's shard before any view runs, so the
+# routes, services and queries need no changes; code running outside a
+# request selects one with select_user_shard() or each_shard(). A
+# per-user table queried with no shard selected raises NoShardSelected
+# rather than quietly reading the wrong database.
+
+# Tables kept in the DATABASE_URL database; all others are on the shards
+DIRECTORY_TABLES = frozenset({"user_directory"})
+
+# Most shards there may be (admin listings pack a shard's number into their cursors)
+MAX_SHARDS = 1024
+
+
+class NoShardSelected(RuntimeError):
+    """Raised when a per-user table is queried before a shard was selected"""
+
+
+class ShardRouter:
+    """Which shard each user is on, and which engine each statement runs on
+
+    Where users are is cached per process: it only changes while the app
+    is stopped for a rebalance.
+    """
+
+    def __init__(self, names, vnodes=64, cache_size=65536):
+        self.names = names
+        self.ring = HashRing(names, vnodes)
+        self.cache_size = cache_size
+        self._locations = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_bind(self, mapper, clause):
+        """Engine for a statement, or None for the DATABASE_URL one"""
+        if mapper is not None:
+            tables = {inspect(mapper).local_table.name}
+        elif clause is not None:
+            tables = {table.name for table in find_tables(clause, include_crud=True)}
+        else:
+            tables = set()
+        if tables and tables <= DIRECTORY_TABLES:
+            return None
+
+        shard = g.get("shard")
+        if shard is not None:
+            return db.engines[shard]
+        if tables:
+            raise NoShardSelected(f"No shard selected for {', '.join(sorted(tables))}")
+        return None
+
+    def locate(self, user_id):
+        """Name of the shard user_id's rows are on"""
+        with self._lock:
+            shard = self._locations.get(user_id)
+            if shard is not None:
+                self._locations.move_to_end(user_id)
+                return shard
+
+        shard = db.session.execute(
+            select(DirectoryEntry.shard).where(DirectoryEntry.id == user_id)
+        ).scalar()
+        if shard is None:
+            # No such user: send their queries where the ring would put them, to find nothing
+            return self.ring.shard_for(user_id)
+        self.remember(user_id, shard)
+        return shard
+
+    def remember(self, user_id, shard):
+        with self._lock:
+            self._locations[user_id] = shard
+            self._locations.move_to_end(user_id)
+            while len(self._locations) > self.cache_size:
+                self._locations.popitem(last=False)
+
+
+def shard_router():
+    """The app's ShardRouter, or None if the database is not sharded"""
+    return current_app.extensions.get("shards")
+
+
+@contextmanager
+def using_shard(name):
+    """Send per-user tables to shard name inside the block"""
+    previous = g.get("shard")
+    g.shard = name
+    try:
+        yield name
+    finally:
+        g.shard = previous
+
+
+def select_user_shard(user_id):
+    """Send per-user tables to user_id's shard for the rest of the app context
+
+    Returns the shard's name, or None if the database is not sharded.
+    """
+    router = shard_router()
+    if router is None:
+        return None
+    g.shard = router.locate(user_id)
+    return g.shard
+
+
+def each_shard():
+    """Runs the body of a for loop once per shard, with that shard selected
+
+    Unsharded it runs once, on the one database. Rows from different
+    shards may share task ids, so callers merge plain rows, not entities.
+    """
+    router = shard_router()
+    if router is None:
+        yield None
+        return
+    for name in router.names:
+        with using_shard(name):
+            yield name
+
+
+def session_shard(key):
+    """Select the shard the server-side session stored under key is on, inside the block"""
+    router = shard_router()
+    return nullcontext() if router is None else using_shard(router.ring.shard_for(key))
+
+
+def _select_request_shard():
+    if request.endpoint != "static" and "user_id" in session:
+        select_user_shard(session["user_id"])
+
+
+def database_tables():
+    """(engine, tables) for every database, i.e. what init_db() creates where"""
+    tables = db.metadata.sorted_tables
+    router = shard_router()
+    if router is None:
+        return [(db.engine, [table for table in tables if table.name not in DIRECTORY_TABLES])]
+    directory = [table for table in tables if table.name in DIRECTORY_TABLES]
+    per_user = [table for table in tables if table.name not in DIRECTORY_TABLES]
+    return [(db.engine, directory)] + [(db.engines[name], per_user) for name in router.names]
+
+
+def init_shards(app):
+    """Route per-user tables to DB_SHARDS shards, if set; returns the router, or None
+
+    The shard engines themselves come from SQLALCHEMY_BINDS (create_app()).
+    """
+    if app.config["DB_SHARDS"] <= 0:
+        return None
+    if app.config["DB_SHARDS"] > MAX_SHARDS:
+        raise ValueError(f"DB_SHARDS is {app.config['DB_SHARDS']}; at most {MAX_SHARDS} are supported")
+    router = ShardRouter(shard_names(app.config),
+                         vnodes=app.config["DB_SHARD_VNODES"],
+                         cache_size=app.config["DB_SHARD_CACHE_MAX_ENTRIES"])
+    app.extensions["shards"] = router
+    app.before_request(_select_request_shard)
+    return router
+
+
+# ==================== USER DIRECTORY ====================
+# Finding and creating users by username, for login, registration and
+# the CLI. Sharded, the username is looked up in user_directory first and
+# the user's shard selected; unsharded, these are plain `users` queries.
+#
+# The directory and the shard are separate databases, so a new user is
+# two commits: add_user() commits the directory row first, and the
+# caller's commit writes the users row to the shard. A directory row
+# whose shard has no such user was left by a shard write that failed. Its
+# username counts as free, and the next add_user() for it reuses the
+# row's id and shard, so two sign-ups racing for it collide on the
+# shard's primary key. Committing the other way round could instead leave
+# a users row behind an id the directory hands out again.
+
+def _directory_entry(username):
+    """username's (id, shard) in user_directory, with the shard selected; None if not placed"""
+    entry = db.session.execute(
+        select(DirectoryEntry.id, DirectoryEntry.shard).where(DirectoryEntry.username == username)
+    ).first()
+    if entry is None or entry.shard is None:
+        return None
+    shard_router().remember(entry.id, entry.shard)
+    g.shard = entry.shard
+    return entry
+
+
+def _user_exists(user_id):
+    return db.session.query(User.id).filter_by(id=user_id).first() is not None
+
+
+def find_user_id(username):
+    """Id of the user named username, with their shard selected; None if there is none"""
+    if shard_router() is None:
+        return db.session.query(User.id).filter_by(username=username).scalar()
+    entry = _directory_entry(username)
+    return entry.id if entry is not None and _user_exists(entry.id) else None
+
+
+def find_user(username):
+    """The User named username, with their shard selected; None if there is none"""
+    if shard_router() is None:
+        return User.query.filter_by(username=username).first()
+    entry = _directory_entry(username)
+    return db.session.get(User, entry.id) if entry is not None else None
+
+
+def username_taken(username):
+    if shard_router() is None:
+        return db.session.query(User.id).filter_by(username=username).first() is not None
+    entry = _directory_entry(username)
+    return entry is not None and _user_exists(entry.id)
+
+
+def add_user(full_name, username, password_hash):
+    """A new User, added to the session (and its shard selected); the caller commits
+
+    Sharded, the id comes from user_directory and the ring places the
+    user. The directory row is committed here, with anything else the
+    session holds, before the user's.
+    """
+    user = User(full_name, username, password_hash)
+    router = shard_router()
+    if router is not None:
+        entry = db.session.execute(
+            select(DirectoryEntry).where(DirectoryEntry.username == username)
+        ).scalar()
+        if entry is None:
+            entry = DirectoryEntry(username=username)
+            db.session.add(entry)
+            db.session.flush()
+        if entry.shard is None:
+            entry.shard = router.ring.shard_for(entry.id)
+        user.id, shard = entry.id, entry.shard
+        db.session.commit()
+        router.remember(user.id, shard)
+        g.shard = shard
+    db.session.add(user)
+    return user
+
+
+# ==================== REBALANCING ====================
+# Offline: stop every worker first, as they cache where users are. Each
+# move copies the user's rows to the new shard and commits, points the
+# directory at it, then deletes the old copy, so an interrupted run loses
+# nothing and can simply be run again (see purge_strays()). Moved rows
+# keep their ids unless the new shard already uses one, in which case it
+# picks another, as restoring an archived task does. Sessions stay where
+# they are: they are placed by key, not by user.
+
+# A user's tables on their shard, parents first
+USER_TABLES = (User.__table__, RecurrenceRule.__table__, RecurrenceSkip.__table__,
+               Task.__table__, ArchivedTask.__table__)
+
+# Ids per IN (...) when checking which are taken
+ID_BATCH_SIZE = 500
+
+
+def plan_moves(router):
+    """(user_id, username, from shard, to shard) of every user not on the shard the ring picks"""
+    after_id = 0
+    while True:
+        rows = db.session.execute(
+            select(DirectoryEntry.id, DirectoryEntry.username, DirectoryEntry.shard)
+            .where(DirectoryEntry.id > after_id).order_by(DirectoryEntry.id).limit(1000)
+        ).all()
+        db.session.rollback()
+        if not rows:
+            return
+        for row in rows:
+            target = router.ring.shard_for(row.id)
+            if row.shard is not None and row.shard != target:
+                yield row.id, row.username, row.shard, target
+        after_id = rows[-1].id
+
+
+def _owned(table, user_id):
+    return (table.c.id if table is User.__table__ else table.c.user_id) == user_id
+
+
+def delete_user_rows(connection, user_id):
+    for table in reversed(USER_TABLES):
+        connection.execute(delete(table).where(_owned(table, user_id)))
+
+
+def copy_rows(connection, table, rows, id_tables):
+    """Insert rows into table, keeping every id no table in id_tables uses yet
+
+    Returns {old id: new id} for all of them.
+    """
+    rows = [dict(row) for row in rows]
+    taken = set()
+    ids = [row["id"] for row in rows]
+    for start in range(0, len(ids), ID_BATCH_SIZE):
+        chunk = ids[start:start + ID_BATCH_SIZE]
+        for id_table in id_tables:
+            taken.update(connection.execute(select(id_table.c.id).where(id_table.c.id.in_(chunk))).scalars())
+
+    kept = [row for row in rows if row["id"] not in taken]
+    if kept:
+        connection.execute(insert(table), kept)
+    new_ids = {row["id"]: row["id"] for row in kept}
+    for row in rows:
+        if row["id"] in taken:
+            new_ids[row["id"]] = connection.execute(
+                insert(table).values({**row, "id": None}).returning(table.c.id)
+            ).scalar()
+    return new_ids
+
+
+def move_user(user_id, source, target):
+    """Move user_id's rows from shard source to target; returns how many tasks got a new id"""
+    with db.engines[source].connect() as connection:
+        rows = {table.name: connection.execute(select(table).where(_owned(table, user_id))).mappings().all()
+                for table in USER_TABLES}
+
+    tasks, archived = Task.__table__, ArchivedTask.__table__
+    with db.engines[target].begin() as connection:
+        # Left there by an earlier, interrupted move
+        delete_user_rows(connection, user_id)
+        if rows["users"]:
+            connection.execute(insert(User.__table__), [dict(row) for row in rows["users"]])
+        rule_ids = copy_rows(connection, RecurrenceRule.__table__, rows["recurrence_rules"],
+                             [RecurrenceRule.__table__])
+        if rows["recurrence_skips"]:
+            connection.execute(insert(RecurrenceSkip.__table__), [
+                dict(row, rule_id=rule_ids.get(row["rule_id"], row["rule_id"]))
+                for row in rows["recurrence_skips"]
+            ])
+
+        def remapped(row):
+            row = dict(row)
+            if row["recurrence_id"] is not None:
+                row["recurrence_id"] = rule_ids.get(row["recurrence_id"], row["recurrence_id"])
+            return row
+
+        task_ids = copy_rows(connection, tasks, [remapped(row) for row in rows["tasks"]],
+                             [tasks, archived])
+        archived_ids = copy_rows(connection, archived, [remapped(row) for row in rows["archived_tasks"]],
+                                 [archived, tasks])
+
+    with db.engine.begin() as connection:
+        connection.execute(update(DirectoryEntry.__table__)
+                           .where(DirectoryEntry.__table__.c.id == user_id).values(shard=target))
+
+    with db.engines[source].begin() as connection:
+        delete_user_rows(connection, user_id)
+
+    return sum(old != new for ids in (task_ids, archived_ids) for old, new in ids.items())
+
+
+def purge_strays(router):
+    """Delete users' rows from shards the directory says they are not on; returns how many users
+
+    They are what a move interrupted after repointing the directory leaves behind.
+    """
+    purged = 0
+    for name in router.names:
+        with db.engines[name].connect() as connection:
+            user_ids = connection.execute(select(User.__table__.c.id)).scalars().all()
+
+        strays = []
+        for start in range(0, len(user_ids), ID_BATCH_SIZE):
+            chunk = user_ids[start:start + ID_BATCH_SIZE]
+            located = db.session.execute(
+                select(DirectoryEntry.id, DirectoryEntry.shard).where(DirectoryEntry.id.in_(chunk))
+            ).all()
+            strays.extend(user_id for user_id, shard in located if shard not in (None, name))
+        db.session.rollback()
+
+        with db.engines[name].begin() as connection:
+            for user_id in strays:
+                delete_user_rows(connection, user_id)
+        purged += len(strays)
+    return purged
+
+
+# ==================== CLI ====================
+# flask shards status  /  flask shards rebalance [--dry-run]
+
+shards_cli = AppGroup("shards", help="Inspect and rebalance the per-user database shards.")
+
+
+def _router():
+    router = shard_router()
+    if router is None:
+        raise click.ClickException("DB_SHARDS is 0: the database is not sharded")
+    return router
+
+
+@shards_cli.command("status")
+def status_command():
+    """Users on each shard, and how many a rebalance would move"""
+    router = _router()
+    counts = dict(db.session.execute(
+        select(DirectoryEntry.shard, func.count()).group_by(DirectoryEntry.shard)
+    ).all())
+    for name in router.names:
+        click.echo(f"{name}: {counts.pop(name, 0)} users")
+    for name, count in counts.items():
+        click.echo(f"{name} (not configured): {count} users")
+    click.echo(f"{sum(1 for _ in plan_moves(router))} users to move")
+
+
+@shards_cli.command("rebalance")
+@click.option("--dry-run", is_flag=True, help="List the moves without making them.")
+def rebalance_command(dry_run):
+    """Move every user to the shard the ring picks for them (stop the app first)"""
+    router = _router()
+    moves = list(plan_moves(router))
+    unknown = sorted({source for _, _, source, _ in moves if source not in router.names})
+    if unknown:
+        raise click.ClickException(f"Users are on unconfigured shards ({', '.join(unknown)}); "
+                                   "DB_SHARDS can grow but not shrink")
+
+    renumbered = 0
+    for user_id, username, source, target in moves:
+        if dry_run:
+            click.echo(f"{username}: {source} -> {target}")
+            continue
+        renumbered += move_user(user_id, source, target)
+        click.echo(f"Moved {username}: {source} -> {target}")
+
+    if dry_run:
+        click.echo(f"{len(moves)} users to move")
+        return
+    purged = purge_strays(router)
+    click.echo(f"Moved {len(moves)} users ({renumbered} tasks got new ids); "
+               f"removed {purged} leftover copies")
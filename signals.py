@@ -0,0 +1,11 @@
+from blinker import Namespace
+
+# Application signals, sent with the Flask app as sender
+shinxity_signals = Namespace()
+
+# A user's task list changed. Sent by every write route after a successful
+# commit, with user_id=<owner>, revision=<their new task revision> and
+# event=<services.task_event() dict, or None when the route does not say
+# what changed>. Caches and other derived state listen here instead of
+# being poked by each route.
+tasks_changed = shinxity_signals.signal("tasks-changed")
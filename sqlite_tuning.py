@@ -0,0 +1,145 @@
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+import aio
+from models import db
+
+# sqlite3 primary result codes (extended codes keep these in the low byte)
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+
+# ==================== CONNECTION SETUP ====================
+# With the default rollback journal every writer blocks every reader, and
+# pysqlite starts transactions lazily as DEFERRED, so two requests that
+# read and then write can deadlock and one fails at once with "database is
+# locked". WAL lets readers run alongside the single writer, the busy
+# timeout makes writers queue instead of failing, and write requests take
+# the write lock up front (BEGIN IMMEDIATE) so they never need to upgrade.
+
+def init_sqlite(app):
+    """Apply the SQLITE_* settings to every connection of the app's SQLite engines (shards included)"""
+    if not app.config["SQLITE_TUNING"]:
+        return
+    with app.app_context():
+        engines = [engine for engine in db.engines.values() if engine.dialect.name == "sqlite"]
+
+    config = app.config
+    pragmas = [
+        ("journal_mode", config["SQLITE_JOURNAL_MODE"]),
+        ("synchronous", config["SQLITE_SYNCHRONOUS"]),
+        ("busy_timeout", config["SQLITE_BUSY_TIMEOUT_MS"]),
+        ("mmap_size", config["SQLITE_MMAP_SIZE"]),
+        ("cache_size", config["SQLITE_CACHE_SIZE"]),
+    ]
+
+    def set_pragmas(dbapi_connection, connection_record):
+        # Let SQLAlchemy's "begin" hook below issue BEGIN instead of pysqlite
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            if value is not None:
+                cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+    def begin(connection):
+        if has_request_context() and g.get("sqlite_write_request"):
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        else:
+            connection.exec_driver_sql("BEGIN")
+
+    for engine in engines:
+        event.listen(engine, "connect", set_pragmas)
+        event.listen(engine, "begin", begin)
+
+
+# ==================== RETRY ON BUSY ====================
+
+def is_database_busy(error):
+    """True for SQLite's "database is locked"/"busy" errors, which are safe to retry"""
+    if not isinstance(error, OperationalError):
+        return False
+    code = getattr(error.orig, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xff in (SQLITE_BUSY, SQLITE_LOCKED)
+    message = str(error.orig).lower()
+    return "database is locked" in message or "busy" in message
+
+
+def retry_on_busy(view):
+    """Re-run a write route a bounded number of times if SQLite stays busy
+
+    The view must let busy errors propagate (after rolling back) rather
+    than swallow them. Attempts back off exponentially from
+    DB_WRITE_RETRY_DELAY; when they run out the client gets a 503.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method in ("GET", "HEAD"):
+            return view(*args, **kwargs)
+
+        g.sqlite_write_request = True
+        retries = current_app.config["DB_WRITE_RETRIES"]
+        delay = current_app.config["DB_WRITE_RETRY_DELAY"]
+
+        for attempt in range(retries + 1):
+            try:
+                return view(*args, **kwargs)
+            except OperationalError as e:
+                db.session.rollback()
+                if not is_database_busy(e):
+                    raise
+                if attempt < retries:
+                    aio.sleep(delay * 2 ** attempt)
+
+        current_app.logger.warning("Database busy after %d attempts: %s %s",
+                                   retries + 1, request.method, request.path)
+        abort(503, description="The database is busy, please try again.")
+
+    return wrapper
+
+
+def immediate_writes(view):
+    """Like retry_on_busy, but for write routes that must not run twice
+
+    e.g. ones that consume the request body as a stream. Transactions
+    still start with BEGIN IMMEDIATE; if SQLite stays busy past the busy
+    timeout the client gets a 503 straight away.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            g.sqlite_write_request = True
+        try:
+            return view(*args, **kwargs)
+        except OperationalError as e:
+            db.session.rollback()
+            if not is_database_busy(e):
+                raise
+            abort(503, description="The database is busy, please try again.")
+
+    return wrapper
+
+
+@contextmanager
+def immediate_transaction():
+    """Run a write from a read-only (GET) route in its own BEGIN IMMEDIATE transaction
+
+    Whatever the session was reading is rolled back first, so the write
+    never has to upgrade a read transaction, which in WAL mode fails at
+    once if another connection has written since. The block must commit.
+    """
+    db.session.rollback()
+    previous = g.get("sqlite_write_request", False)
+    g.sqlite_write_request = True
+    try:
+        yield
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        g.sqlite_write_request = previous
@@ -0,0 +1,497 @@
+from flask import (Blueprint, current_app, render_template, url_for, redirect, request,
+                   session, flash, abort, jsonify)
+from markupsafe import Markup
+from datetime import date
+
+from models import db, RecurrenceRule
+from queries import TABS, PAGED_TABS, TAB_SECTIONS, load_page
+from services import (ValidationError, parse_task_fields, tab_for, create_task, update_task,
+                      toggle_task, remove_task, task_event, commit_task_changes, get_own_task)
+from profiles import get_profile, get_revision
+from recurrence import (parse_recurrence, describe, create_rule, stop_rule, get_own_rule, occurs_on,
+                        skipped_rules,
+                        catch_up, materialize_occurrence, load_dashboard_with_upcoming,
+                        load_future_page)
+from search import search_tasks
+from archive import restore_task
+from ordering import move_up, move_down, move_after, is_sibling
+from conditional import conditional_response, tasks_last_modified
+from sqlite_tuning import retry_on_busy, is_database_busy
+
+tasks = Blueprint("tasks", __name__)
+
+
+# ==================== HOME PAGE ====================
+
+@tasks.route("/home")
+def home():
+    """Home page with task display"""
+    if "username" not in session:
+        flash("Please log in to access this page", "error")
+        return redirect(url_for("auth.login"))
+    
+    # The revision is read on every request (it decides 304s and cache
+    # hits); the name shown on the page comes from the profile cache
+    user_id = session.get("user_id")
+    revision = get_revision(user_id)
+    profile = get_profile(user_id) if revision else None
+    
+    if not profile:
+        session.clear()
+        flash("Session expired. Please log in again.", "error")
+        return redirect(url_for("auth.login"))
+    
+    # Get active tab
+    active_tab = request.args.get('tab', 'today')
+    if active_tab not in TABS:
+        active_tab = 'today'
+    
+    # Get today's date
+    today = date.today()
+    
+    # Repeating tasks due today get their rows now (a write, and a new revision)
+    revision = catch_up(user_id, revision, today)
+    
+    # The page only changes when this user's tasks (or the date) do
+    etag = f"{user_id}-{revision.task_revision}-{active_tab}-{today.isoformat()}"
+    last_modified = tasks_last_modified(revision, today)
+    
+    def render():
+        dashboard_html = dashboard_fragment(user_id, revision, active_tab, today)
+        return render_template('home.html',
+                             username=profile.username,
+                             full_name=profile.full_name,
+                             active_tab=active_tab,
+                             revision=revision.task_revision,
+                             today=today.isoformat(),
+                             dashboard_html=Markup(dashboard_html))
+    
+    return conditional_response(etag, last_modified, render)
+
+
+def dashboard_fragment(user_id, revision, active_tab, today):
+    """Rendered tab bar and task lists, from the fragment cache when possible
+
+    Entries carry the task revision they were rendered at, so one left
+    behind by another worker process after a write is never served.
+    """
+    task_revision = revision.task_revision
+    fragment_cache = current_app.extensions["fragment_cache"]
+    cache_key = (user_id, active_tab, today.isoformat())
+    cached = fragment_cache.get(cache_key)
+    if cached is not None and cached[0] == task_revision:
+        return cached[1]
+    
+    cache_version = fragment_cache.version(user_id)
+    # First page of the active tab (already split by completion) and every tab's
+    # counts, with occurrences of repeating tasks that have no row yet
+    dashboard = load_dashboard_with_upcoming(user_id, revision, active_tab, today,
+                                             current_app.config['TASKS_PAGE_SIZE'],
+                                             current_app.config['RECURRENCE_HORIZON_DAYS'])
+    dashboard_html = render_template('_dashboard.html',
+                                   active_tab=active_tab,
+                                   ongoing_tasks=dashboard.ongoing_tasks,
+                                   complete_tasks=dashboard.complete_tasks,
+                                   next_cursors=dashboard.next_cursors,
+                                   tab_counts=dashboard.counts)
+    fragment_cache.set(cache_key, (task_revision, dashboard_html), cache_version)
+    return dashboard_html
+
+
+@tasks.route("/home/more")
+def home_more():
+    """Next page of a Past/Future section, as an HTML fragment or JSON"""
+    if "user_id" not in session:
+        abort(401)
+    
+    tab = request.args.get("tab", "")
+    section = request.args.get("section", "")
+    cursor = request.args.get("after", "")
+    
+    if tab not in PAGED_TABS or section not in TAB_SECTIONS[tab]:
+        abort(400)
+    
+    try:
+        if tab == "future" and section == "ongoing":
+            page = load_future_page(session['user_id'], date.today(), cursor,
+                                    current_app.config['TASKS_PAGE_SIZE'],
+                                    current_app.config['RECURRENCE_HORIZON_DAYS'])
+        else:
+            page = load_page(session['user_id'], tab, date.today(), section, cursor,
+                             current_app.config['TASKS_PAGE_SIZE'])
+    except ValueError:
+        abort(400)
+    
+    if request.args.get("format") == "json" or request.accept_mimetypes.best == "application/json":
+        return jsonify(tasks=[task.to_dict() for task in page.tasks],
+                       next_cursor=page.next_cursor)
+    
+    return render_template('_task_cards.html',
+                         tasks=page.tasks,
+                         section=section,
+                         active_tab=tab,
+                         next_cursor=page.next_cursor)
+
+
+# ==================== SEARCH ====================
+
+@tasks.route("/search")
+def search():
+    """Full-text search over the current user's task titles and descriptions"""
+    if "user_id" not in session:
+        flash("Please log in to search your tasks", "error")
+        return redirect(url_for("auth.login"))
+    
+    query = request.args.get("q", "").strip()
+    results = []
+    if query:
+        results = search_tasks(session['user_id'], query, current_app.config['SEARCH_RESULTS_LIMIT'])
+    
+    return render_template("search.html", query=query, results=results)
+
+
+# ==================== TASK CRUD OPERATIONS ====================
+
+@tasks.route("/new-task", methods=["GET", "POST"])
+@retry_on_busy
+def new_task():
+    """Create a new task"""
+    if "user_id" not in session:
+        flash("Please log in to create tasks", "error")
+        return redirect(url_for("auth.login"))
+    
+    if request.method == "POST":
+        try:
+            fields = parse_task_fields(request.form.get("title"),
+                                       request.form.get("description"),
+                                       request.form.get("due_date"))
+            frequency, interval = parse_recurrence(request.form.get("repeat"),
+                                                   request.form.get("interval"))
+        except ValidationError as e:
+            flash(str(e), "error")
+            return render_template("new_task.html")
+        
+        # Create task, or the rule its occurrences will be created from
+        try:
+            event = None
+            if frequency:
+                create_rule(session['user_id'], fields, frequency, interval)
+            else:
+                event = task_event("created", create_task(session['user_id'], fields))
+            commit_task_changes(session['user_id'], event)
+            
+            flash(f"Task '{fields['title']}' created successfully!", "success")
+            
+            # Redirect to appropriate tab
+            return redirect(url_for("tasks.home", tab=tab_for(fields["due_date"])))
+        
+        except Exception as e:
+            db.session.rollback()
+            if is_database_busy(e):
+                raise  # retried by @retry_on_busy
+            flash("Error creating task. Please try again.", "error")
+            print(f"Task creation error: {e}")
+            return render_template("new_task.html")
+    
+    return render_template("new_task.html")
+
+
+@tasks.route("/edit-task/<int:task_id>", methods=["GET", "POST"])
+@retry_on_busy
+def edit_task(task_id):
+    """Edit an existing task"""
+    if "user_id" not in session:
+        flash("Please log in to edit tasks", "error")
+        return redirect(url_for("auth.login"))
+    
+    # One query: the task, only if it belongs to the current user
+    task = get_own_task(session['user_id'], task_id)
+    if task is None:
+        abort(404)
+    
+    if request.method == "POST":
+        try:
+            fields = parse_task_fields(request.form.get("title"),
+                                       request.form.get("description"),
+                                       request.form.get("due_date"))
+        except ValidationError as e:
+            flash(str(e), "error")
+            return render_template("edit_task.html", task=task)
+        
+        try:
+            previous_due_date = task.due_date.isoformat()
+            update_task(task, fields)
+            commit_task_changes(session['user_id'], task_event("updated", task,
+                                                               previous_due_date=previous_due_date))
+            
+            flash(f"Task '{fields['title']}' updated successfully!", "success")
+            
+            # Redirect to appropriate tab
+            return redirect(url_for("tasks.home", tab=tab_for(fields["due_date"])))
+        
+        except Exception as e:
+            db.session.rollback()
+            if is_database_busy(e):
+                raise  # retried by @retry_on_busy
+            flash("Error updating task. Please try again.", "error")
+            print(f"Task update error: {e}")
+            return render_template("edit_task.html", task=task)
+    
+    # Unchanged since the client last saw it? Revision covers every task write
+    revision = get_revision(session['user_id'])
+    etag = f"{session['user_id']}-{revision.task_revision}-task-{task.id}"
+    
+    def render():
+        rule = None
+        if task.recurrence_id is not None:
+            rule = db.session.get(RecurrenceRule, task.recurrence_id)
+        return render_template("edit_task.html", task=task, rule=rule,
+                               repeats=describe(rule) if rule and rule.ends_on is None else None)
+    
+    return conditional_response(etag, tasks_last_modified(revision, date.today()), render)
+
+
+@tasks.route("/delete-task/<int:task_id>", methods=["POST"])
+@retry_on_busy
+def delete_task(task_id):
+    """Delete a task"""
+    if "user_id" not in session:
+        flash("Please log in to delete tasks", "error")
+        return redirect(url_for("auth.login"))
+    
+    # One query: the task, only if it belongs to the current user
+    task = get_own_task(session['user_id'], task_id)
+    if task is None:
+        abort(404)
+    
+    # Get tab before deleting
+    tab = tab_for(task.due_date)
+    
+    try:
+        title = task.title
+        event = task_event("deleted", task)
+        remove_task(task)
+        commit_task_changes(session['user_id'], event)
+        flash(f"Task '{title}' deleted", "success")
+    except Exception as e:
+        db.session.rollback()
+        if is_database_busy(e):
+            raise  # retried by @retry_on_busy
+        flash("Error deleting task", "error")
+        print(f"Delete error: {e}")
+    
+    return redirect(url_for("tasks.home", tab=tab))
+
+
+@tasks.route("/toggle-complete/<int:task_id>", methods=["POST"])
+@retry_on_busy
+def toggle_complete(task_id):
+    """Toggle task completion status"""
+    if "user_id" not in session:
+        flash("Please log in", "error")
+        return redirect(url_for("auth.login"))
+    
+    # One query: the task, only if it belongs to the current user
+    task = get_own_task(session['user_id'], task_id)
+    if task is None:
+        abort(404)
+    
+    # Get current tab
+    tab = request.form.get("tab", "today")
+    
+    try:
+        toggle_task(task)
+        commit_task_changes(session['user_id'], task_event("toggled", task))
+    except Exception as e:
+        db.session.rollback()
+        if is_database_busy(e):
+            raise  # retried by @retry_on_busy
+        flash("Error updating task", "error")
+        print(f"Toggle error: {e}")
+    
+    return redirect(url_for("tasks.home", tab=tab))
+
+
+@tasks.route("/reorder-task/<int:task_id>", methods=["POST"])
+@retry_on_busy
+def reorder_task(task_id):
+    """Reorder a task (move up or down)"""
+    if "user_id" not in session:
+        return redirect(url_for("auth.login"))
+    
+    # One query: the task, only if it belongs to the current user
+    task = get_own_task(session['user_id'], task_id)
+    if task is None:
+        abort(404)
+    
+    direction = request.args.get("direction", "up")
+    tab = request.form.get("tab", "today")
+    
+    try:
+        # Only this task's priority changes, via an indexed neighbour lookup
+        moved = move_up(task) if direction == "up" else move_down(task)
+        if moved:
+            commit_task_changes(session['user_id'], task_event("reordered", task, direction=direction))
+    
+    except Exception as e:
+        db.session.rollback()
+        if is_database_busy(e):
+            raise  # retried by @retry_on_busy
+        print(f"Reorder error: {e}")
+    
+    return redirect(url_for("tasks.home", tab=tab))
+
+
+@tasks.route("/move-task/<int:task_id>", methods=["POST"])
+@retry_on_busy
+def move_task(task_id):
+    """Move a task directly below another task in its list (or to the top)"""
+    if "user_id" not in session:
+        return redirect(url_for("auth.login"))
+    
+    # One query: the task, only if it belongs to the current user
+    task = get_own_task(session['user_id'], task_id)
+    if task is None:
+        abort(404)
+    
+    tab = request.form.get("tab", "today")
+    after_id = request.form.get("after", type=int)
+    
+    after = None
+    if after_id:
+        after = get_own_task(session['user_id'], after_id)
+        if after is None or not is_sibling(task, after):
+            flash("Tasks can only be moved within the same day and section", "error")
+            return redirect(url_for("tasks.home", tab=tab))
+    
+    try:
+        if move_after(task, after):
+            commit_task_changes(session['user_id'], task_event("reordered", task,
+                                                               after=after.id if after else None))
+    
+    except Exception as e:
+        db.session.rollback()
+        if is_database_busy(e):
+            raise  # retried by @retry_on_busy
+        print(f"Move error: {e}")
+    
+    return redirect(url_for("tasks.home", tab=tab))
+
+
+# ==================== REPEATING TASKS ====================
+# Occurrences on the Future tab that have no row yet are addressed by
+# rule and day; completing or editing one creates its row first.
+
+def own_occurrence(rule_id, day):
+    """The current user's rule, if it occurs on day ("YYYY-MM-DD"), else 404"""
+    try:
+        day = date.fromisoformat(day)
+    except ValueError:
+        abort(404)
+    rule = get_own_rule(session['user_id'], rule_id)
+    if rule is None or not occurs_on(rule, day) or skipped_rules([rule.id], day):
+        abort(404)
+    return rule, day
+
+
+@tasks.route("/occurrences/<int:rule_id>/<day>/complete", methods=["POST"])
+@retry_on_busy
+def complete_occurrence(rule_id, day):
+    """Complete an upcoming occurrence of a repeating task ahead of time"""
+    if "user_id" not in session:
+        flash("Please log in", "error")
+        return redirect(url_for("auth.login"))
+    
+    rule, day = own_occurrence(rule_id, day)
+    tab = request.form.get("tab", "future")
+    
+    try:
+        task = materialize_occurrence(rule, day)
+        if not task.completed:
+            toggle_task(task)
+        commit_task_changes(session['user_id'], task_event("toggled", task))
+    except Exception as e:
+        db.session.rollback()
+        if is_database_busy(e):
+            raise  # retried by @retry_on_busy
+        flash("Error updating task", "error")
+        print(f"Occurrence complete error: {e}")
+    
+    return redirect(url_for("tasks.home", tab=tab))
+
+
+@tasks.route("/occurrences/<int:rule_id>/<day>/edit", methods=["POST"])
+@retry_on_busy
+def edit_occurrence(rule_id, day):
+    """Give an upcoming occurrence its own task, then edit that"""
+    if "user_id" not in session:
+        flash("Please log in to edit tasks", "error")
+        return redirect(url_for("auth.login"))
+    
+    rule, day = own_occurrence(rule_id, day)
+    
+    try:
+        task = materialize_occurrence(rule, day)
+        task_id = task.id
+        commit_task_changes(session['user_id'])
+    except Exception as e:
+        db.session.rollback()
+        if is_database_busy(e):
+            raise  # retried by @retry_on_busy
+        flash("Error updating task", "error")
+        print(f"Occurrence edit error: {e}")
+        return redirect(url_for("tasks.home", tab="future"))
+    
+    return redirect(url_for("tasks.edit_task", task_id=task_id))
+
+
+@tasks.route("/recurrence/<int:rule_id>/stop", methods=["POST"])
+@retry_on_busy
+def stop_recurrence(rule_id):
+    """Stop a task repeating; its tasks so far are kept"""
+    if "user_id" not in session:
+        flash("Please log in", "error")
+        return redirect(url_for("auth.login"))
+    
+    rule = get_own_rule(session['user_id'], rule_id)
+    if rule is None:
+        abort(404)
+    
+    try:
+        stop_rule(rule, date.today())
+        commit_task_changes(session['user_id'])
+        flash(f"'{rule.title}' will no longer repeat", "success")
+    except Exception as e:
+        db.session.rollback()
+        if is_database_busy(e):
+            raise  # retried by @retry_on_busy
+        flash("Error updating task", "error")
+        print(f"Stop recurrence error: {e}")
+    
+    return redirect(url_for("tasks.home"))
+
+
+# ==================== ARCHIVE ====================
+
+@tasks.route("/archive/<int:task_id>/restore", methods=["POST"])
+@retry_on_busy
+def restore_archived(task_id):
+    """Move an archived task back to the Past tab's live tasks, where it can be edited again"""
+    if "user_id" not in session:
+        flash("Please log in", "error")
+        return redirect(url_for("auth.login"))
+    
+    try:
+        restored = restore_task(session['user_id'], task_id)
+    except Exception as e:
+        db.session.rollback()
+        if is_database_busy(e):
+            raise  # retried by @retry_on_busy
+        flash("Error restoring task", "error")
+        print(f"Restore error: {e}")
+        return redirect(url_for("tasks.home", tab="past"))
+    
+    if restored is None:
+        abort(404)
+    flash("Task restored from the archive", "success")
+    return redirect(url_for("tasks.home", tab="past"))
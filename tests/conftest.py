@@ -0,0 +1,58 @@
+from contextlib import contextmanager
+
+import pytest
+
+from app import create_app, init_db
+from config import Config
+from models import db
+from querycount import count_queries as count_engine_queries
+from shards import add_user
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The full app on a fresh SQLite file, with its tables created"""
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+        BACKGROUND_THREADS = False
+        FRAGMENT_CACHE_BACKEND = "null"
+        # Any lazy relationship load in a test is an error
+        RAISE_ON_LAZY_LOAD = True
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        init_db()
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def user_id(app):
+    with app.app_context():
+        user = add_user("Test User", "tester", "x")
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def client(app, user_id):
+    """A test client logged in as user_id"""
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+        sess["username"] = "tester"
+    return client
+
+
+@pytest.fixture
+def count_queries(app):
+    """`with count_queries() as queries:` records the statements the app runs in the block"""
+    @contextmanager
+    def counting():
+        with app.app_context(), count_engine_queries() as queries:
+            yield queries
+    return counting
@@ -0,0 +1,45 @@
+import pytest
+
+from models import db, ServerSession
+
+ADMIN_PAGES = ["/admin/", "/admin/tasks"]
+
+
+def admin_cli(app, command):
+    result = app.test_cli_runner().invoke(args=["admin", command, "tester"])
+    assert result.exit_code == 0, result.output
+
+
+@pytest.mark.parametrize("page", ADMIN_PAGES)
+def test_logged_out_visitors_are_sent_to_login(app, page):
+    response = app.test_client().get(page)
+    assert response.status_code == 302
+    assert "/login" in response.location
+
+
+@pytest.mark.parametrize("page", ADMIN_PAGES)
+def test_admin_pages_do_not_exist_for_other_users(client, page):
+    response = client.get(page)
+    assert response.status_code == 404
+    assert b"Users" not in response.data
+
+
+def test_non_admins_cannot_revoke_sessions(app, client, user_id):
+    other = app.test_client()
+    other.post("/register", data={"name": "Alice", "username": "alice", "password": "secret123"})
+    with app.app_context():
+        before = db.session.query(ServerSession).count()
+
+    assert client.post(f"/admin/users/{user_id + 1}/sessions/revoke").status_code == 404
+    with app.app_context():
+        assert db.session.query(ServerSession).count() == before
+
+
+def test_granting_and_revoking_admin_takes_effect_at_once(app, client):
+    admin_cli(app, "grant")
+    for page in ADMIN_PAGES:
+        assert client.get(page).status_code == 200
+
+    admin_cli(app, "revoke")
+    for page in ADMIN_PAGES:
+        assert client.get(page).status_code == 404
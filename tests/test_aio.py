@@ -0,0 +1,92 @@
+import asyncio
+import io
+from datetime import date
+
+import pytest
+from sqlalchemy.util import greenlet_spawn
+from werkzeug.exceptions import ClientDisconnected
+
+from aio import ASGIApp, RequestBody
+from app import create_app
+from config import AsyncConfig
+from models import db
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+def test_request_body_is_received_as_it_is_read():
+    messages = [
+        {"type": "http.request", "body": b"abc", "more_body": True},
+        {"type": "http.request", "body": b"def", "more_body": True},
+        {"type": "http.request", "body": b"", "more_body": False},
+    ]
+    received = []
+
+    async def receive():
+        received.append(messages[len(received)])
+        return received[-1]
+
+    async def read():
+        body = io.BufferedReader(RequestBody(receive))
+        first = await greenlet_spawn(body.read, 3)
+        assert len(received) == 1
+        return first + await greenlet_spawn(body.read)
+
+    assert asyncio.run(read()) == b"abcdef"
+    assert len(received) == 3
+
+
+def test_request_body_raises_on_disconnect():
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def read():
+        return await greenlet_spawn(io.BufferedReader(RequestBody(receive)).read)
+
+    with pytest.raises(ClientDisconnected):
+        asyncio.run(read())
+
+
+@pytest.fixture
+def async_app(app, tmp_path):
+    """The app as asgi.py serves it, over aiosqlite on the app fixture's database"""
+    class TestAsyncConfig(AsyncConfig):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite+aiosqlite:///{tmp_path / 'test.db'}"
+        PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+        FRAGMENT_CACHE_BACKEND = "null"
+
+    return ASGIApp(create_app(TestAsyncConfig))
+
+
+@pytest.mark.skipif(httpx is None, reason="needs httpx")
+def test_async_mode_serves_a_streamed_form(async_app):
+    async def form():
+        # A body the server hands over in several messages
+        for part in (b"title=Streamed", b"&description=", b"&due_date=", date.today().isoformat().encode()):
+            yield part
+
+    async def session():
+        transport = httpx.ASGITransport(app=async_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+            response = await client.post("/register", data={"name": "Async User", "username": "async",
+                                                             "password": "secret123"})
+            assert response.status_code == 302
+            response = await client.post("/new-task", content=form(),
+                                         headers={"Content-Type": "application/x-www-form-urlencoded"})
+            assert response.status_code == 302
+            return await client.get("/home")
+
+    try:
+        response = asyncio.run(session())
+    finally:
+        async def dispose():
+            for engine in db.engines.values():
+                await greenlet_spawn(engine.dispose)
+        with async_app.app.app_context():
+            asyncio.run(dispose())
+    assert response.status_code == 200
+    assert "Streamed" in response.text
@@ -0,0 +1,85 @@
+from datetime import date, timedelta
+
+import pytest
+
+TODAY = date.today().isoformat()
+
+
+def create(client, **fields):
+    response = client.post("/api/v1/tasks", json={"title": "Task", "due_date": TODAY, **fields})
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()["id"]
+
+
+@pytest.mark.parametrize("fields", [{"title": 123}, {"description": []}, {"due_date": {"y": 1}}])
+def test_create_rejects_non_string_fields(client, fields):
+    response = client.post("/api/v1/tasks", json={"title": "Task", "due_date": TODAY, **fields})
+    assert response.status_code == 400
+    assert "must be a string" in response.get_json()["error"]
+
+
+def test_update_rejects_non_string_fields(client):
+    task_id = create(client)
+    response = client.patch(f"/api/v1/tasks/{task_id}", json={"title": ["x"]})
+    assert response.status_code == 400
+
+
+def test_reorder_rejects_non_id_after(client):
+    task_id = create(client)
+    response = client.post(f"/api/v1/tasks/{task_id}/reorder", json={"after": [1]})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("operation", [
+    {"op": "update", "id": [1]},
+    {"op": "toggle", "id": "1"},
+    {"op": "delete", "id": True},
+    {"op": "create", "title": 5, "due_date": TODAY},
+    {"op": "update", "id": 1, "description": {}},
+])
+def test_bulk_reports_bad_types_with_their_index(client, operation):
+    create(client)
+    response = client.post("/api/v1/tasks/bulk", json={"operations": [{"op": "toggle", "id": 1}, operation]})
+    assert response.status_code == 400
+    assert response.get_json()["index"] == 1
+
+
+def test_bulk_rejects_use_after_delete(client):
+    task_id = create(client)
+    response = client.post("/api/v1/tasks/bulk", json={"operations": [
+        {"op": "delete", "id": task_id},
+        {"op": "update", "id": task_id, "title": "Gone"},
+    ]})
+    assert response.status_code == 400
+    assert response.get_json()["index"] == 1
+    assert client.get(f"/api/v1/tasks/{task_id}").status_code == 200
+
+
+def test_bulk_updates_to_one_task_build_on_each_other(client):
+    task_id = create(client, title="Orig", description="Old")
+    response = client.post("/api/v1/tasks/bulk", json={"operations": [
+        {"op": "update", "id": task_id, "title": "New title"},
+        {"op": "toggle", "id": task_id},
+        {"op": "update", "id": task_id, "description": "desc"},
+    ]})
+    assert response.status_code == 200, response.get_json()
+    first, toggled, second = response.get_json()["results"]
+    assert (first["title"], first["description"], first["completed"]) == ("New title", "Old", False)
+    assert toggled["completed"] is True
+    assert (second["title"], second["description"]) == ("New title", "desc")
+
+    task = client.get(f"/api/v1/tasks/{task_id}").get_json()
+    assert (task["title"], task["description"], task["completed"]) == ("New title", "desc", True)
+
+
+def test_update_event_carries_previous_due_date(app, client, user_id):
+    # home.html moves the tab badges from the old day to the new one
+    task_id = create(client)
+    subscription = app.extensions["live_events"].subscribe(user_id)
+    tomorrow = (date.today() + timedelta(days=1)).isoformat()
+    client.patch(f"/api/v1/tasks/{task_id}", json={"due_date": tomorrow})
+    events, _ = subscription.get(0)
+    (revision, event), = events
+    assert event["type"] == "updated"
+    assert event["previous_due_date"] == TODAY
+    assert event["task"]["due_date"] == tomorrow
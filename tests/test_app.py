@@ -0,0 +1,35 @@
+"""create_app() builds the whole app: every page works without further setup"""
+from datetime import date
+
+import pytest
+
+from models import db, Task
+
+
+@pytest.mark.parametrize("endpoint", [
+    "auth.login", "auth.register", "auth.logout",
+    "tasks.home", "tasks.new_task", "tasks.edit_task", "tasks.search",
+    "admin.users", "admin.tasks",
+    "api.list_tasks", "api.bulk",
+    "live_events", "metrics",
+])
+def test_endpoint_is_registered(app, endpoint):
+    assert endpoint in app.view_functions
+
+
+def test_register_then_use_the_html_pages(app):
+    client = app.test_client()
+    response = client.post("/register", data={"name": "New User", "username": "newuser",
+                                              "password": "secret1"})
+    assert response.status_code == 302
+    assert response.headers["Location"].endswith("/home")
+
+    assert client.get("/home").status_code == 200
+    response = client.post("/new-task", data={"title": "Write tests", "description": "",
+                                              "due_date": date.today().isoformat()})
+    assert response.status_code == 302
+    with app.app_context():
+        assert db.session.query(Task.title).scalar() == "Write tests"
+
+    assert client.post("/logout").status_code == 302
+    assert client.get("/home").status_code == 302
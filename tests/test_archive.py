@@ -0,0 +1,29 @@
+"""A restored task stays restored, whatever later archive runs find"""
+from datetime import date, timedelta
+
+from archive import archive_completed, archive_cutoff
+from models import db, Task, ArchivedTask
+
+TODAY = date.today()
+
+
+def test_restored_task_is_not_archived_again(app, client):
+    response = client.post("/api/v1/tasks", json={"title": "Old", "due_date":
+                                                  (TODAY - timedelta(days=400)).isoformat()})
+    task_id = response.get_json()["id"]
+    assert client.post(f"/api/v1/tasks/{task_id}/toggle").status_code == 200
+
+    cutoff = archive_cutoff(TODAY, 90)
+    with app.app_context():
+        assert archive_completed(cutoff, 100) == 1
+        archived_id = db.session.query(ArchivedTask.id).scalar()
+
+    response = client.post(f"/api/v1/archive/{archived_id}/restore")
+    assert response.status_code == 200
+    restored_id = response.get_json()["id"]
+
+    with app.app_context():
+        assert archive_completed(cutoff, 100) == 0
+        task = db.session.get(Task, restored_id)
+        assert task.completed and task.restored_at is not None
+        assert db.session.query(ArchivedTask).count() == 0
@@ -0,0 +1,157 @@
+import gzip
+import io
+import json
+import os
+
+import pytest
+from flask import url_for
+
+from assets import (DIST, IMMUTABLE_MAX_AGE, MANIFEST, AssetManifest, Image, build_assets, fingerprinted,
+                    minify_css, rewrite_css)
+
+CSS = """
+/* page layout */
+body {
+    background-image: url('../images/shinx.png');
+    color : red;
+}
+.logo { background: url("data:image/gif;base64,R0lGOD=") no-repeat; }
+.remote { background: url(https://example.com/a.png); }
+"""
+
+
+def test_fingerprint_goes_before_the_extension():
+    assert fingerprinted("css/home.css", b"a") == "css/home.ca978112ca.css"
+    assert fingerprinted("css/home.css", b"a") != fingerprinted("css/home.css", b"b")
+
+
+def test_minify_css():
+    assert minify_css("/* x */ a ,b > c {\n  color: red ;\n}\n") == "a,b>c{color:red}"
+    # A space before a colon may be a descendant combinator (a :hover), so it stays
+    assert minify_css("a :hover{}") == "a :hover{}"
+
+
+def test_rewrite_css_points_at_built_files():
+    manifest = {
+        "images/shinx.png": {"file": "images/shinx.0123456789.png",
+                             "variants": {"image/webp": "images/shinx.abcdefabcd.webp"}},
+        "images/icon.png": {"file": "images/icon.9999999999.png", "variants": {}},
+    }
+    css = rewrite_css(minify_css(CSS + ".icon{mask:url(../images/icon.png)}"), "css/home.css", manifest)
+    # A background with variants falls back to the built file, then offers an image-set()
+    assert ("background-image:url(../images/shinx.0123456789.png);background-image:image-set("
+            'url(../images/shinx.abcdefabcd.webp) type("image/webp"),'
+            'url(../images/shinx.0123456789.png) type("image/png"))') in css
+    assert "url(../images/icon.9999999999.png)" in css
+    # data: and absolute URLs are left alone
+    assert 'url("data:image/gif;base64,R0lGOD=")' in css
+    assert "url(https://example.com/a.png)" in css
+
+
+@pytest.fixture
+def static_folder(tmp_path):
+    """A small static/ tree: one stylesheet and the logo it uses"""
+    folder = tmp_path / "static"
+    (folder / "css").mkdir(parents=True)
+    (folder / "images").mkdir()
+    (folder / "css" / "home.css").write_text(CSS * 20)
+    if Image is None:
+        (folder / "images" / "shinx.png").write_bytes(b"\x89PNG not really")
+    else:
+        # Wider than DISPLAY_WIDTHS allows for the logo
+        buffer = io.BytesIO()
+        Image.linear_gradient("L").resize((900, 300)).convert("RGB").save(buffer, "PNG")
+        (folder / "images" / "shinx.png").write_bytes(buffer.getvalue())
+    return folder
+
+
+def read_manifest(static_folder):
+    with open(os.path.join(static_folder, DIST, MANIFEST)) as f:
+        return json.load(f)
+
+
+def test_build_writes_hashed_copies_and_a_manifest(static_folder):
+    manifest = build_assets(str(static_folder))
+    assert manifest == read_manifest(static_folder)
+    assert set(manifest) == {"css/home.css", "images/shinx.png"}
+
+    css_entry = manifest["css/home.css"]
+    built_css = (static_folder / DIST / css_entry["file"]).read_bytes()
+    assert css_entry["file"] == fingerprinted("css/home.css", built_css)
+    assert css_entry["size"] == len((static_folder / "css" / "home.css").read_bytes())
+    assert b"/*" not in built_css
+    # The stylesheet refers to the logo's hashed name
+    assert manifest["images/shinx.png"]["file"].split("/")[-1] in built_css.decode()
+    assert gzip.decompress((static_folder / DIST / css_entry["encodings"]["gzip"]).read_bytes()) == built_css
+
+
+@pytest.mark.skipif(Image is None, reason="needs Pillow")
+def test_build_resizes_images_and_keeps_smaller_variants(static_folder):
+    entry = build_assets(str(static_folder))["images/shinx.png"]
+    with Image.open(static_folder / DIST / entry["file"]) as image:
+        assert image.width == 450
+    sizes = [os.path.getsize(static_folder / DIST / file) for file in entry["variants"].values()]
+    assert sizes == sorted(sizes)
+    assert all(size < os.path.getsize(static_folder / DIST / entry["file"]) for size in sizes)
+
+
+def test_rebuild_replaces_the_previous_build(static_folder):
+    old = build_assets(str(static_folder))["css/home.css"]["file"]
+    (static_folder / "css" / "home.css").write_text("a{color:blue}")
+    new = build_assets(str(static_folder))["css/home.css"]["file"]
+    assert new != old
+    assert not (static_folder / DIST / old).exists()
+    # dist/ itself is never built into dist/
+    assert all(not path.startswith(DIST) for path in read_manifest(static_folder))
+
+
+@pytest.fixture
+def built_app(app, static_folder):
+    """The app serving static_folder after a build"""
+    build_assets(str(static_folder))
+    app.static_folder = str(static_folder)
+    app.extensions["assets"] = AssetManifest.load(app.static_folder)
+    return app
+
+
+def test_static_urls_point_at_hashed_copies(built_app):
+    entry = read_manifest(built_app.static_folder)["css/home.css"]
+    with built_app.test_request_context():
+        assert url_for("static", filename="css/home.css") == f"/static/{DIST}/{entry['file']}"
+        # Not built: unchanged
+        assert url_for("static", filename="css/other.css") == "/static/css/other.css"
+    built_app.debug = True
+    with built_app.test_request_context():
+        assert url_for("static", filename="css/home.css") == "/static/css/home.css"
+
+
+def test_hashed_copies_are_immutable_and_precompressed(built_app):
+    entry = read_manifest(built_app.static_folder)["css/home.css"]
+    url = f"/static/{DIST}/{entry['file']}"
+    client = built_app.test_client()
+
+    plain = client.get(url)
+    assert plain.status_code == 200
+    assert plain.mimetype == "text/css"
+    assert plain.content_encoding is None
+    assert plain.cache_control.immutable and plain.cache_control.max_age == IMMUTABLE_MAX_AGE
+    assert "Accept-Encoding" in plain.vary
+
+    compressed = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert compressed.content_encoding == "gzip"
+    assert compressed.mimetype == "text/css"
+    assert gzip.decompress(compressed.data) == plain.data
+
+
+def test_unbuilt_files_are_revalidated(built_app):
+    response = built_app.test_client().get("/static/css/home.css")
+    assert response.status_code == 200
+    assert not response.cache_control.immutable
+
+
+def test_build_command(app, static_folder):
+    app.static_folder = str(static_folder)
+    result = app.test_cli_runner().invoke(args=["assets", "build"])
+    assert result.exit_code == 0, result.output
+    assert "Built 2 files" in result.output
+    assert (static_folder / DIST / MANIFEST).exists()
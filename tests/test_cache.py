@@ -0,0 +1,75 @@
+from datetime import date
+
+import pytest
+
+from app import create_app, init_db
+from config import Config
+from models import db
+
+TODAY = date.today().isoformat()
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The test app with the in-process fragment cache instead of none"""
+    class CachedConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+        BACKGROUND_THREADS = False
+        FRAGMENT_CACHE_BACKEND = "memory"
+
+    app = create_app(CachedConfig)
+    with app.app_context():
+        init_db()
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+# One request through each write route; every one changes today's tab
+WRITES = {
+    "html new": lambda client, ids: client.post("/new-task", data={"title": "C", "due_date": TODAY}),
+    "html edit": lambda client, ids: client.post(f"/edit-task/{ids[0]}", data={"title": "A2", "due_date": TODAY}),
+    "html delete": lambda client, ids: client.post(f"/delete-task/{ids[0]}", data={"tab": "today"}),
+    "html toggle": lambda client, ids: client.post(f"/toggle-complete/{ids[0]}", data={"tab": "today"}),
+    "html reorder": lambda client, ids: client.post(f"/reorder-task/{ids[1]}?direction=up"),
+    "html move": lambda client, ids: client.post(f"/move-task/{ids[0]}", data={"after": ids[1]}),
+    "api create": lambda client, ids: client.post("/api/v1/tasks", json={"title": "C", "due_date": TODAY}),
+    "api update": lambda client, ids: client.patch(f"/api/v1/tasks/{ids[0]}", json={"title": "A2"}),
+    "api toggle": lambda client, ids: client.post(f"/api/v1/tasks/{ids[0]}/toggle"),
+    "api reorder": lambda client, ids: client.post(f"/api/v1/tasks/{ids[1]}/reorder", json={"direction": "up"}),
+    "api delete": lambda client, ids: client.delete(f"/api/v1/tasks/{ids[0]}"),
+    "api bulk": lambda client, ids: client.post("/api/v1/tasks/bulk", json={
+        "operations": [{"op": "update", "id": ids[1], "title": "B2"}]}),
+    "api import": lambda client, ids: client.post("/api/v1/tasks/import?format=csv",
+                                                  data=f"title,due_date\nC,{TODAY}\n", content_type="text/csv"),
+}
+
+
+@pytest.mark.parametrize("write", WRITES.values(), ids=WRITES.keys())
+def test_writes_invalidate_cached_fragments(app, client, user_id, write):
+    ids = [client.post("/api/v1/tasks", json={"title": title, "due_date": TODAY}).get_json()["id"]
+           for title in "AB"]
+    cache = app.extensions["fragment_cache"]
+    key = (user_id, "today", TODAY)
+
+    client.get("/home")
+    before = cache.get(key)
+    assert before is not None
+
+    assert write(client, ids).status_code < 400
+    # Dropped by tasks_changed, not left to expire
+    assert cache.get(key) is None
+
+    stats = cache.stats()
+    client.get("/home")
+    assert cache.stats()["hits"] == stats["hits"]
+    after = cache.get(key)
+    assert after[1] != before[1]
+
+    # What was stored is what a cold render produces
+    cache.invalidate_user(user_id)
+    client.get("/home")
+    assert cache.get(key) == after
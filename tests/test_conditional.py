@@ -0,0 +1,58 @@
+from datetime import date
+
+TODAY = date.today().isoformat()
+
+
+def test_unchanged_home_is_not_modified(client):
+    first = client.get("/home")
+    assert first.status_code == 200
+    assert first.headers["ETag"].startswith('W/"')
+
+    repeat = client.get("/home", headers={"If-None-Match": first.headers["ETag"]})
+    assert repeat.status_code == 304
+    assert repeat.data == b""
+    assert repeat.headers["ETag"] == first.headers["ETag"]
+
+
+def test_unchanged_home_is_not_modified_since(client):
+    first = client.get("/home")
+    repeat = client.get("/home", headers={"If-Modified-Since": first.headers["Last-Modified"]})
+    assert repeat.status_code == 304
+
+
+def test_each_tab_has_its_own_etag(client):
+    etag = client.get("/home?tab=today").headers["ETag"]
+    assert client.get("/home?tab=future", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_write_changes_home(client):
+    first = client.get("/home")
+    assert client.post("/api/v1/tasks", json={"title": "New", "due_date": TODAY}).status_code == 201
+
+    response = client.get("/home", headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != first.headers["ETag"]
+    assert b"New" in response.data
+
+
+def test_pending_flash_is_always_rendered(client):
+    etag = client.get("/home").headers["ETag"]
+    with client.session_transaction() as sess:
+        sess["_flashes"] = [("success", "Shown once")]
+
+    response = client.get("/home", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert b"Shown once" in response.data
+    # Shown, so the next repeat is a 304 again
+    assert client.get("/home", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_unchanged_edit_page_is_not_modified(client):
+    task_id = client.post("/api/v1/tasks", json={"title": "Edit me", "due_date": TODAY}).get_json()["id"]
+    first = client.get(f"/edit-task/{task_id}")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert client.get(f"/edit-task/{task_id}", headers={"If-None-Match": etag}).status_code == 304
+
+    client.patch(f"/api/v1/tasks/{task_id}", json={"title": "Edited"})
+    assert client.get(f"/edit-task/{task_id}", headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,118 @@
+import threading
+import time
+import tracemalloc
+
+import pytest
+from sqlalchemy import insert
+
+from app import create_app, init_db
+from benchmarks.live_subscribers import Readers, bench_config, open_streams
+from models import db, User
+
+# Thousands of idle GET /events streams, spread over USERS users. The
+# heap per stream is measured over the last SAMPLE streams to open, with
+# the others already idle.
+STREAMS = 2000
+USERS = 500
+SAMPLE = 200
+
+# Most Python heap one idle stream may hold, and most of one core the
+# idle streams together may use
+MAX_KIB_PER_STREAM = 64
+MAX_IDLE_CPU = 0.05
+
+
+class IdleStreams:
+    """STREAMS open streams, each read by its own thread, all waiting for events"""
+
+    def __init__(self, app, user_ids):
+        self.app = app
+        self.broker = app.extensions["live_events"]
+        self.user_ids = user_ids
+        self.readers = Readers()
+        self.threads_before = set(threading.enumerate())
+
+        self.threads = open_streams(app, user_ids, STREAMS - SAMPLE, self.readers)
+        self.wait_until_idle(STREAMS - SAMPLE)
+        tracemalloc.start()
+        try:
+            heap_before, _ = tracemalloc.get_traced_memory()
+            self.threads += open_streams(app, user_ids, SAMPLE, self.readers)
+            self.wait_until_idle(STREAMS)
+            heap_after, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.kib_per_stream = (heap_after - heap_before) / 1024 / SAMPLE
+
+    def wait_until_idle(self, streams):
+        # The "retry:" line comes first; then each stream reads its revision and waits
+        assert self.readers.wait_for(streams, 60), f"only {self.readers.received} of {streams} streams started"
+        while self.broker.stats()["streams"] < streams:
+            time.sleep(0.01)
+        time.sleep(0.2)
+
+    def close(self):
+        """Wake every stream still open; its reader closes it"""
+        for user_id in self.user_ids:
+            self.broker.publish(user_id, (10 ** 9, {"type": "changed"}))
+        for thread in self.threads:
+            thread.join(10)
+
+
+@pytest.fixture(scope="module")
+def idle_streams(tmp_path_factory):
+    app = create_app(bench_config(tmp_path_factory.mktemp("live") / "test.db", STREAMS))
+    with app.app_context():
+        init_db()
+        db.session.execute(insert(User), [
+            {"full_name": f"User {i}", "username": f"user{i}", "password_hash": "x"}
+            for i in range(USERS)
+        ])
+        db.session.commit()
+        user_ids = [row[0] for row in db.session.query(User.id).order_by(User.id)]
+
+    streams = IdleStreams(app, user_ids)
+    yield streams
+    streams.close()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def test_idle_stream_memory(idle_streams):
+    assert idle_streams.broker.stats()["streams"] == STREAMS
+    assert idle_streams.kib_per_stream <= MAX_KIB_PER_STREAM
+
+
+def test_idle_streams_start_no_threads(idle_streams):
+    # Only the readers standing in for the server's greenlets are new
+    started = set(threading.enumerate()) - idle_streams.threads_before
+    assert started <= set(idle_streams.threads)
+
+
+def test_idle_streams_hold_no_connections(idle_streams):
+    with idle_streams.app.app_context():
+        for engine in db.engines.values():
+            assert engine.pool.checkedout() == 0
+            assert engine.pool.checkedin() <= engine.pool.size()
+
+
+def test_idle_streams_use_no_cpu(idle_streams):
+    cpu_before = time.process_time()
+    time.sleep(1)
+    assert time.process_time() - cpu_before <= MAX_IDLE_CPU
+
+
+def test_streams_over_the_limit_are_refused(idle_streams):
+    client = idle_streams.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = idle_streams.user_ids[0]
+    assert client.get("/events").status_code == 503
+
+
+def test_event_reaches_every_stream(idle_streams):
+    received = idle_streams.readers.received
+    idle_streams.close()
+    assert idle_streams.readers.wait_for(received + STREAMS, 10)
+    # Each reader closed its stream after the event, which unsubscribed it
+    assert idle_streams.broker.stats()["streams"] == 0
@@ -0,0 +1,107 @@
+import html
+import re
+from datetime import date, timedelta
+
+import pytest
+
+PAGE_SIZE = 3
+LOAD_MORE = re.compile(r'<a href="([^"]+)" class="load-more">')
+TASK_ID = re.compile(r'data-task-id="(\d+)"')
+
+
+@pytest.fixture
+def paged(app, client):
+    """Seven future and seven completed past tasks, three to a page"""
+    app.config["TASKS_PAGE_SIZE"] = PAGE_SIZE
+    today = date.today()
+    ids = {"future": [], "past": []}
+    for days in (3, 1, 2, 5, 4, 1, 6):
+        for tab, sign in (("future", 1), ("past", -1)):
+            due = (today + timedelta(days=sign * days)).isoformat()
+            task_id = client.post("/api/v1/tasks", json={"title": f"{tab} {days}", "due_date": due}).get_json()["id"]
+            if tab == "past":
+                client.post(f"/api/v1/tasks/{task_id}/toggle")
+            ids[tab].append(task_id)
+    return ids
+
+
+def load_more_link(page):
+    match = LOAD_MORE.search(page)
+    return html.unescape(match.group(1)) if match else None
+
+
+def follow_html(client, tab, section):
+    """Task ids of a section's first page and every page its load-more links lead to"""
+    page = client.get(f"/home?tab={tab}").get_data(as_text=True)
+    # Only the paged section's cards and link
+    page = page.split(f'<section class="{section}">', 1)[1]
+    ids = [int(task_id) for task_id in TASK_ID.findall(page)]
+    link = load_more_link(page)
+    pages = 1
+    while link:
+        response = client.get(link)
+        assert response.status_code == 200
+        fragment = response.get_data(as_text=True)
+        found = [int(task_id) for task_id in TASK_ID.findall(fragment)]
+        assert 0 < len(found) <= PAGE_SIZE
+        ids += found
+        link = load_more_link(fragment)
+        pages += 1
+    return ids, pages
+
+
+def follow_json(client, tab, section):
+    first = client.get(f"/api/v1/tasks?tab={tab}").get_json()
+    ids = [task["id"] for task in first[section]]
+    cursor = first["next_cursors"][section]
+    while cursor:
+        page = client.get("/home/more", query_string={"tab": tab, "section": section, "after": cursor,
+                                                      "format": "json"}).get_json()
+        ids += [task["id"] for task in page["tasks"]]
+        cursor = page["next_cursor"]
+    return ids
+
+
+@pytest.mark.parametrize("tab, section", [("future", "ongoing"), ("past", "complete")])
+def test_load_more_pages_through_a_section(client, paged, tab, section):
+    ids, pages = follow_html(client, tab, section)
+    # Every task exactly once, over ceil(7 / 3) pages
+    assert sorted(ids) == sorted(paged[tab])
+    assert pages == 3
+    assert follow_json(client, tab, section) == ids
+
+
+def test_sections_are_in_due_date_order(client, paged):
+    due = {}
+    for tab in ("future", "past"):
+        for task_id in paged[tab]:
+            due[task_id] = client.get(f"/api/v1/tasks/{task_id}").get_json()["due_date"]
+    future, _ = follow_html(client, "future", "ongoing")
+    past, _ = follow_html(client, "past", "complete")
+    assert [due[task_id] for task_id in future] == sorted(due[task_id] for task_id in future)
+    assert [due[task_id] for task_id in past] == sorted((due[task_id] for task_id in past), reverse=True)
+
+
+def test_task_created_mid_paging_does_not_shift_the_next_page(client, paged):
+    page = client.get("/home?tab=future").get_data(as_text=True)
+    seen = {int(task_id) for task_id in TASK_ID.findall(page)}
+    link = load_more_link(page)
+
+    # Sorts before the cursor: with offsets, the next page would repeat a task
+    client.post("/api/v1/tasks", json={"title": "Early", "due_date": (date.today() + timedelta(days=1)).isoformat()})
+    following = {int(task_id) for task_id in TASK_ID.findall(client.get(link).get_data(as_text=True))}
+    assert len(following) == PAGE_SIZE
+    assert not seen & following
+
+
+@pytest.mark.parametrize("query", [
+    {"tab": "today", "section": "ongoing", "after": "x"},
+    {"tab": "past", "section": "ongoing", "after": "x"},
+    {"tab": "future", "section": "ongoing", "after": "not-a-cursor"},
+])
+def test_load_more_rejects_bad_requests(client, query):
+    assert client.get("/home/more", query_string=query).status_code == 400
+
+
+def test_load_more_needs_login(app):
+    assert app.test_client().get("/home/more?tab=past&section=complete&after=x").status_code == 401
@@ -0,0 +1,15 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from models import db
+
+
+def test_failed_statement_does_not_leave_a_start_time(app):
+    with app.app_context(), db.engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+        assert conn.info["query_started"] == []
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+        assert conn.info["query_started"] == []
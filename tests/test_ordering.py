@@ -0,0 +1,89 @@
+from datetime import date, timedelta
+
+import pytest
+
+from models import db, Task
+from queries import PRIORITY_GAP
+
+TODAY = date.today().isoformat()
+
+
+@pytest.fixture
+def tasks(client):
+    """Ids of tasks A, B, C and D, due today, in that order"""
+    ids = {}
+    for title in "ABCD":
+        response = client.post("/api/v1/tasks", json={"title": title, "due_date": TODAY})
+        ids[title] = response.get_json()["id"]
+    return ids
+
+
+def order(client):
+    return "".join(task["title"] for task in client.get("/api/v1/tasks?tab=today").get_json()["ongoing"])
+
+
+def reorder(client, task_id, **body):
+    return client.post(f"/api/v1/tasks/{task_id}/reorder", json=body)
+
+
+def test_move_up_and_down(client, tasks):
+    assert order(client) == "ABCD"
+    assert reorder(client, tasks["C"], direction="up").status_code == 200
+    assert order(client) == "ACBD"
+    assert reorder(client, tasks["A"], direction="down").status_code == 200
+    assert order(client) == "CABD"
+
+
+def test_moves_past_the_ends_change_nothing(client, tasks):
+    reorder(client, tasks["A"], direction="up")
+    reorder(client, tasks["D"], direction="down")
+    assert order(client) == "ABCD"
+
+
+def test_move_after(client, tasks):
+    reorder(client, tasks["A"], after=tasks["C"])
+    assert order(client) == "BCAD"
+    reorder(client, tasks["D"], after=None)
+    assert order(client) == "DBCA"
+    reorder(client, tasks["B"], after=tasks["A"])
+    assert order(client) == "DCAB"
+
+
+def test_html_move_after(client, tasks):
+    response = client.post(f"/move-task/{tasks['D']}", data={"after": tasks["A"], "tab": "today"})
+    assert response.status_code == 302
+    assert order(client) == "ADBC"
+
+
+def test_move_rebalances_a_full_gap(app, client, tasks):
+    # A and B on adjacent priorities: no integer fits between them
+    with app.app_context():
+        for title, priority in zip("ABCD", (1, 2, 3, 4)):
+            db.session.query(Task).filter_by(id=tasks[title]).update({"priority": priority})
+        db.session.commit()
+
+    assert reorder(client, tasks["D"], after=tasks["A"]).status_code == 200
+    assert order(client) == "ADBC"
+    with app.app_context():
+        priorities = sorted(task.priority for task in Task.query.filter(Task.id.in_(tasks.values())))
+    # Respaced to the gap, with D placed between A and B
+    assert priorities == [PRIORITY_GAP, PRIORITY_GAP * 3 // 2, PRIORITY_GAP * 2, PRIORITY_GAP * 3]
+
+
+def test_move_across_sections_is_refused(client, tasks):
+    tomorrow = (date.today() + timedelta(days=1)).isoformat()
+    other_day = client.post("/api/v1/tasks", json={"title": "E", "due_date": tomorrow}).get_json()["id"]
+    response = reorder(client, tasks["A"], after=other_day)
+    assert response.status_code == 400
+
+    client.post(f"/api/v1/tasks/{tasks['B']}/toggle")
+    assert reorder(client, tasks["A"], after=tasks["B"]).status_code == 400
+    assert order(client) == "ACD"
+
+
+def test_html_move_across_sections_is_refused(client, tasks):
+    tomorrow = (date.today() + timedelta(days=1)).isoformat()
+    other_day = client.post("/api/v1/tasks", json={"title": "E", "due_date": tomorrow}).get_json()["id"]
+    response = client.post(f"/move-task/{tasks['A']}", data={"after": other_day}, follow_redirects=True)
+    assert b"only be moved within the same day and section" in response.data
+    assert order(client) == "ABCD"
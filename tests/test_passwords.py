@@ -0,0 +1,146 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from models import db, User
+from passwords import PasswordHasher, PasswordHasherBusy, init_password_hasher
+from shards import add_user
+
+
+@contextmanager
+def running(hasher, jobs):
+    """jobs calls through hasher, each holding a worker until the block ends"""
+    release = threading.Event()
+    started = []
+    errors = []
+
+    def job():
+        started.append(threading.current_thread())
+        release.wait(10)
+
+    def call():
+        try:
+            hasher._run(job)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(jobs)]
+    for thread in threads:
+        thread.start()
+    try:
+        yield started, errors
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join(10)
+
+
+def wait_until(condition):
+    while not condition():
+        time.sleep(0.01)
+
+
+def test_hash_and_verify():
+    hasher = PasswordHasher("pbkdf2:sha256:1000")
+    try:
+        password_hash = hasher.hash("secret123")
+        assert password_hash.startswith("pbkdf2:sha256:1000$")
+        assert hasher.verify(password_hash, "secret123")
+        assert not hasher.verify(password_hash, "wrong")
+        assert not hasher.needs_rehash(password_hash)
+        assert hasher.needs_rehash(generate_password_hash("secret123", "pbkdf2:sha256:500"))
+    finally:
+        hasher.shutdown()
+
+
+def test_at_most_workers_hash_at_once():
+    hasher = PasswordHasher("pbkdf2:sha256:1000", workers=2, max_pending=0)
+    try:
+        with running(hasher, 2) as (started, errors):
+            wait_until(lambda: len(started) == 2)
+            with pytest.raises(PasswordHasherBusy):
+                hasher.hash("secret123")
+        assert not errors
+        # Slots are handed back once the jobs finish
+        assert hasher.verify(hasher.hash("secret123"), "secret123")
+    finally:
+        hasher.shutdown()
+
+
+def test_pending_hashes_wait_for_a_worker():
+    hasher = PasswordHasher("pbkdf2:sha256:1000", workers=1, max_pending=1)
+    try:
+        with running(hasher, 1) as (started, _):
+            wait_until(lambda: len(started) == 1)
+            result = []
+            waiting = threading.Thread(target=lambda: result.append(hasher.hash("secret123")))
+            waiting.start()
+            waiting.join(0.2)
+            assert waiting.is_alive() and not result
+        waiting.join(10)
+        assert hasher.verify(result[0], "secret123")
+    finally:
+        hasher.shutdown()
+
+
+@pytest.fixture
+def alice(app):
+    """A user whose password was hashed with an older, cheaper cost"""
+    with app.app_context():
+        user = add_user("Alice", "alice", generate_password_hash("secret123", "pbkdf2:sha256:500"))
+        db.session.commit()
+        return user.id
+
+
+def login(app):
+    return app.test_client().post("/login", data={"username": "alice", "password": "secret123"})
+
+
+def stored_hash(app, user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).password_hash
+
+
+def test_login_rehashes_with_the_configured_cost(app, alice):
+    assert login(app).status_code == 302
+    upgraded = stored_hash(app, alice)
+    assert upgraded.startswith("pbkdf2:sha256:1000$")
+
+    # Already current: logging in again leaves it alone
+    assert login(app).status_code == 302
+    assert stored_hash(app, alice) == upgraded
+
+
+def test_wrong_password_is_not_rehashed(app, alice):
+    before = stored_hash(app, alice)
+    response = app.test_client().post("/login", data={"username": "alice", "password": "wrong"})
+    assert response.status_code == 200
+    assert stored_hash(app, alice) == before
+
+
+@pytest.fixture
+def busy_hasher(app):
+    """The app's hasher with room for one hash, and that one in use"""
+    app.extensions["password_hasher"].shutdown()
+    app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_PENDING=0)
+    hasher = init_password_hasher(app)
+    with running(hasher, 1) as (started, _):
+        wait_until(lambda: started)
+        yield hasher
+    hasher.shutdown()
+
+
+def test_login_while_busy_is_503(app, alice, busy_hasher):
+    response = login(app)
+    assert response.status_code == 503
+    assert b"Too many sign-ins" in response.data
+
+
+def test_register_while_busy_is_503(app, busy_hasher):
+    response = app.test_client().post("/register", data={"name": "Bob", "username": "bob", "password": "secret123"})
+    assert response.status_code == 503
+    with app.app_context():
+        assert db.session.query(User).filter_by(username="bob").count() == 0
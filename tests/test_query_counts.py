@@ -0,0 +1,59 @@
+"""Every route stays within its SQL statement budget, however many tasks the user has"""
+from datetime import date
+
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+
+from benchmarks.query_counts import ROUTES, fill, seed
+from models import db, User
+
+SMALL, LARGE = 20, 500
+
+
+def statements(app, count_queries, user_id, ids, method, path, kwargs):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+        sess["username"] = ids["username"]
+    client.get("/home")  # warm the profile cache and create today's repeating task
+    with client.session_transaction() as sess:
+        sess.pop("_flashes", None)
+
+    with count_queries() as queries:
+        response = client.open(fill(path, ids), method=method, **fill(kwargs, ids))
+        response.get_data()
+    assert response.status_code < 500
+    return len(queries)
+
+
+@pytest.mark.parametrize("name", list(ROUTES))
+def test_route_statement_budget(app, count_queries, name):
+    method, path, kwargs, budget = ROUTES[name]
+    with app.app_context():
+        small = seed(date.today(), SMALL)
+        large = seed(date.today(), LARGE)
+        db.session.remove()
+
+    small_count = statements(app, count_queries, *small, method, path, kwargs)
+    large_count = statements(app, count_queries, *large, method, path, kwargs)
+    assert large_count <= budget, f"{name}: {large_count} statements, budget {budget}"
+    assert large_count <= small_count, f"{name}: {small_count} statements with {SMALL} tasks, {large_count} with {LARGE}"
+
+
+def test_lazy_loads_raise_in_tests(app, user_id):
+    with app.app_context():
+        user = User.query.filter_by(id=user_id).one()
+        with pytest.raises(InvalidRequestError):
+            user.tasks
+
+
+def test_home_reads_only_the_revision_from_users(client, count_queries):
+    etag = client.get("/home").headers["ETag"]
+    # A repeat view (304) and a full render, with the profile cached at the first view
+    for headers, status in (({"If-None-Match": etag}, 304), ({}, 200)):
+        with count_queries() as queries:
+            assert client.get("/home", headers=headers).status_code == status
+        user_reads = [statement for statement in queries.statements if statement.startswith("SELECT users.")]
+        assert len(user_reads) == 1
+        assert "users.task_revision" in user_reads[0]
+        assert "users.full_name" not in user_reads[0]
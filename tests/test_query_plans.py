@@ -0,0 +1,28 @@
+"""Every hot query must be answered from an index, never a full table scan"""
+from datetime import date
+
+import pytest
+
+from benchmarks.query_plans import FULL_SCAN, create_check_app, explain, hot_queries, seed
+from models import db
+
+TODAY = date.today()
+with create_check_app().app_context():
+    QUERY_NAMES = list(hot_queries(1, TODAY))
+
+
+@pytest.fixture(scope="module")
+def seeded_user():
+    """An app context on a seeded, ANALYZEd in-memory database; yields a user id"""
+    app = create_check_app()
+    with app.app_context():
+        db.create_all()
+        yield seed(50, 200, TODAY)
+        db.session.remove()
+
+
+@pytest.mark.parametrize("name", QUERY_NAMES)
+def test_query_uses_an_index(seeded_user, name):
+    plan = explain(hot_queries(seeded_user, TODAY)[name])
+    scans = [line for line in plan if FULL_SCAN.search(line)]
+    assert not scans, f"{name} falls back to a full scan:\n" + "\n".join(plan)
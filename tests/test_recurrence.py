@@ -0,0 +1,72 @@
+"""Moved or deleted occurrences of a repeating task stay gone"""
+from datetime import date, timedelta
+
+import pytest
+
+from models import db, Task, RecurrenceRule
+from recurrence import materialize_due
+
+TODAY = date.today()
+WEEK = timedelta(days=7)
+
+
+@pytest.fixture
+def rule_id(app, client):
+    response = client.post("/new-task", data={"title": "Weekly review", "description": "",
+                                              "due_date": TODAY.isoformat(), "repeat": "weekly"})
+    assert response.status_code == 302
+    with app.app_context():
+        return db.session.query(RecurrenceRule.id).scalar()
+
+
+def materialize(client, rule_id, day):
+    """The task id for rule_id's occurrence on day, created through the edit route"""
+    response = client.post(f"/occurrences/{rule_id}/{day.isoformat()}/edit")
+    assert response.status_code == 302
+    return int(response.headers["Location"].rstrip("/").rsplit("/", 1)[1])
+
+
+def upcoming_days(client, rule_id):
+    tasks = client.get("/api/v1/tasks?tab=future").get_json()["ongoing"]
+    return {date.fromisoformat(task["due_date"]) for task in tasks
+            if task["recurrence_id"] == rule_id and task["id"] is None}
+
+
+def client_user(client):
+    with client.session_transaction() as sess:
+        return sess["user_id"]
+
+
+def occurrence_rows(app, rule_id, day):
+    with app.app_context():
+        return db.session.query(Task).filter_by(recurrence_id=rule_id, due_date=day).count()
+
+
+def test_moved_occurrence_leaves_its_day_empty(app, client, rule_id):
+    day = TODAY + WEEK
+    task_id = materialize(client, rule_id, day)
+    response = client.patch(f"/api/v1/tasks/{task_id}",
+                            json={"due_date": (day + timedelta(days=1)).isoformat()})
+    assert response.status_code == 200
+
+    assert day not in upcoming_days(client, rule_id)
+    assert day + WEEK in upcoming_days(client, rule_id)
+    with app.app_context():
+        assert materialize_due(client_user(client), day)
+    assert occurrence_rows(app, rule_id, day) == 0
+    assert client.post(f"/occurrences/{rule_id}/{day.isoformat()}/complete").status_code == 404
+
+
+@pytest.mark.parametrize("path", ["/delete-task/{id}", "/api/v1/tasks/{id}"])
+def test_deleted_occurrence_does_not_come_back(app, client, rule_id, path):
+    day = TODAY + 2 * WEEK
+    task_id = materialize(client, rule_id, day)
+    if path.startswith("/api"):
+        assert client.delete(path.format(id=task_id)).status_code == 204
+    else:
+        assert client.post(path.format(id=task_id)).status_code == 302
+
+    assert day not in upcoming_days(client, rule_id)
+    with app.app_context():
+        assert materialize_due(client_user(client), day)
+    assert occurrence_rows(app, rule_id, day) == 0
@@ -0,0 +1,98 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from models import db
+from search import match_expression
+from shards import add_user
+
+TODAY = date.today().isoformat()
+
+
+def create(client, title, description=""):
+    response = client.post("/api/v1/tasks", json={"title": title, "description": description, "due_date": TODAY})
+    return response.get_json()["id"]
+
+
+def search(client, query):
+    return [task["id"] for task in client.get(f"/api/v1/search?q={query}").get_json()["tasks"]]
+
+
+def indexed(app, user_id, query):
+    """Row ids the FTS table itself matches, before search_tasks() rechecks the owner"""
+    with app.app_context():
+        return db.session.execute(text("SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH :match"),
+                                  {"match": match_expression(user_id, query)}).scalars().all()
+
+
+def assert_index_in_sync(app):
+    with app.app_context():
+        # With rank 1, FTS5 also checks the index against tasks_fts_source
+        db.session.execute(text("INSERT INTO tasks_fts (tasks_fts, rank) VALUES ('integrity-check', 1)"))
+        db.session.rollback()
+
+
+def test_index_follows_inserts_updates_and_deletes(app, client, user_id):
+    task_id = create(client, "Buy groceries", "milk and eggs")
+    assert search(client, "groceries") == [task_id]
+    assert search(client, "eggs") == [task_id]
+
+    client.patch(f"/api/v1/tasks/{task_id}", json={"title": "Buy bread", "description": ""})
+    assert indexed(app, user_id, "groceries") == []
+    assert indexed(app, user_id, "eggs") == []
+    assert search(client, "bread") == [task_id]
+    assert_index_in_sync(app)
+
+    client.delete(f"/api/v1/tasks/{task_id}")
+    assert indexed(app, user_id, "bread") == []
+    assert_index_in_sync(app)
+
+
+def test_bulk_import_is_indexed_and_trigger_restored(app, client):
+    response = client.post("/api/v1/tasks/import?format=csv", content_type="text/csv",
+                           data=f"title,due_date\nImported alpha,{TODAY}\nImported beta,{TODAY}\n")
+    assert response.status_code == 201
+    assert len(search(client, "imported")) == 2
+
+    # Rows inserted one at a time after the import still reach the index
+    task_id = create(client, "Gamma afterwards")
+    assert search(client, "gamma") == [task_id]
+    assert_index_in_sync(app)
+
+
+def test_prefix_search_is_opt_in(client):
+    task_id = create(client, "Dentist appointment")
+    assert search(client, "dent") == []
+    assert search(client, "dent*") == [task_id]
+
+
+@pytest.fixture
+def other_client(app):
+    with app.app_context():
+        user = add_user("Other User", "other", "x")
+        db.session.commit()
+        other_id = user.id
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = other_id
+        sess["username"] = "other"
+    return client, other_id
+
+
+def test_results_are_scoped_to_the_user(app, client, user_id, other_client):
+    other, other_id = other_client
+    mine = create(client, "Shared word report")
+    theirs = create(other, "Shared word report")
+
+    assert search(client, "report") == [mine]
+    assert search(other, "report") == [theirs]
+    # The owner token scopes the match itself, not just the final lookup
+    assert indexed(app, user_id, "report") == [mine]
+    assert indexed(app, other_id, "report") == [theirs]
+
+
+def test_search_syntax_is_not_passed_through(client):
+    create(client, "Plain task")
+    for query in ('"', "owner:u1", "NEAR(a b)", "*", "-plain"):
+        assert client.get("/api/v1/search", query_string={"q": query}).status_code == 200
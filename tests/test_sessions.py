@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+from models import db, ServerSession
+from sessions import revoke_user_sessions, session_key
+
+
+@pytest.fixture
+def browser(app):
+    """A client registered as alice (password secret123), then logged out"""
+    client = app.test_client()
+    client.post("/register", data={"name": "Alice", "username": "alice", "password": "secret123"})
+    client.post("/logout")
+    return client
+
+
+def login(client):
+    return client.post("/login", data={"username": "alice", "password": "secret123"})
+
+
+def sid(client):
+    cookie = client.get_cookie("session")
+    return cookie.value if cookie else None
+
+
+def stored(app, sid):
+    with app.app_context():
+        return db.session.get(ServerSession, session_key(sid))
+
+
+def test_cookie_holds_only_a_key_to_the_stored_session(app, browser):
+    login(browser)
+    row = stored(app, sid(browser))
+    assert row is not None and row.user_id is not None
+    assert "alice" not in sid(browser)
+
+
+def test_login_issues_a_new_id(app, browser):
+    with browser.session_transaction() as sess:
+        sess["seen"] = True
+    before = sid(browser)
+    assert stored(app, before) is not None
+
+    assert login(browser).status_code == 302
+    assert sid(browser) != before
+    assert stored(app, before) is None
+
+    # The id from before login does not log anyone in
+    browser.set_cookie("session", before)
+    assert browser.get("/home").status_code == 302
+
+
+def test_logout_deletes_the_session(app, browser):
+    login(browser)
+    logged_in = sid(browser)
+    assert browser.post("/logout").status_code == 302
+    assert stored(app, logged_in) is None
+    with app.app_context():
+        assert db.session.query(ServerSession).filter(ServerSession.user_id.is_not(None)).count() == 0
+
+
+def test_revoked_sessions_are_logged_out(app, browser):
+    login(browser)
+    other = app.test_client()
+    login(other)
+    assert browser.get("/home").status_code == 200
+
+    revoked = [sid(browser), sid(other)]
+    with app.app_context():
+        assert revoke_user_sessions(stored(app, revoked[0]).user_id) == 2
+    for client, old in zip((browser, other), revoked):
+        response = client.get("/home")
+        assert response.status_code == 302
+        assert "/login" in response.location
+        # The flashed message starts a new, anonymous session
+        assert sid(client) != old
+        assert stored(app, sid(client)).user_id is None
+
+
+def test_expired_sessions_are_logged_out(app, browser):
+    login(browser)
+    with app.app_context():
+        db.session.query(ServerSession).update({"expires_at": int(time.time()) - 1})
+        db.session.commit()
+    assert browser.get("/home").status_code == 302
+
+
+def test_sweep_deletes_only_expired_sessions(app):
+    now = int(time.time())
+    with app.app_context():
+        db.session.add_all([ServerSession(key=f"expired{i}", data="{}", expires_at=now - 1) for i in range(5)])
+        db.session.add(ServerSession(key="live", data="{}", expires_at=now + 60))
+        db.session.commit()
+
+        # Several batches, then a partial one
+        assert app.extensions["session_store"].sweep(now, batch_size=2) == 5
+        assert [row.key for row in db.session.query(ServerSession)] == ["live"]
+
+
+def test_sweep_command(app):
+    with app.app_context():
+        db.session.add(ServerSession(key="expired", data="{}", expires_at=int(time.time()) - 1))
+        db.session.commit()
+    result = app.test_cli_runner().invoke(args=["sessions", "sweep"])
+    assert "Deleted 1 expired sessions" in result.output
+    with app.app_context():
+        assert db.session.query(ServerSession).count() == 0
@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import event
+
+from app import create_app, init_db
+from config import Config
+from models import db, DirectoryEntry
+from shards import add_user, find_user, find_user_id, username_taken
+
+
+@pytest.fixture
+def sharded_app(tmp_path):
+    """The full app with users spread over two shard files"""
+    class ShardedConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'directory.db'}"
+        DB_SHARDS = 2
+        DB_SHARD_URL = f"sqlite:///{tmp_path / 'shard{shard}.db'}"
+        PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+        BACKGROUND_THREADS = False
+        FRAGMENT_CACHE_BACKEND = "null"
+
+    app = create_app(ShardedConfig)
+    with app.app_context():
+        init_db()
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def register(app, username):
+    return app.test_client().post("/register", data={
+        "name": username.title(), "username": username, "password": "secret123"})
+
+
+def test_failed_shard_write_leaves_username_free(sharded_app):
+    def fail(connection):
+        raise RuntimeError("shard commit failed")
+
+    with sharded_app.app_context():
+        shard_engines = [db.engines[name] for name in ("shard0", "shard1")]
+    for engine in shard_engines:
+        event.listen(engine, "commit", fail)
+    try:
+        # The directory row is committed, then the user's row on the shard fails
+        assert register(sharded_app, "alice").status_code == 200
+    finally:
+        for engine in shard_engines:
+            event.remove(engine, "commit", fail)
+
+    with sharded_app.app_context():
+        stale_id = db.session.query(DirectoryEntry.id).filter_by(username="alice").scalar()
+        assert stale_id is not None
+        assert not username_taken("alice")
+        assert find_user_id("alice") is None
+
+    assert register(sharded_app, "alice").status_code == 302
+    with sharded_app.app_context():
+        assert username_taken("alice")
+        assert find_user("alice").id == stale_id
+        assert db.session.query(DirectoryEntry).filter_by(username="alice").count() == 1
+
+
+def test_username_of_existing_user_is_taken(sharded_app):
+    with sharded_app.app_context():
+        user_id = add_user("Bob", "bob", "x").id
+        db.session.commit()
+        assert username_taken("bob")
+        assert find_user_id("bob") == user_id
@@ -0,0 +1,63 @@
+from datetime import date
+
+import pytest
+
+from models import db
+from shards import add_user
+
+TODAY = date.today().isoformat()
+
+
+def import_(client, body, fmt="csv"):
+    return client.post(f"/api/v1/tasks/import?format={fmt}", data=body,
+                       content_type="text/csv" if fmt == "csv" else "application/x-ndjson")
+
+
+@pytest.fixture
+def other_client(app):
+    """A second user's client, to import into an empty account"""
+    with app.app_context():
+        user = add_user("Other User", "other", "x")
+        db.session.commit()
+        other_id = user.id
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = other_id
+        sess["username"] = "other"
+    return client
+
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson"])
+def test_export_imports_back_unchanged(client, other_client, fmt):
+    for fields in ({"title": "Plain", "due_date": TODAY},
+                   {"title": 'Comma, "quote"', "description": "two\nlines", "due_date": TODAY}):
+        assert client.post("/api/v1/tasks", json=fields).status_code == 201
+    task_id = client.post("/api/v1/tasks", json={"title": "Done", "due_date": TODAY}).get_json()["id"]
+    assert client.post(f"/api/v1/tasks/{task_id}/toggle").status_code == 200
+
+    exported = client.get(f"/api/v1/tasks/export?format={fmt}")
+    assert exported.status_code == 200
+    response = import_(other_client, exported.data, fmt)
+    assert response.status_code == 201
+    assert response.get_json()["imported"] == 3
+    assert other_client.get(f"/api/v1/tasks/export?format={fmt}").data == exported.data
+
+
+def test_import_rejects_a_bad_date_with_its_line(client):
+    response = import_(client, f"title,due_date\nGood,{TODAY}\nBad,31/12/2030\n".encode())
+    assert response.status_code == 400
+    assert response.get_json()["error"].startswith("Line 3:")
+    # Nothing from the upload is kept
+    assert client.get("/api/v1/tasks/export?format=ndjson").data == b""
+
+
+def test_import_rejects_non_utf8(client):
+    response = import_(client, f"title,due_date\nCaf\xe9,{TODAY}\n".encode("latin-1"))
+    assert response.status_code == 400
+    assert "UTF-8" in response.get_json()["error"]
+
+
+def test_import_reports_csv_errors_as_bad_requests(client):
+    response = import_(client, f"title,due_date\n{'x' * 131073},{TODAY}\n".encode())
+    assert response.status_code == 400
+    assert response.get_json()["error"].startswith("Line 2:")
@@ -0,0 +1,283 @@
+import csv
+import json
+import sys
+from datetime import date, datetime, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func, insert, select
+
+from models import db, Task, ArchivedTask
+from queries import PRIORITY_GAP
+from services import ValidationError, parse_task_fields, commit_task_changes
+from search import bulk_indexing
+from shards import find_user_id
+
+
+# ==================== EXPORT ====================
+# A user's tasks are streamed from a single query in index order (user,
+# due_date, completed, priority), so there is no sort and at most
+# CHUNK_ROWS rows are held at a time; their archived tasks follow from a
+# second one. Ids and priorities are not exported: the order of the lines
+# is the order of the tasks.
+
+EXPORT_FIELDS = ["title", "description", "due_date", "completed", "completed_at", "created_at"]
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+CHUNK_ROWS = 1000
+
+
+class _Line:
+    """File-like object whose write() hands the CSV line straight back"""
+
+    def write(self, line):
+        return line
+
+
+def _plain(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return _plain(value)
+
+
+def export_rows(user_id):
+    """user_id's tasks as tuples of EXPORT_FIELDS, in list order, then their archived tasks"""
+    for entity in (Task, ArchivedTask):
+        columns = [entity.__table__.c[name] for name in EXPORT_FIELDS]
+        yield from db.session.execute(
+            select(*columns)
+            .where(entity.user_id == user_id)
+            .order_by(entity.due_date, entity.completed, entity.priority, entity.id),
+            execution_options={"yield_per": CHUNK_ROWS},
+        )
+
+
+def _chunks(lines):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == CHUNK_ROWS:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+def export_csv(user_id):
+    """CSV export with a header row, yielded in chunks"""
+    writer = csv.writer(_Line())
+
+    def lines():
+        yield writer.writerow(EXPORT_FIELDS)
+        for row in export_rows(user_id):
+            yield writer.writerow([_csv_value(value) for value in row])
+
+    return _chunks(lines())
+
+
+def export_ndjson(user_id):
+    """One JSON object per line, yielded in chunks"""
+    return _chunks(json.dumps(dict(zip(EXPORT_FIELDS, map(_plain, row)))) + "\n"
+                   for row in export_rows(user_id))
+
+
+def exporter(fmt):
+    return export_csv if fmt == "csv" else export_ndjson
+
+
+# ==================== IMPORT ====================
+# Uploads are parsed one line at a time. Each row is validated like a
+# form post, and rows go to the database in IMPORT_BATCH_SIZE executemany
+# batches inside one transaction, so a bad line anywhere imports nothing.
+# Imported tasks are appended to their day's list in file order, with
+# priorities counted on from one max(priority) lookup per (day, state),
+# and are added to the search index in one go at the end.
+
+def format_for(name):
+    """"csv"/"ndjson" from a format name, file name or MIME type; None if unknown"""
+    name = (name or "").lower()
+    if name in ("csv", "text/csv") or name.endswith(".csv"):
+        return "csv"
+    if name in ("ndjson", "jsonl", "application/x-ndjson", "application/jsonl") \
+            or name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return None
+
+
+def read_csv(stream):
+    """(line number, row dict) pairs from a CSV text stream with a header"""
+    reader = csv.DictReader(stream)
+    try:
+        if not reader.fieldnames or not {"title", "due_date"} <= set(reader.fieldnames):
+            raise ValidationError("CSV needs a header row with at least title and due_date")
+        for row in reader:
+            yield reader.line_num, row
+    except csv.Error as e:
+        # e.g. a field over csv.field_size_limit(); line_num counts only the lines already read
+        raise ValidationError(f"Line {reader.line_num + 1}: {e}")
+
+
+def read_ndjson(stream):
+    """(line number, object) pairs from a text stream of JSON lines"""
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise ValidationError(f"Line {number}: invalid JSON")
+        if not isinstance(row, dict):
+            raise ValidationError(f"Line {number}: expected a JSON object")
+        yield number, row
+
+
+def reader(fmt):
+    return read_csv if fmt == "csv" else read_ndjson
+
+
+def _flag(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value or "").strip().lower()
+    if text in ("true", "1", "yes"):
+        return True
+    if text in ("false", "0", "no", ""):
+        return False
+    raise ValidationError("completed must be true or false")
+
+
+def _timestamp(value):
+    if value in (None, ""):
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValidationError("Invalid timestamp")
+
+
+def _iso_date(value):
+    """date for a canonical YYYY-MM-DD string (what exports contain), else value unchanged
+
+    date.fromisoformat() is far cheaper than the strptime() in
+    parse_task_fields(), which still validates anything else.
+    """
+    if isinstance(value, str) and len(value) == 10:
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            pass
+    return value
+
+
+def task_values(row):
+    """Validated column values for one imported row"""
+    for name in ("title", "description", "due_date", "completed_at", "created_at"):
+        if not isinstance(row.get(name), (str, type(None))):
+            raise ValidationError(f"{name} must be a string")
+    values = parse_task_fields(row.get("title"), row.get("description"), _iso_date(row.get("due_date")))
+    values["completed"] = _flag(row.get("completed"))
+    values["completed_at"] = _timestamp(row.get("completed_at")) if values["completed"] else None
+    values["created_at"] = (_timestamp(row.get("created_at"))
+                            or datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0))
+    return values
+
+
+def import_tasks(user_id, rows, batch_size):
+    """Insert (line number, row) pairs as user_id's tasks; returns how many
+
+    Nothing is committed: finish with services.commit_task_changes().
+    """
+    last_priority = {
+        (day, completed): top
+        for day, completed, top in db.session.execute(
+            select(Task.due_date, Task.completed, func.max(Task.priority))
+            .where(Task.user_id == user_id)
+            .group_by(Task.due_date, Task.completed)
+        )
+    }
+
+    statement = insert(Task.__table__)
+    batch = []
+    count = 0
+    with bulk_indexing(db.session.connection()):
+        for line, row in rows:
+            try:
+                values = task_values(row)
+            except ValidationError as e:
+                raise ValidationError(f"Line {line}: {e}")
+
+            key = (values["due_date"], values["completed"])
+            last_priority[key] = last_priority.get(key, 0) + PRIORITY_GAP
+            values["user_id"] = user_id
+            values["priority"] = last_priority[key]
+            batch.append(values)
+
+            if len(batch) >= batch_size:
+                db.session.execute(statement, batch)
+                count += len(batch)
+                batch = []
+
+        if batch:
+            db.session.execute(statement, batch)
+            count += len(batch)
+    return count
+
+
+# ==================== CLI ====================
+# flask tasks export <username> [FILE]  /  flask tasks import <username> FILE
+
+tasks_cli = AppGroup("tasks", help="Import and export a user's tasks.")
+
+
+def _user_id(username):
+    user_id = find_user_id(username)
+    if user_id is None:
+        raise click.ClickException(f"No user named {username!r}")
+    return user_id
+
+
+@tasks_cli.command("export")
+@click.argument("username")
+@click.argument("output", type=click.File("w", encoding="utf-8"), default="-")
+@click.option("--format", "fmt", type=click.Choice(list(FORMATS)),
+              help="Default: from the file name, else ndjson.")
+def export_command(username, output, fmt):
+    """Write USERNAME's tasks to OUTPUT (stdout by default)"""
+    fmt = fmt or format_for(output.name) or "ndjson"
+    for chunk in exporter(fmt)(_user_id(username)):
+        output.write(chunk)
+
+
+@tasks_cli.command("import")
+@click.argument("username")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option("--format", "fmt", type=click.Choice(list(FORMATS)),
+              help="Default: from the file name.")
+@click.option("--batch-size", type=int, default=None, help="Rows per INSERT batch.")
+def import_command(username, path, fmt, batch_size):
+    """Append the tasks in PATH (CSV or NDJSON, - for stdin) to USERNAME's lists"""
+    fmt = fmt or format_for(path)
+    if fmt is None:
+        raise click.UsageError("Cannot tell the format from the file name; pass --format")
+    user_id = _user_id(username)
+    batch_size = batch_size or current_app.config["IMPORT_BATCH_SIZE"]
+
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")
+    try:
+        count = import_tasks(user_id, reader(fmt)(stream), batch_size)
+    except ValidationError as e:
+        db.session.rollback()
+        raise click.ClickException(str(e))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    commit_task_changes(user_id)
+    click.echo(f"Imported {count} tasks for {username}")
@@ -0,0 +1,10 @@
+"""
+Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Settings come from the environment; see config.py and gunicorn.conf.py.
+"""
+from app import create_app
+
+application = create_app()